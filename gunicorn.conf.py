@@ -0,0 +1,94 @@
+"""
+Production server configuration for STTM-to-Notebook Generator API
+Gunicorn manages a pool of uvicorn workers:
+- one worker per CPU of the container's cgroup quota (WORKERS_PER_CPU, or WEB_CONCURRENCY)
+- workers are recycled after WORKER_MAX_REQUESTS (plus jitter) requests to bound memory growth
+- on SIGTERM workers stop accepting and drain in-flight generations for GRACEFUL_TIMEOUT_SECONDS
+- the app is imported once in the master (PRELOAD_APP) so workers fork warm
+
+Usage (from the project root):
+    gunicorn -c gunicorn.conf.py sttm_to_notebook_generator_integrated.api3_sttm_to_notebook_generator:app
+"""
+
+import math
+import os
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sttm_to_notebook_generator_integrated.read_env_var import (
+    PORT,
+    WORKERS_PER_CPU,
+    WORKER_MAX_REQUESTS,
+    WORKER_MAX_REQUESTS_JITTER,
+    WORKER_TIMEOUT_SECONDS,
+    GRACEFUL_TIMEOUT_SECONDS,
+    PRELOAD_APP
+)
+
+
+def cpu_quota() -> float:
+    """CPUs the container may use: the cgroup v2 (then v1) quota, else the CPUs this process can run on"""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return float(len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+
+
+bind = f"0.0.0.0:{PORT}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY") or max(1, math.ceil(cpu_quota() * WORKERS_PER_CPU)))
+max_requests = WORKER_MAX_REQUESTS
+# Spread the restarts so workers started together are not all recycled at once
+max_requests_jitter = WORKER_MAX_REQUESTS_JITTER
+# A worker is restarted when its event loop has not checked in for this long; it does not check
+# in during its start-up warm-up, so keep WARM_UP_TIMEOUT_SECONDS below this
+timeout = WORKER_TIMEOUT_SECONDS
+# Keep below the pod's terminationGracePeriodSeconds (360 in devops/config/*/values.yaml; the
+# Kubernetes default is 30), or Kubernetes kills the drain short
+graceful_timeout = GRACEFUL_TIMEOUT_SECONDS
+keepalive = 5
+preload_app = PRELOAD_APP
+accesslog = "-"
+
+# With several workers every process writes its metric samples to a shared directory that must
+# start empty; this runs before the app (and prometheus_client) is imported
+if workers > 1:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def when_ready(server):
+    if preload_app:
+        # Runs before the workers are forked, so they share the heavy modules instead of importing them each
+        from sttm_to_notebook_generator_integrated.warm_up import warm_up_imports
+        warm_up_imports()
+    server.log.info(f"Serving with {server.num_workers} workers (CPU quota {cpu_quota():g}), "
+                    f"recycled after {max_requests}+{max_requests_jitter} requests, "
+                    f"graceful timeout {graceful_timeout}s, preload {preload_app}")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # The log listener thread of the preloaded app did not survive the fork
+        from sttm_to_notebook_generator_integrated.log_handler import restart_log_listener
+        restart_log_listener()
+
+
+def child_exit(server, worker):
+    from sttm_to_notebook_generator_integrated.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -4,17 +4,25 @@ import base64
 import ast
 import logging
 import re
+import time
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Optional
 
-from databricks_langchain.chat_models import ChatDatabricks
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
-from langgraph.graph import StateGraph, END
 from fastapi import HTTPException
 
 from notebook_generator_app.utilities.helpers import load_prompts, sanitize_sql
 from notebook_generator_app.schemas.models import SQLState, SQLGenerationFailure
-from notebook_generator_app.llm.langchain_wrapper import LangChainWrapper
-from notebook_generator_app.llm.pepgenx_llm import PepGenXLLMWrapper
+from notebook_generator_app.llm.stream_validation import StreamingSQLValidator
 from sttm_to_notebook_generator_integrated.log_handler import get_logger
+from sttm_to_notebook_generator_integrated.retry_policy import RetryPolicy, ErrorClass
+from sttm_to_notebook_generator_integrated.read_env_var import LLM_CALL_MAX_ATTEMPTS, SQL_MAX_RETRIES, SQL_STREAM_VALIDATION
+from sttm_to_notebook_generator_integrated.request_deadline import DeadlineExceeded, llm_call_timeout
+from sttm_to_notebook_generator_integrated.client_disconnect import track_llm_call
+from sttm_to_notebook_generator_integrated.progress_events import emit_progress, progress_stream_active
+from sttm_to_notebook_generator_integrated.metrics import observe_stage, observe_llm_call, record_error
+from sttm_to_notebook_generator_integrated.tracing import tracer
+from sttm_to_notebook_generator_integrated.token_counter import count_message_tokens
 
 
 load_dotenv()
@@ -23,6 +31,11 @@ load_dotenv()
 # logger = logging.getLogger(__name__)
 logger = get_logger("<API2 :: CodeGenerator>")
 
+# LangChain, LangGraph and the LLM provider SDK are imported on first use (or by the start-up
+# warm-up), not at module load; only the provider in use is ever imported.
+
+# from notebook_generator_app.llm.langchain_wrapper import LangChainWrapper
+# from notebook_generator_app.llm.pepgenx_llm import PepGenXLLMWrapper
 # PepGenXModel = PepGenXLLMWrapper(
 #     token_url=os.getenv("TOKEN_URL"),
 #     model_url=os.getenv("MODEL_URL"),
@@ -32,14 +45,13 @@ logger = get_logger("<API2 :: CodeGenerator>")
 # )
 # llm_wrapper = LangChainWrapper(custom_model=PepGenXModel)
 
+# from databricks_langchain.chat_models import ChatDatabricks
 # llm_wrapper = ChatDatabricks(
 #     endpoint="databricks-claude-3-7-sonnet",
 #     temperature=0.0
 #     )
 
 # Azure OpenAI Configuration
-from openai import AzureOpenAI
-from langchain_openai import AzureChatOpenAI
 from sttm_to_notebook_generator_integrated.read_env_var import (
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_DEPLOYMENT,
@@ -47,28 +59,42 @@ from sttm_to_notebook_generator_integrated.read_env_var import (
     AZURE_OPENAI_API_KEY
 )
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-)
-
 # Your deployment name (not model name!)
 deployment_name = AZURE_OPENAI_DEPLOYMENT
 
-llm_wrapper = AzureChatOpenAI(
-    azure_deployment=deployment_name,
-    openai_api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    openai_api_key=AZURE_OPENAI_API_KEY,
-    temperature=0.0
-)
+@lru_cache(maxsize=1)
+def get_llm_wrapper():
+    """Shared LangChain chat model for SQL generation, created (and langchain_openai imported) on first use"""
+    from langchain_openai import AzureChatOpenAI
+
+    return AzureChatOpenAI(
+        azure_deployment=deployment_name,
+        openai_api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        openai_api_key=AZURE_OPENAI_API_KEY,
+        temperature=0.0,
+        max_retries=0  # Retries are owned by RetryPolicy
+    )
+
+def record_message_usage(call: dict, message) -> None:
+    """Copy the token usage LangChain reports on an AIMessage (or the final stream chunk) into ``call``"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        call["model"] = message.response_metadata.get("model_name") or deployment_name
+        call["prompt_tokens"] = usage.get("input_tokens")
+        call["completion_tokens"] = usage.get("output_tokens")
 
 def encode_sql(sql: str) -> str:
     """This function encodes SQL output from the LLM to avoid triggering security filters during the Validator Agent process"""
     return base64.b64encode(sql.encode()).decode()
 
-def generate_sql_node(state: dict) -> dict:
+def sql_retry_policy(state: dict) -> RetryPolicy:
+    """RetryPolicy governing SQL regenerations for the current LangGraph run"""
+    policy = RetryPolicy(max_attempts=SQL_MAX_RETRIES, deadline=state.get("deadline"), name="sql_generation")
+    policy.record_attempt(state.get("last_attempt_seconds"))
+    return policy
+
+async def generate_sql_node(state: dict) -> dict:
     """
     LangChain node that generates raw SQL based on the provided source-to-target mapping (STTM) and instructions.
 
@@ -81,10 +107,15 @@ def generate_sql_node(state: dict) -> dict:
                 - multisilver_flag (bool): Represents whether the Orchestration should be done for a MultiSilver workflow
                 - domain (str): The domain from which the job is being run for
                 - product (str): The product within a domain the job is being run for
+                - deadline (Optional[float]): Monotonic deadline shared by all regenerations
 
     Returns:
-        dict: Updated state with a new key `"sql"` containing the generated SQL code
+        dict: Updated state with a new key `"sql"` containing the generated SQL code,
+              `"last_attempt_seconds"` with the time the generation took and
+              `"stream_abort_reason"` when the stream was cut short by a fatal validation rule
     """
+    from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+
     sttm = state["sttm"]
     instructions = state["instructions"]
     layer_classification = state["layer_classification"]
@@ -122,8 +153,6 @@ def generate_sql_node(state: dict) -> dict:
             "{failure_context}"
         )
     ])
-    # Define a RunnableSequence
-    sql_chain = prompt | llm_wrapper
 
     # For Regeneration Tasks
     failure_reason = state.get("validation_failure_reason")
@@ -139,8 +168,13 @@ def generate_sql_node(state: dict) -> dict:
             "You MUST reuse what you can and fix only what failed. Do not generate unrelated code."
         )
 
-    logger.info(f"[SQL Code Generator]: Starting Code Generation Tasks")
-    response = sql_chain.invoke({
+    retry_count = state.get("retry_count", 0)
+    # An aborted stream is retried straight away; the provider is healthy and little time was spent
+    if retry_count and not state.get("stream_abort_reason"):
+        await sql_retry_policy(state).wait(retry_count, ErrorClass.VALIDATION)
+
+    deadline = state.get("deadline")
+    chain_inputs = {
         "sttm": sttm,
         "instructions": instructions,
         "failure_context": failure_context,
@@ -149,8 +183,62 @@ def generate_sql_node(state: dict) -> dict:
         "domain": domain,
         "product": product,
         "logic_args": logic_args
-    })
-    return {**state, "sql": response.content}
+    }
+    prompt_messages = [message.content for message in prompt.format_messages(**chain_inputs)]
+    prompt_tokens = count_message_tokens(prompt_messages)
+
+    async def invoke_chain():
+        # Each HTTP call is bounded by whatever is left of the request budget
+        timeout = llm_call_timeout(deadline, stage="SQL generation")
+        llm_wrapper = get_llm_wrapper()
+        sql_chain = prompt | llm_wrapper.bind(timeout=timeout)
+        forward_tokens = progress_stream_active()
+        with observe_llm_call("sql_generation", deployment_name) as call:
+            call["messages"] = prompt_messages
+            async with track_llm_call("SQL generation"):
+                if not (SQL_STREAM_VALIDATION or forward_tokens):
+                    response = await sql_chain.ainvoke(chain_inputs)
+                    record_message_usage(call, response)
+                    call["content"] = response.content
+                    return response.content, None
+
+                # Validate while streaming so a doomed completion is cut off early
+                validator = StreamingSQLValidator(layer_classification) if SQL_STREAM_VALIDATION else None
+                # Token usage is only sent, as a final chunk, when asked for
+                sql_chain = prompt | llm_wrapper.bind(timeout=timeout, stream_options={"include_usage": True})
+                chunks = []
+                async with aclosing(sql_chain.astream(chain_inputs)) as stream:
+                    async for chunk in stream:
+                        record_message_usage(call, chunk)
+                        if not chunk.content:
+                            continue
+                        chunks.append(chunk.content)
+                        if forward_tokens:
+                            emit_progress("sql_token", text=chunk.content)
+                        if validator and validator.feed(chunk.content):
+                            call["outcome"] = "aborted"
+                            call["content"] = "".join(chunks)
+                            return call["content"], validator.violation
+                call["content"] = "".join(chunks)
+                return call["content"], None
+
+    llm_call_policy = RetryPolicy(max_attempts=LLM_CALL_MAX_ATTEMPTS, deadline=deadline, name="sql_llm_call")
+    logger.info(f"[SQL Code Generator]: Starting Code Generation Tasks ({prompt_tokens} prompt tokens)")
+    emit_progress("sql_generation_attempt", attempt=retry_count + 1, layer=layer_classification)
+    started_at = time.monotonic()
+    with observe_stage("sql_generation", {"sttm.sql.attempt": retry_count + 1, "sttm.layer": layer_classification,
+                                          "sttm.sql.prompt_tokens": prompt_tokens}) as span:
+        sql, abort_reason = await llm_call_policy.call(invoke_chain)
+        span.set_attribute("sttm.sql.stream_aborted", bool(abort_reason))
+    if abort_reason:
+        logger.warning(f"[SQL Code Generator]: Aborted generation after {len(sql)} characters: {abort_reason}")
+        emit_progress("sql_stream_aborted", attempt=retry_count + 1, reason=abort_reason, chars=len(sql))
+    return {
+        **state,
+        "sql": sql,
+        "stream_abort_reason": abort_reason,
+        "last_attempt_seconds": time.monotonic() - started_at
+    }
 
 def review_sql_node(state: dict) -> dict:
     """
@@ -165,6 +253,7 @@ def review_sql_node(state: dict) -> dict:
                 - multisilver_flag (bool): Represents whether the Orchestration should be done for a MultiSilver workflow
                 - domain (str): The domain from which the job is being run for
                 - product (str): The product within a domain the job is being run for
+                - stream_abort_reason (Optional[str]): Set when the generation was aborted while streaming
 
     Returns:
         dict: Updated state with a new key `"reviewed_sql"` containing the reviewed SQL code
@@ -182,14 +271,21 @@ def review_sql_node(state: dict) -> dict:
     raw_sql = sanitize_sql(sql=raw_sql)
 
     retry_count = state.get("retry_count", 0)
-    if layer_classification == "silver":
-        sql_str = extract_silver_sql_str(raw_str=raw_sql)
-        validated_sql, msg = validate_silver_sql(sql_str=sql_str)
-    else:
-        validated_sql, msg = validate_gold_sql(sql_str=raw_sql)
+    with observe_stage("sql_review", {"sttm.sql.attempt": retry_count + 1}):
+        if state.get("stream_abort_reason"):
+            # Already rejected while streaming; the partial output is only kept as retry context
+            validated_sql, msg = False, state["stream_abort_reason"]
+        elif layer_classification == "silver":
+            sql_str = extract_silver_sql_str(raw_str=raw_sql)
+            validated_sql, msg = validate_silver_sql(sql_str=sql_str)
+        else:
+            validated_sql, msg = validate_gold_sql(sql_str=raw_sql)
 
     if not validated_sql:
         logger.warning(f"[SQL Review Validator]: Sending back to SQL Gen Agent")
+        record_error("sql_review", ErrorClass.VALIDATION,
+                     "stream_aborted" if state.get("stream_abort_reason") else "review_rejected", detail=msg)
+        emit_progress("sql_review", attempt=retry_count + 1, result="retry", reason=msg)
         return {
             **state,
             "retry_count": retry_count + 1,
@@ -203,13 +299,33 @@ def review_sql_node(state: dict) -> dict:
     else:
         reviewed_sql = validated_sql
     logger.info(msg)
+    emit_progress("sql_review", attempt=retry_count + 1, result="pass", reason=msg)
     return {
         **state,
         "reviewed_sql": reviewed_sql,
         "validation_result": "pass"
     }
 
-def invoke_langgraph(layer_classification: str, sttm: dict, domain: str, product: str, logic_args: dict, multisilver_flag: bool=False) -> str:
+@lru_cache(maxsize=1)
+def get_sql_graph():
+    """
+    The SQL generation and review workflow, compiled once per process. The compiled graph
+    holds no run state (there is no checkpointer), so concurrent requests share it.
+    """
+    from langgraph.graph import StateGraph
+
+    graph = StateGraph(SQLState)
+    graph.add_node("generate_sql", generate_sql_node)
+    graph.add_node("review_sql", review_sql_node)
+
+    graph.set_entry_point("generate_sql")
+    
+    graph.add_edge("generate_sql", "review_sql")
+    graph.add_conditional_edges("review_sql", route_from_review)
+
+    return graph.compile()
+
+async def invoke_langgraph(layer_classification: str, sttm: dict, domain: str, product: str, logic_args: dict, multisilver_flag: bool=False, deadline: Optional[float]=None) -> str:
     """
     Orchestrates the LangGraph SQL Generation and Validation workflow.
 
@@ -219,32 +335,29 @@ def invoke_langgraph(layer_classification: str, sttm: dict, domain: str, product
         - multisilver_flag (bool): Represents whether the Orchestration should be done for a MultiSilver workflow
         - domain (str): The domain from which the job is being run for
         - product (str): The product within a domain the job is being run for
+        - deadline (Optional[float]): Monotonic deadline after which no regeneration is started
 
     Returns:
         str: The final reviewed SQL string. 
     """
     instructions = load_prompts(layer_classification=layer_classification, domain=domain, product=product, txt_file="instructions_langchain.txt")
 
-    graph = StateGraph(SQLState)
-    graph.add_node("generate_sql", generate_sql_node)
-    graph.add_node("review_sql", review_sql_node)
-
-    graph.set_entry_point("generate_sql")
-    
-    graph.add_edge("generate_sql", "review_sql")
-    graph.add_conditional_edges("review_sql", route_from_review)
-
-    lang_graph_app = graph.compile()
-
-    final_output = lang_graph_app.invoke({
-        "sttm": sttm,
-        "instructions": instructions,
-        "layer_classification": layer_classification,
-        "multisilver_flag": multisilver_flag,
-        "domain": domain,
-        "product": product,
-        "logic_args": logic_args
-    })
+    lang_graph_app = get_sql_graph()
+
+    with tracer.start_as_current_span("langgraph.sql_workflow", attributes={
+        "sttm.layer": layer_classification, "sttm.tables": len(sttm), "sttm.multisilver": multisilver_flag
+    }) as span:
+        final_output = await lang_graph_app.ainvoke({
+            "sttm": sttm,
+            "instructions": instructions,
+            "layer_classification": layer_classification,
+            "multisilver_flag": multisilver_flag,
+            "domain": domain,
+            "product": product,
+            "logic_args": logic_args,
+            "deadline": deadline
+        })
+        span.set_attribute("sttm.sql.retries", final_output.get("retry_count", 0))
     response = final_output["reviewed_sql"]
 
     return response
@@ -380,8 +493,8 @@ def extract_silver_sql_str(raw_str: str):
 def route_from_review(state: dict):
     """
     LangChain Conditional Edge that will check the validation status and re-route, pass, or fail the workflow
-    Will check validation status for a set number of iterations and either re-route back to the SQL CodeGen Agent,
-    Pass the workflow for completion, or raise an exception for max amount of retries
+    Will check validation status against the shared RetryPolicy and either re-route back to the SQL CodeGen Agent,
+    Pass the workflow for completion, or raise an exception once retries or the request deadline are exhausted
 
     Args:
         state (dict): The current state object passed through the LangGraph workflow.
@@ -389,14 +502,26 @@ def route_from_review(state: dict):
                 - retry_count (int): Number of Retries for a workflow
                 - validation_result (str): "retry" or "pass"
                 - validation_failure_reason (str): Reason for why the SQL Code was rejected by the Validation Agent
+                - deadline (Optional[float]): Monotonic deadline shared by all regenerations
 
     Returns:
         str: "generate_sql" - Re-route to SQL CodeGen Agent
         obj: END - Pass for completion
         err: Exception - 422 HTTPException "SQL_VALIDATION_FAILED"
     """
+    from langgraph.graph import END
+
+    if state.get("validation_result") != "retry":
+        return END
+
     retry_count = state.get("retry_count", 0)
-    if retry_count >= 5:
+    policy = sql_retry_policy(state)
+    if not policy.can_retry(retry_count, ErrorClass.VALIDATION):
+        if retry_count < policy.max_attempts and policy.budget_exhausted():
+            message = (f"Stopped after {retry_count} SQL regenerations; remaining budget cannot fit another attempt. "
+                       f"Last failure: {state.get('validation_failure_reason')}")
+            logger.error(f"[SQL Review Validator]: {message}")
+            raise DeadlineExceeded("SQL generation", message)
         logger.error(f"[SQL Review Validator]: SQL Generation failed after {retry_count} retries. Please try again.")
         raise HTTPException(
             status_code=422,
@@ -407,8 +532,5 @@ def route_from_review(state: dict):
                 retries=retry_count
             ).dict()
         )
-    
-    if state.get("validation_result") == "retry":
-        return "generate_sql"
-    
-    return END
\ No newline at end of file
+
+    return "generate_sql"
\ No newline at end of file
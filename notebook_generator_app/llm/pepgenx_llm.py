@@ -1,12 +1,14 @@
 from dotenv import load_dotenv
-from typing import List, Any
+from typing import List, Any, TYPE_CHECKING
 import os
 import requests
 import time
 import logging
-from litellm import ModelResponse
 from sttm_to_notebook_generator_integrated.log_handler import get_logger
 
+if TYPE_CHECKING:
+    from litellm import ModelResponse
+
 
 load_dotenv()
 # Set up logging
@@ -71,7 +73,7 @@ class PepGenXLLMWrapper:
         if self._token is None or time.time() > self._token_expiry - 60:
             self._create_bearer_token()
 
-    def completion(self, model: str, messages: List[dict], **kwargs: Any) -> ModelResponse:
+    def completion(self, model: str, messages: List[dict], **kwargs: Any) -> "ModelResponse":
         """
         Sends a prompt to the internal model API and retrieves the generated completion.
 
@@ -109,6 +111,9 @@ class PepGenXLLMWrapper:
             json=payload
         )
         if response.status_code == 200:
+            # litellm is heavy and only needed for this provider
+            from litellm import ModelResponse
+
             result = response.json()
             return ModelResponse(choices=[{"message": {"content": result['response']}}])
         else:
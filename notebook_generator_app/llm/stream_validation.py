@@ -0,0 +1,111 @@
+import re
+from typing import Optional
+
+# Mirrors the checks in validate_gold_sql that can be decided from a prefix of the output
+GOLD_DISALLOWED_PYSPARK = [".select(", ".selectExpr(", ".filter(", ".withColumn(", ".drop(", ".join(", ".groupBy(", ".agg(", ".alias(", ".orderBy(", ".distinct("]
+GOLD_ALLOWED_LINE_PATTERNS = [r"^\w+_df\s*=", r"^\w+_temp_vw\s*="]
+TRIPLE_QUOTES = ('"""', "'''")
+
+
+class StreamingSQLValidator:
+    """
+    Incremental validator fed with the SQL generator's streamed output.
+
+    Only rules of validate_gold_sql whose outcome cannot change as more tokens arrive are
+    checked, so a violation reported here would also fail the final review and the generation
+    can be aborted without waiting for the rest of the completion. validate_silver_sql searches
+    the whole output for the assignment (leading prose or a code fence still passes), so no
+    silver rule can be decided from a prefix and silver output is never aborted.
+
+    Text inside triple-quoted strings is skipped, just like the final validators do.
+
+    Attributes:
+        layer_classification (str): 'silver' or 'gold'
+        violation (Optional[str]): Reason of the first fatal violation, if any
+    """
+    def __init__(self, layer_classification: str):
+        self.layer_classification = layer_classification.lower()
+        self.violation = None
+        self._buffer = ""
+        self._pos = 0
+        self._quote = None
+        self._line = ""
+
+    def feed(self, text: str) -> Optional[str]:
+        """
+        Consume the next streamed chunk.
+
+        Args:
+            text (str): Newly streamed text
+
+        Returns:
+            Optional[str]: The violation reason once a fatal rule is broken, otherwise None
+        """
+        if self.violation:
+            return self.violation
+        self._buffer += text
+        # Leave two characters unread so a triple quote split across chunks is still seen whole
+        end = len(self._buffer) - 2
+        buffer = self._buffer
+        i = self._pos
+        while i < end:
+            if self._quote:
+                if buffer.startswith(self._quote, i):
+                    self._quote = None
+                    i += 3
+                else:
+                    i += 1
+                continue
+            quote = next((q for q in TRIPLE_QUOTES if buffer.startswith(q, i)), None)
+            if quote:
+                # String prefixes (f, r, ...) go with the block, as in validate_gold_sql
+                self._line = re.sub(r"[frFR]*$", "", self._line)
+                self._quote = quote
+                i += 3
+                continue
+            if buffer[i] == "\n":
+                self.violation = self._check_line(self._line)
+                self._line = ""
+                if self.violation:
+                    break
+            else:
+                self._line += buffer[i]
+            i += 1
+        self._pos = i
+
+        if not self.violation:
+            self.violation = self._check_fragment(self._line)
+        return self.violation
+
+    def _check_fragment(self, fragment: str) -> Optional[str]:
+        """Rules that apply to any text outside triple-quoted strings, complete line or not."""
+        if self.layer_classification == "silver":
+            return None
+        for keyword in GOLD_DISALLOWED_PYSPARK:
+            if keyword in fragment:
+                return f"Disallowed PySpark API syntax `{keyword}` found - only SparkSQL is allowed for this output"
+        if "--" in fragment:
+            return "Detected SQL-style -- comments outside SQL strings; Expected # for Python comments"
+        if "/*" in fragment or "*/" in fragment:
+            return "Detected /* */ block comments outside SQL strings; Expected # for Python comments"
+        return None
+
+    def _check_line(self, line: str) -> Optional[str]:
+        """Rules for a completed line outside triple-quoted strings."""
+        violation = self._check_fragment(line)
+        if violation:
+            return violation
+
+        # Code fences are stripped by sanitize_sql before the final review
+        line = re.sub(r"```[a-zA-Z]*", "", line).strip()
+        if not line or line.startswith("#"):
+            return None
+
+        if self.layer_classification == "silver":
+            return None
+
+        if any(re.match(pattern, line) for pattern in GOLD_ALLOWED_LINE_PATTERNS):
+            return None
+        if ".createOrReplaceTempView" in line or line in (")", "))", ")))"):
+            return None
+        return f"Invalid comments outside SQL strings: `{line}` - Expected # for Python comments"
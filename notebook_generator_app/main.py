@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 from pathlib import Path
 import logging
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
 from notebook_generator_app.utilities.helpers import render_notebook, build_metadata_from
 from notebook_generator_app.llm.langchain_workflow import invoke_langgraph
@@ -20,6 +20,11 @@ from notebook_generator_app.schemas.models import (
     HTTPValidationError
 )
 from sttm_to_notebook_generator_integrated.log_handler import get_logger
+from sttm_to_notebook_generator_integrated.request_deadline import get_request_deadline
+from sttm_to_notebook_generator_integrated.client_disconnect import run_until_disconnected
+from sttm_to_notebook_generator_integrated.progress_events import emit_progress
+from sttm_to_notebook_generator_integrated.metrics import observe_stage
+from sttm_to_notebook_generator_integrated.usage_recorder import USAGE_HEADER, usage_requested, start_usage_recording, attach_usage
 
 
 # load_dotenv()
@@ -44,6 +49,7 @@ app2 = APIRouter()
 @app2.post(f"/{appName}/api/v1/edf/genai/codegenservices/generate-notebook",
     summary="Generate ETL Notebook using MultiAgent through OpenAI",
     response_model=PromptResponseModel,
+    response_model_exclude_none=True,
     response_description="The path to the generated ETL Notebook from OpenAI",
     responses={
         400: {"model": ValidationError, "description": "Bad Request - Invalid input"},
@@ -51,11 +57,26 @@ app2 = APIRouter()
         500: {"model": ServerError, "description": "Internal Server Error"}
     }
 )
-async def generate_response(request: PromptRequestModel):
+async def generate_response(request: PromptRequestModel, http_request: Request = None):
+    """
+    Generates the notebook. When served over HTTP the generation is cancelled if the
+    client disconnects, and timings/usage are attached when the X-Include-Usage header asks
+    for them; callers that await this directly (api3) handle both themselves.
+    """
+    if http_request is not None:
+        recorder = start_usage_recording(usage_requested(http_request.headers.get(USAGE_HEADER)))
+        response = await run_until_disconnected(http_request, generate_notebook(request), stage="notebook generation")
+        return attach_usage(response, recorder)
+    return await generate_notebook(request)
+
+async def generate_notebook(request: PromptRequestModel) -> PromptResponseModel:
     logger.info("Generate Notebook API Initialized")
     meta = request.notebook_metadata_json
     data = request.content
 
+    # Shares the budget started by api3, or starts one when called directly
+    deadline = get_request_deadline()
+
     user_id = meta.user_id
     layer_classification = meta.table_load_type.lower()
     domain = meta.domain.lower()
@@ -82,27 +103,30 @@ async def generate_response(request: PromptRequestModel):
         data=data
     )
  
-    result = invoke_langgraph(
+    result = await invoke_langgraph(
         layer_classification=layer_classification,
         sttm=data,
         domain=domain,
         product=product,
         logic_args=logic_args,
-        multisilver_flag=multisilver_flag
+        multisilver_flag=multisilver_flag,
+        deadline=deadline
     )
 
     template_path =  BASE_DIR / "templates" / layer_classification
-    notebook_str = render_notebook(
-        layer_classification=layer_classification,
-        sql_code=result,
-        template_path=template_path,
-        metadata=nb_metadata_copy
-    )
+    with observe_stage("render"):
+        notebook_str = render_notebook(
+            layer_classification=layer_classification,
+            sql_code=result,
+            template_path=template_path,
+            metadata=nb_metadata_copy
+        )
     logger.info("Notebook generated successfully")
+    emit_progress("rendering_done", layer=layer_classification, notebook_chars=len(notebook_str))
     return PromptResponseModel(
         success=True,
         message="Notebook generated successfully.",
-        notebook_id="TODO",
+        notebook_id=meta.notebook_id,
         notebook_name="generated_notebook.py",
         data=notebook_str
     )
@@ -26,6 +26,9 @@ class PromptResponseModel(BaseModel):
     notebook_id: str
     notebook_name: str
     data: str
+    # Only returned when requested with the X-Include-Usage header
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 class ServerError(BaseModel):
     error_code: int
@@ -59,4 +62,7 @@ class SQLState(TypedDict):
     multisilver_flag: bool
     domain: Optional[str]
     product: Optional[str]
-    logic_args: Dict[str, Any]
\ No newline at end of file
+    logic_args: Dict[str, Any]
+    deadline: Optional[float]
+    last_attempt_seconds: Optional[float]
+    stream_abort_reason: Optional[str]
\ No newline at end of file
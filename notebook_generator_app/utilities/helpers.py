@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from pathlib import Path
 import re
 
@@ -16,6 +17,32 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 # logger = logging.getLogger(__name__)
 logger = get_logger("<API2 :: CodeGenerator>")
 
+TEMPLATES_DIR = BASE_DIR / "templates"
+
+@lru_cache(maxsize=256)
+def read_template_file(path: Path) -> str:
+    """Contents of a prompt file; templates ship with the image, so each is read once per process"""
+    with open(path, "r") as file:
+        return file.read()
+
+@lru_cache(maxsize=None)
+def get_jinja_environment(template_path: str) -> Environment:
+    """Shared Jinja environment per template directory, so compiled templates are reused across requests"""
+    return Environment(loader=FileSystemLoader(template_path))
+
+def preload_templates() -> int:
+    """Read every prompt file and compile every notebook template ahead of the first request"""
+    count = 0
+    for path in sorted(TEMPLATES_DIR.rglob("*")):
+        if path.suffix == ".txt":
+            read_template_file(path)
+        elif path.suffix == ".j2":
+            get_jinja_environment(str(path.parent)).get_template(path.name)
+        else:
+            continue
+        count += 1
+    return count
+
 def sanitize_sql(sql: str) -> str:
     """This function cleans SQL code of any ``` code fences ``` and replaces {} with {{}} to prevent APIGEE Gateway Filtering"""
     sql = re.sub(r"```[a-zA-Z]*\n", "", sql)
@@ -47,10 +74,7 @@ def load_prompts(layer_classification: str, domain: str, product: str, txt_file:
         logger.info(f"Project-based template {dynamic_prompt_path} not found.  Falling back to generic-Master template ...")
         prompt_template = master_prompt_path
 
-    with open(prompt_template, "r") as file:
-        prompt_template = file.read()
-
-    return prompt_template
+    return read_template_file(prompt_template)
 
 def build_metadata_from(layer_classification: str, user_id: str, data: dict):
     """
@@ -112,7 +136,7 @@ def render_notebook(layer_classification: str, sql_code: str, template_path: str
         for i, block in enumerate(sql_code.split("\n\n"))
     ]
 
-    jinja_env = Environment(loader=FileSystemLoader(template_path))
+    jinja_env = get_jinja_environment(str(template_path))
     try:
         template = jinja_env.get_template(notebook_template)
     except Exception as e:
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Main entry point for STTM-to-Notebook Generator API
-Runs the application with Swagger UI enabled
+Runs the application with Swagger UI enabled, in a single auto-reloading process for development.
+Production runs several workers under gunicorn (see gunicorn.conf.py).
 """
 
 import uvicorn
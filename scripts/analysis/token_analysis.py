@@ -6,8 +6,14 @@ Analyzes actual token consumption and JSON structure differences between v1.0.0
 
 import json
 import re
+import sys
+from pathlib import Path
 from typing import Dict, List, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from sttm_to_notebook_generator_integrated.token_counter import count_tokens, tokenizer_name
+
 class TokenAnalyzer:
     def __init__(self):
         self.v1_0_0_file = "v1.0.0_response.json"
@@ -24,9 +30,8 @@ class TokenAnalyzer:
         return v1_0_0_response, v1_1_0_response
     
     def estimate_tokens(self, text: str) -> int:
-        """Estimate token count for text (rough approximation)"""
-        # Rough estimation: 1 token ≈ 4 characters for English text
-        return len(text) // 4
+        """Token count for text, with the tokenizer the service budgets prompts with"""
+        return count_tokens(text)
     
     def analyze_notebook_content(self, response: Dict) -> Dict:
         """Analyze notebook content for token usage and structure"""
@@ -168,6 +173,7 @@ class TokenAnalyzer:
 - **Size Difference**: {len(json.dumps(v1_1_0_response)) - len(json.dumps(v1_0_0_response))} bytes
 
 ### Notebook Content Analysis:
+- **Tokenizer**: {tokenizer_name()}
 - **v1.0.0 Total Tokens**: {v1_0_0_analysis['total']['total_tokens']} tokens
 - **v1.1.0 Total Tokens**: {v1_1_0_analysis['total']['total_tokens']} tokens
 - **Token Reduction**: {((v1_0_0_analysis['total']['total_tokens'] - v1_1_0_analysis['total']['total_tokens']) / v1_0_0_analysis['total']['total_tokens']) * 100:.1f}%
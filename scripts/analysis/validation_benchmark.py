@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Validation Micro-Benchmark
+Compares the legacy SmartValidator pipeline (comprehensive_python_validation) with the
+single-pass validation engine (validate_json_sttm) on synthetic JSON STTMs.
+
+Usage (from the project root):
+    python scripts/analysis/validation_benchmark.py --columns 50 500 --iterations 200
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from sttm_to_notebook_generator_integrated.api1_json_converter_optimized import comprehensive_python_validation
+from sttm_to_notebook_generator_integrated.validation_engine import validate_json_sttm
+
+SIMPLE_TRANSFORMATIONS = ["Direct", "Trim(col)", "Uppercase", "Default Value: 0", "Concatenate(a, b)"]
+COMPLEX_TRANSFORMATIONS = [
+    "CASE WHEN amount > 0 THEN amount ELSE 0 END",
+    "Lookup against currency table on currency_code",
+    "Sum of quantity partitioned by plant",
+]
+
+
+class ValidationBenchmark:
+    def __init__(self, iterations: int = 200, seed: int = 7):
+        self.iterations = iterations
+        self.random = random.Random(seed)
+
+    def build_case(self, columns: int, complex_ratio: float = 0.2, broken: bool = False) -> Dict:
+        """Build a JSON STTM string and matching excel_metadata with ``columns`` mapped columns"""
+        sources = [{"name": f"src_{i}"} for i in range(3)]
+        column_mapping = {}
+        for idx in range(columns):
+            pool = COMPLEX_TRANSFORMATIONS if self.random.random() < complex_ratio else SIMPLE_TRANSFORMATIONS
+            column_mapping[f"col_{idx}"] = {
+                "sources": {
+                    "source_table": f"src_{idx % 3}",
+                    "source_column": f"source_col_{idx}",
+                    "transformation": self.random.choice(pool)
+                }
+            }
+        target_columns = list(column_mapping)
+        if broken:
+            # A missing column and a dangling source reference, as seen in failed attempts
+            target_columns.append("col_missing")
+            column_mapping["col_0"]["sources"]["source_table"] = "src_unknown"
+        json_string = json.dumps({"target_table": "target", "source_tables": sources, "column_mapping": column_mapping})
+        return {"json_string": json_string, "excel_metadata": {"target_columns": target_columns}}
+
+    def check_equivalence(self, case: Dict) -> bool:
+        legacy_valid, legacy_issues, legacy_needs_llm = comprehensive_python_validation(
+            case["json_string"], case["excel_metadata"]
+        )
+        report = validate_json_sttm(case["json_string"], case["excel_metadata"])
+        return (legacy_valid, legacy_issues, legacy_needs_llm) == (report.is_valid, report.messages, report.needs_llm_validation)
+
+    def time_call(self, fn, case: Dict) -> float:
+        """
+        Mean seconds per call over the configured iterations (best of 3 repeats). Logging is
+        off while timing, so the legacy pipeline's per-rule log lines are not counted against it.
+        """
+        timer = timeit.Timer(lambda: fn(case["json_string"], case["excel_metadata"]))
+        logging.disable(logging.CRITICAL)
+        try:
+            return min(timer.repeat(repeat=3, number=self.iterations)) / self.iterations
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def run(self, column_counts: List[int]) -> List[Dict]:
+        results = []
+        for columns in column_counts:
+            for broken in (False, True):
+                case = self.build_case(columns, broken=broken)
+                legacy = self.time_call(comprehensive_python_validation, case)
+                engine = self.time_call(validate_json_sttm, case)
+                results.append({
+                    "columns": columns,
+                    "case": "invalid" if broken else "valid",
+                    "equivalent": self.check_equivalence(case),
+                    "legacy_ms": round(legacy * 1000, 4),
+                    "engine_ms": round(engine * 1000, 4),
+                    "speedup": round(legacy / engine, 2) if engine else None
+                })
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SmartValidator against the single-pass validation engine")
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 100, 500], help="Mapped column counts to test")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per timing repeat")
+    parser.add_argument("--output", help="Optional path for the results as JSON")
+    args = parser.parse_args()
+
+    results = ValidationBenchmark(iterations=args.iterations).run(args.columns)
+
+    print(f"{'columns':>8} {'case':>8} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8} {'same result':>12}")
+    for row in results:
+        print(f"{row['columns']:>8} {row['case']:>8} {row['legacy_ms']:>10} {row['engine_ms']:>10} "
+              f"{row['speedup']:>7}x {str(row['equivalent']):>12}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark Regression Gate
+Compares two run_benchmark.py result files (baseline and candidate) row by row (endpoint,
+fixture, concurrency) against thresholds on latency percentiles, pipeline overhead, throughput,
+tokens and LLM calls per notebook, and memory (traced heap per request, process peak RSS).
+Writes a machine-readable verdict and a Markdown report, and exits with status 1 when any
+check fails.
+
+Thresholds are a JSON object keyed by metric (dotted paths into a result row, or
+``process.max_rss_mib``); each sets ``max_increase_pct`` (or ``max_decrease_pct`` for metrics
+where higher is better) and optionally ``min_delta``, an absolute change always tolerated so
+tiny values do not fail on noise. Given thresholds are merged over DEFAULT_THRESHOLDS.
+
+Usage (from the project root):
+    python scripts/benchmark/compare_benchmarks.py benchmark_results/baseline.json benchmark_results/candidate.json \\
+        --thresholds thresholds.json --verdict benchmark_results/verdict.json --markdown benchmark_results/report.md
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_THRESHOLDS = {
+    "latency_seconds.p50": {"max_increase_pct": 10, "min_delta": 0.01},
+    "latency_seconds.p95": {"max_increase_pct": 15, "min_delta": 0.02},
+    "latency_seconds.p99": {"max_increase_pct": 20, "min_delta": 0.05},
+    "overhead_seconds.p50": {"max_increase_pct": 20, "min_delta": 0.005},
+    "throughput_rps": {"max_decrease_pct": 10},
+    "tokens_per_request.total": {"max_increase_pct": 5},
+    "llm_calls_per_request": {"max_increase_pct": 0},
+    "errors": {"max_increase_pct": 0},
+    "peak_traced_mib": {"max_increase_pct": 20, "min_delta": 0.5},
+    "process.max_rss_mib": {"max_increase_pct": 15, "min_delta": 10},
+}
+# Settings that must match for the comparison to be meaningful
+COMPARABLE_META = ("latency", "seed", "requests", "concurrency")
+
+
+def lookup(row: Dict, path: str):
+    value = row
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def check(metric: str, baseline, candidate, threshold: Dict) -> Dict:
+    result = {"metric": metric, "baseline": baseline, "candidate": candidate, "change_pct": None}
+    if baseline is None or candidate is None:
+        return {**result, "status": "skipped", "limit": "metric missing in one run"}
+
+    delta = candidate - baseline
+    if baseline:
+        result["change_pct"] = round(delta / abs(baseline) * 100, 2)
+    higher_is_better = "max_decrease_pct" in threshold
+    allowed_pct = threshold.get("max_decrease_pct" if higher_is_better else "max_increase_pct", 0)
+    allowed_delta = max(abs(baseline) * allowed_pct / 100, threshold.get("min_delta", 0))
+    regression = -delta if higher_is_better else delta
+    result["limit"] = f"{'-' if higher_is_better else '+'}{allowed_pct}%" + (
+        f" (or {threshold['min_delta']})" if threshold.get("min_delta") else "")
+    result["status"] = "fail" if regression > allowed_delta else "pass"
+    return result
+
+
+def row_key(row: Dict) -> str:
+    return f"{row['endpoint']}/{row['fixture']}/c{row['concurrency']}"
+
+
+def compare(baseline: Dict, candidate: Dict, thresholds: Dict) -> Dict:
+    warnings = []
+    for setting in COMPARABLE_META:
+        if baseline["meta"].get(setting) != candidate["meta"].get(setting):
+            warnings.append(f"'{setting}' differs: {baseline['meta'].get(setting)} vs {candidate['meta'].get(setting)}")
+
+    baseline_rows = {row_key(row): row for row in baseline["results"]}
+    candidate_rows = {row_key(row): row for row in candidate["results"]}
+    only_baseline = sorted(baseline_rows.keys() - candidate_rows.keys())
+    only_candidate = sorted(candidate_rows.keys() - baseline_rows.keys())
+    if only_baseline:
+        warnings.append(f"Rows missing from the candidate: {', '.join(only_baseline)}")
+    if only_candidate:
+        warnings.append(f"Rows only in the candidate: {', '.join(only_candidate)}")
+
+    checks = []
+    for key in sorted(baseline_rows.keys() & candidate_rows.keys()):
+        for metric, threshold in thresholds.items():
+            if metric.startswith("process."):
+                continue
+            checks.append({"row": key, **check(metric, lookup(baseline_rows[key], metric),
+                                               lookup(candidate_rows[key], metric), threshold)})
+    for metric, threshold in thresholds.items():
+        if metric.startswith("process."):
+            checks.append({"row": "process", **check(metric, lookup(baseline, metric), lookup(candidate, metric), threshold)})
+
+    counts = {status: sum(c["status"] == status for c in checks) for status in ("pass", "fail", "skipped")}
+    return {
+        "verdict": "fail" if counts["fail"] else "pass",
+        "baseline": {"git_commit": baseline["meta"].get("git_commit"), "timestamp": baseline["meta"].get("timestamp")},
+        "candidate": {"git_commit": candidate["meta"].get("git_commit"), "timestamp": candidate["meta"].get("timestamp")},
+        "summary": counts,
+        "warnings": warnings,
+        "thresholds": thresholds,
+        "checks": checks,
+    }
+
+
+def format_value(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value:g}" if isinstance(value, (int, float)) else str(value)
+
+
+def render_markdown(verdict: Dict) -> str:
+    def table(checks: List[Dict]) -> List[str]:
+        lines = ["| Row | Metric | Baseline | Candidate | Change | Limit | Status |",
+                 "|---|---|---:|---:|---:|---|---|"]
+        for c in checks:
+            change = "-" if c["change_pct"] is None else f"{c['change_pct']:+.1f}%"
+            status = {"pass": "pass", "fail": "**FAIL**", "skipped": "skipped"}[c["status"]]
+            lines.append(f"| {c['row']} | {c['metric']} | {format_value(c['baseline'])} | {format_value(c['candidate'])} "
+                         f"| {change} | {c['limit']} | {status} |")
+        return lines
+
+    summary = verdict["summary"]
+    lines = [
+        f"# Benchmark comparison: {verdict['verdict'].upper()}",
+        "",
+        f"Baseline `{(verdict['baseline']['git_commit'] or 'unknown')[:12]}` vs candidate "
+        f"`{(verdict['candidate']['git_commit'] or 'unknown')[:12]}`: "
+        f"{summary['fail']} failed, {summary['pass']} passed, {summary['skipped']} skipped.",
+        "",
+    ]
+    if verdict["warnings"]:
+        lines += ["## Warnings", ""] + [f"- {w}" for w in verdict["warnings"]] + [""]
+    failed = [c for c in verdict["checks"] if c["status"] == "fail"]
+    if failed:
+        lines += ["## Regressions", ""] + table(failed) + [""]
+    lines += ["## All checks", ""] + table(verdict["checks"]) + [""]
+    return "\n".join(lines)
+
+
+def load_thresholds(path: Optional[Path]) -> Dict:
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if path:
+        with open(path) as f:
+            thresholds.update(json.load(f))
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs and fail on regressions")
+    parser.add_argument("baseline", type=Path, help="run_benchmark.py results of the reference build")
+    parser.add_argument("candidate", type=Path, help="run_benchmark.py results of the build under test")
+    parser.add_argument("--thresholds", type=Path, help="JSON thresholds merged over the defaults")
+    parser.add_argument("--verdict", type=Path, help="Where to write the verdict JSON")
+    parser.add_argument("--markdown", type=Path, help="Where to write the Markdown report")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    verdict = compare(baseline, candidate, load_thresholds(args.thresholds))
+    report = render_markdown(verdict)
+    if args.verdict:
+        args.verdict.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.verdict, "w") as f:
+            json.dump(verdict, f, indent=2)
+    if args.markdown:
+        args.markdown.parent.mkdir(parents=True, exist_ok=True)
+        args.markdown.write_text(report)
+    print(report)
+    sys.exit(1 if verdict["verdict"] == "fail" else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark Fixture Generator
+Builds synthetic STTM workbooks of varied sizes together with the recorded LLM responses the
+mock LLM server replays for them, so a benchmark run is deterministic and needs no real LLM.
+
+Writes to the output directory:
+    <name>.xlsx      one STTM sheet per fixture (Target Column / Source Table / Source Column / Transformation)
+    manifest.json    fixture list with sheet name, column count and target table
+    responses.json   recorded responses, see mock_llm_server.py for the format
+
+Usage (from the project root):
+    python scripts/benchmark/generate_fixtures.py --sizes small=10 medium=100 large=500
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_SIZES = ["small=10", "medium=100", "large=500"]
+SHEET_NAME = "STTM"
+SOURCE_TABLES_PER_FIXTURE = 3
+
+SIMPLE_TRANSFORMATIONS = ["Direct", "Trim(col)", "Uppercase", "Default Value: 0", "DateFormatting(yyyy-MM-dd)"]
+COMPLEX_TRANSFORMATIONS = [
+    "CASE WHEN amount > 0 THEN amount ELSE 0 END",
+    "Lookup against currency table on currency_code",
+    "Sum of quantity partitioned by plant",
+]
+
+# The LLM validator is only consulted for sheets with many non-standard transformations;
+# its prompt is the only one asking for "strict_issues"
+VALIDATION_RESPONSE = {"is_valid": True, "strict_issues": [], "non_strict_issues": []}
+
+
+class FixtureGenerator:
+    def __init__(self, complex_ratio: float = 0.1, seed: int = 7):
+        self.complex_ratio = complex_ratio
+        self.random = random.Random(seed)
+
+    def build_rows(self, name: str, columns: int) -> List[Dict]:
+        rows = []
+        for idx in range(columns):
+            pool = COMPLEX_TRANSFORMATIONS if self.random.random() < self.complex_ratio else SIMPLE_TRANSFORMATIONS
+            rows.append({
+                "Target Column": f"{name}_col_{idx:03d}",
+                "Source Table": f"{name}_src_{idx % SOURCE_TABLES_PER_FIXTURE}",
+                "Source Column": f"source_col_{idx}",
+                "Transformation": self.random.choice(pool)
+            })
+        return rows
+
+    @staticmethod
+    def build_json_sttm(name: str, rows: List[Dict]) -> Dict:
+        """The JSON STTM a well-behaved model returns for the sheet: every target column mapped"""
+        return {
+            "target_table": f"{name}_target",
+            "source_tables": [
+                {"name": f"{name}_src_{i}", "desc": "", "catalog": "bench_catalog", "schema": "bench_schema"}
+                for i in range(SOURCE_TABLES_PER_FIXTURE)
+            ],
+            "column_mapping": {
+                row["Target Column"]: {
+                    "sources": {
+                        "source_table": row["Source Table"],
+                        "source_column": row["Source Column"],
+                        "transformation": row["Transformation"]
+                    }
+                }
+                for row in rows
+            }
+        }
+
+    @staticmethod
+    def build_sql(json_sttm: Dict) -> str:
+        """A silver transform_sql_query_dict that passes the SQL review validator"""
+        select_list = ",\n".join(
+            f"    {mapping['sources']['source_column']} AS {column}"
+            for column, mapping in json_sttm["column_mapping"].items()
+        )
+        first_column = next(iter(json_sttm["column_mapping"]))
+        source = json_sttm["source_tables"][0]
+        return (
+            "transform_sql_query_dict = {\n"
+            f'    "{json_sttm["target_table"]}": {{\n'
+            '        "sql": """\n'
+            "SELECT\n"
+            f"{select_list}\n"
+            f"FROM {source['catalog']}.{source['schema']}.{source['name']}\n"
+            '""",\n'
+            f'        "merge_key": ["{first_column}"]\n'
+            "    }\n"
+            "}\n"
+        )
+
+    def generate(self, output_dir: Path, sizes: Dict[str, int]) -> Dict:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        fixtures = []
+        validation_entries = [{"kind": "llm_validation", "match": "strict_issues", "content": json.dumps(VALIDATION_RESPONSE)}]
+        sql_entries = []
+        json_entries = []
+        for name, columns in sizes.items():
+            rows = self.build_rows(name, columns)
+            file_name = f"{name}.xlsx"
+            pd.DataFrame(rows).to_excel(output_dir / file_name, sheet_name=SHEET_NAME, index=False)
+
+            json_sttm = self.build_json_sttm(name, rows)
+            # The target table name only appears in the SQL prompt (it is not in the sheet),
+            # while the column names appear in both, so SQL entries are matched first
+            sql_entries.append({"kind": "sql", "match": json_sttm["target_table"], "content": self.build_sql(json_sttm)})
+            json_entries.append({"kind": "json_sttm", "match": rows[0]["Target Column"], "content": json.dumps(json_sttm)})
+            fixtures.append({
+                "name": name,
+                "file": file_name,
+                "sheet": SHEET_NAME,
+                "columns": columns,
+                "target_table": json_sttm["target_table"]
+            })
+
+        manifest = {"fixtures": fixtures, "complex_ratio": self.complex_ratio}
+        with open(output_dir / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+        with open(output_dir / "responses.json", "w") as f:
+            json.dump(validation_entries + sql_entries + json_entries, f, indent=2)
+        return manifest
+
+
+def parse_sizes(specs: List[str]) -> Dict[str, int]:
+    sizes = {}
+    for spec in specs:
+        name, _, columns = spec.partition("=")
+        if not name or not columns.isdigit() or int(columns) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid size '{spec}', expected NAME=COLUMNS")
+        sizes[name] = int(columns)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate STTM workbooks and recorded LLM responses for benchmarking")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR, help="Where to write the fixtures")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="Fixtures as NAME=COLUMNS")
+    parser.add_argument("--complex-ratio", type=float, default=0.1, help="Share of non-standard transformations")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    manifest = FixtureGenerator(complex_ratio=args.complex_ratio, seed=args.seed).generate(args.output_dir, parse_sizes(args.sizes))
+    for fixture in manifest["fixtures"]:
+        print(f"{fixture['name']:>10}: {fixture['columns']:>5} columns -> {args.output_dir / fixture['file']}")
+
+
+if __name__ == "__main__":
+    main()
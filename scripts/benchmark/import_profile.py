@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Import-Time Profile
+Imports the application module in fresh interpreters under ``python -X importtime`` and
+reports the cold import time, the slowest modules (cumulative) and the time per top-level
+package (self time), so cold-start regressions show up before they reach a pod. It also
+lists which of the modules meant to load lazily (see warm_up.HEAVY_MODULES) were imported
+eagerly.
+
+Usage (from the project root):
+    python scripts/benchmark/import_profile.py --repeat 5 --top 25 --output benchmark_results/import_profile.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from run_benchmark import PROJECT_ROOT, git_commit
+
+DEFAULT_MODULE = "sttm_to_notebook_generator_integrated.api3_sttm_to_notebook_generator"
+# Loaded on first use or by the warm-up; providers not in use should never load at all
+LAZY_MODULES = ("pandas", "openpyxl", "openai", "langchain", "langchain_core", "langgraph", "langchain_openai",
+                "litellm", "databricks_langchain", "tiktoken")
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Rows of ``-X importtime`` output: module, self and cumulative microseconds, nesting depth"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                     "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return rows
+
+
+def profile_once(module: str) -> Dict:
+    environment = {**os.environ, "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")}
+    started_at = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_ROOT,
+                               env=environment, capture_output=True, text=True)
+    wall = time.perf_counter() - started_at
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return {"wall_seconds": wall, "rows": parse_importtime(completed.stderr)}
+
+
+def report(module: str, runs: List[Dict], top: int) -> Dict:
+    rows = runs[-1]["rows"]
+    target = next((r for r in rows if r["module"] == module), None)
+    by_package = defaultdict(int)
+    for row in rows:
+        by_package[row["module"].split(".")[0]] += row["self_us"]
+    loaded = {row["module"] for row in rows}
+    return {
+        "module": module,
+        "wall_seconds": {"median": round(statistics.median(r["wall_seconds"] for r in runs), 3),
+                         "min": round(min(r["wall_seconds"] for r in runs), 3)},
+        "import_seconds": round(target["cumulative_us"] / 1e6, 3) if target else None,
+        "modules_loaded": len(rows),
+        "eagerly_loaded": [name for name in LAZY_MODULES if name in loaded],
+        "slowest_modules": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1),
+                             "self_ms": round(r["self_us"] / 1000, 1)}
+                            for r in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]],
+        "packages": [{"package": name, "self_ms": round(us / 1000, 1)}
+                     for name, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the application's cold import time with -X importtime")
+    parser.add_argument("--module", default=DEFAULT_MODULE, help="Module to import")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to time (median reported)")
+    parser.add_argument("--top", type=int, default=20, help="Modules and packages to list")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmark_results/import-<timestamp>.json)")
+    args = parser.parse_args()
+
+    runs = [profile_once(args.module) for _ in range(args.repeat)]
+    result = report(args.module, runs, args.top)
+
+    print(f"{args.module}: import {result['import_seconds']}s, interpreter wall median {result['wall_seconds']['median']}s, "
+          f"{result['modules_loaded']} modules")
+    print(f"Lazy modules loaded eagerly: {', '.join(result['eagerly_loaded']) or 'none'}\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in result["slowest_modules"]:
+        print(f"{row['cumulative_ms']:>14} {row['self_ms']:>9}  {row['module']}")
+    print(f"\n{'self ms':>9}  package")
+    for row in result["packages"]:
+        print(f"{row['self_ms']:>9}  {row['package']}")
+
+    output = args.output or PROJECT_ROOT / "benchmark_results" / f"import-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": {"git_commit": git_commit(), "python": sys.version.split()[0], "repeat": args.repeat},
+                   **result}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
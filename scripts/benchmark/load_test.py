@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Load Generator
+Drives the full pipeline (api3) and the api1/api2 endpoints of a running server with a weighted
+mix of endpoints and workbook sizes, stepping up either the number of concurrent clients
+(closed loop) or the arrival rate (open loop). Each step reports throughput, p50/p95/p99 latency
+and error rates, and the run reports the step at which the server saturated.
+
+Without --base-url the mock LLM server and a uvicorn server pointed at it are started locally,
+so event-loop and worker bottlenecks can be found without a live LLM.
+
+Usage (from the project root):
+    python scripts/benchmark/load_test.py --concurrency 1 2 4 8 16 --duration 30 --workers 2
+    python scripts/benchmark/load_test.py --rps 1 2 4 8 --mix api3=0.6 api1=0.3 api2=0.1 \\
+        --sizes small=0.5 medium=0.3 large=0.2 --base-url http://localhost:8000 --root-context sttm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from generate_fixtures import DEFAULT_OUTPUT_DIR, DEFAULT_SIZES
+from run_benchmark import ENDPOINTS, PROJECT_ROOT, MockLLMServer, git_commit, load_manifest, percentile, service_environment
+
+HEALTH_PATH = "v1.1/health"
+# Open loop: a step whose throughput falls this far behind the arrival rate is saturated
+ARRIVAL_TOLERANCE = 0.1
+
+
+def parse_weights(specs: List[str], allowed: Optional[List[str]] = None) -> Dict[str, float]:
+    weights = {}
+    for spec in specs:
+        name, _, weight = spec.partition("=")
+        try:
+            weights[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight '{spec}', expected NAME=WEIGHT")
+        if allowed is not None and name not in allowed:
+            raise argparse.ArgumentTypeError(f"Unknown name '{name}', expected one of {allowed}")
+    return weights
+
+
+class ServiceUnderTest:
+    """uvicorn serving the application with the given workers, configured for the mock LLM"""
+    def __init__(self, mock_url: str, port: int, workers: int):
+        self.environment = {**os.environ, **service_environment(mock_url)}
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.command = [sys.executable, "-m", "uvicorn", "sttm_to_notebook_generator_integrated.api3_sttm_to_notebook_generator:app",
+                        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=PROJECT_ROOT, env=self.environment)
+        health_url = f"{self.base_url}/{self.environment['rootContext']}/{HEALTH_PATH}"
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                httpx.get(health_url, timeout=1).raise_for_status()
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.5)
+        self.process.terminate()
+        raise RuntimeError("Server did not become ready within 120s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, root_context: str, fixtures_dir: Path, manifest: Dict,
+                 endpoint_weights: Dict[str, float], size_weights: Dict[str, float], timeout: float, seed: int):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+        self.root_context = root_context
+        self.fixtures = {f["name"]: f for f in manifest["fixtures"] if f["name"] in size_weights}
+        if not self.fixtures:
+            raise ValueError(f"None of {list(size_weights)} are in the fixture manifest")
+        self.workbooks = {name: (fixtures_dir / f["file"]).read_bytes() for name, f in self.fixtures.items()}
+        self.endpoint_weights = endpoint_weights
+        self.size_weights = {name: size_weights[name] for name in self.fixtures}
+        self.random = random.Random(seed)
+        self.api2_payloads = {}
+
+    def pick(self):
+        endpoint = self.random.choices(list(self.endpoint_weights), weights=list(self.endpoint_weights.values()))[0]
+        fixture = self.random.choices(list(self.size_weights), weights=list(self.size_weights.values()))[0]
+        return endpoint, self.fixtures[fixture]
+
+    async def send(self, endpoint: str, fixture: Dict) -> httpx.Response:
+        url = f"/{self.root_context}/{ENDPOINTS[endpoint]}"
+        if endpoint == "api2":
+            return await self.client.post(url, json=self.api2_payloads[fixture["name"]])
+        sttm_metadata = [{"file_name": fixture["file"], "sheet_name": fixture["sheet"], "target_table_name": fixture["target_table"]}]
+        notebook_metadata = {"user_id": "load.test", "table_load_type": "silver", "domain": "benchmark",
+                             "product": "benchmark", "notebook_name": f"{fixture['name']}_notebook"}
+        data = {"sttm_metadata_json": json.dumps(sttm_metadata), "notebook_metadata_json": json.dumps(notebook_metadata)}
+        files = [("sttm_files", (fixture["file"], self.workbooks[fixture["name"]], "application/octet-stream"))]
+        return await self.client.post(url, data=data, files=files)
+
+    async def timed(self, endpoint: str, fixture: Dict, samples: List[Dict]) -> None:
+        started_at = time.perf_counter()
+        try:
+            response = await self.send(endpoint, fixture)
+            outcome = str(response.status_code)
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        samples.append({"endpoint": endpoint, "fixture": fixture["name"], "outcome": outcome,
+                        "latency": time.perf_counter() - started_at, "finished_at": time.perf_counter()})
+
+    async def prepare(self) -> None:
+        """api2 replays the api1 output for each workbook size, so collect it once up front"""
+        for name, fixture in self.fixtures.items():
+            response = await self.send("api1", fixture)
+            if response.status_code != 200:
+                raise RuntimeError(f"api1 failed with {response.status_code} for fixture {name}: {response.text[:200]}")
+            self.api2_payloads[name] = response.json()
+
+    async def closed_loop(self, concurrency: int, duration: float) -> List[Dict]:
+        """``concurrency`` clients each sending their next request as soon as the last one returns"""
+        samples = []
+        stop_at = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < stop_at:
+                await self.timed(*self.pick(), samples)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return samples
+
+    async def open_loop(self, rps: float, duration: float, poisson: bool, max_in_flight: int) -> List[Dict]:
+        """Requests arrive at ``rps`` regardless of how fast the server answers"""
+        samples = []
+        in_flight = set()
+        started_at = time.perf_counter()
+        next_arrival = started_at
+        while next_arrival < started_at + duration:
+            await asyncio.sleep(max(next_arrival - time.perf_counter(), 0))
+            if len(in_flight) >= max_in_flight:
+                samples.append({"endpoint": None, "fixture": None, "outcome": "client_overload",
+                                "latency": 0.0, "finished_at": time.perf_counter()})
+            else:
+                task = asyncio.create_task(self.timed(*self.pick(), samples))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_arrival += self.random.expovariate(rps) if poisson else 1 / rps
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        return samples
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def summarize_step(samples: List[Dict], elapsed: float) -> Dict:
+    ok = [s for s in samples if s["outcome"] == "200"]
+    latencies = [s["latency"] for s in ok]
+    by_endpoint = {}
+    for endpoint in sorted({s["endpoint"] for s in samples if s["endpoint"]}):
+        endpoint_samples = [s for s in samples if s["endpoint"] == endpoint]
+        endpoint_ok = [s["latency"] for s in endpoint_samples if s["outcome"] == "200"]
+        by_endpoint[endpoint] = {
+            "requests": len(endpoint_samples),
+            "error_rate": round(1 - len(endpoint_ok) / len(endpoint_samples), 4),
+            "p50": percentile(endpoint_ok, 50),
+            "p95": percentile(endpoint_ok, 95),
+        }
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else None,
+        "outcomes": dict(Counter(s["outcome"] for s in samples)),
+        "latency_seconds": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                            "p99": percentile(latencies, 99), "max": round(max(latencies), 4) if latencies else None},
+        "by_endpoint": by_endpoint,
+    }
+
+
+def find_saturation(steps: List[Dict], mode: str, max_error_rate: float, p95_slo: Optional[float],
+                    min_gain: float) -> Dict:
+    """
+    The first step that breaks the error-rate or p95 SLO, falls behind the offered arrival rate
+    (open loop) or adds clients without adding throughput (closed loop); the step before it is
+    the highest sustainable load.
+    """
+    previous = None
+    for step in steps:
+        reasons = []
+        if step["error_rate"] is not None and step["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {step['error_rate']:.1%} > {max_error_rate:.1%}")
+        p95 = step["latency_seconds"]["p95"]
+        if p95_slo is not None and p95 is not None and p95 > p95_slo:
+            reasons.append(f"p95 {p95}s > {p95_slo}s")
+        if mode == "rps" and step["throughput_rps"] is not None and step["throughput_rps"] < step["offered"] * (1 - ARRIVAL_TOLERANCE):
+            reasons.append(f"throughput {step['throughput_rps']} req/s behind offered {step['offered']} req/s")
+        if mode == "concurrency" and previous is not None and previous["throughput_rps"]:
+            load_growth = step["offered"] / previous["offered"] - 1
+            gain = step["throughput_rps"] / previous["throughput_rps"] - 1
+            if gain < load_growth * min_gain:
+                reasons.append(f"throughput +{gain:.0%} for +{load_growth:.0%} clients")
+        if reasons:
+            return {"saturated_at": step["offered"], "reasons": reasons,
+                    "max_sustainable": previous["offered"] if previous else None}
+        previous = step
+    return {"saturated_at": None, "reasons": [], "max_sustainable": steps[-1]["offered"] if steps else None}
+
+
+async def run_steps(generator: LoadGenerator, args) -> List[Dict]:
+    await generator.prepare()
+    mode, levels = ("rps", args.rps) if args.rps else ("concurrency", args.concurrency)
+    steps = []
+    try:
+        for level in levels:
+            started_at = time.perf_counter()
+            if mode == "rps":
+                samples = await generator.open_loop(level, args.duration, args.poisson, args.max_in_flight)
+            else:
+                samples = await generator.closed_loop(level, args.duration)
+            step = {"offered": level, **summarize_step(samples, time.perf_counter() - started_at)}
+            steps.append(step)
+            latency = step["latency_seconds"]
+            print(f"{mode}={level:<6} {step['throughput_rps']:>8} req/s  p50={latency['p50']}s p95={latency['p95']}s "
+                  f"p99={latency['p99']}s  errors={step['error_rate']:.1%}  {step['outcomes']}")
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+    finally:
+        await generator.close()
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step up load on the pipeline endpoints and find the saturation point")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Closed loop: concurrent clients per step")
+    load.add_argument("--rps", type=float, nargs="+", help="Open loop: arrival rate per step")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per step")
+    parser.add_argument("--cooldown", type=float, default=2, help="Pause between steps")
+    parser.add_argument("--poisson", action="store_true", help="Open loop: exponential inter-arrival times")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: requests beyond this are counted as client_overload")
+    parser.add_argument("--mix", nargs="+", default=["api3=1"], help="Endpoint weights, e.g. api3=0.6 api1=0.3 api2=0.1")
+    parser.add_argument("--sizes", nargs="+", default=["small=0.5", "medium=0.3", "large=0.2"], help="Workbook size weights")
+    parser.add_argument("--fixtures-dir", type=Path, default=DEFAULT_OUTPUT_DIR, help="Generated on first use")
+    parser.add_argument("--timeout", type=float, default=300, help="Client timeout per request")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--p95-slo", type=float, help="p95 latency (s) above which a step counts as saturated")
+    parser.add_argument("--min-gain", type=float, default=0.5,
+                        help="Closed loop: saturated when throughput grows by less than this share of the client increase")
+    parser.add_argument("--base-url", help="Server under test; when omitted, the mock LLM and a local server are started")
+    parser.add_argument("--root-context", default=os.environ.get("rootContext", "bench"), help="rootContext of the server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--port", type=int, default=8910, help="Port for the local server")
+    parser.add_argument("--mock-port", type=int, default=8900)
+    parser.add_argument("--latency", action="append", default=None, help="Mock LLM latency spec (see mock_llm_server.py)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmark_results/load-<timestamp>.json)")
+    args = parser.parse_args()
+    latency = args.latency or ["normal:0.5,0.1"]
+
+    endpoint_weights = parse_weights(args.mix, allowed=list(ENDPOINTS))
+    size_weights = parse_weights(args.sizes)
+    manifest = load_manifest(args.fixtures_dir, DEFAULT_SIZES)
+
+    def generator(base_url: str) -> LoadGenerator:
+        return LoadGenerator(base_url, args.root_context, args.fixtures_dir, manifest,
+                             endpoint_weights, size_weights, args.timeout, args.seed)
+
+    if args.base_url:
+        steps = asyncio.run(run_steps(generator(args.base_url), args))
+    else:
+        os.environ["rootContext"] = args.root_context
+        with MockLLMServer(args.fixtures_dir / "responses.json", latency, args.seed, args.mock_port) as mock, \
+                ServiceUnderTest(mock.url, args.port, args.workers) as service:
+            steps = asyncio.run(run_steps(generator(service.base_url), args))
+
+    mode = "rps" if args.rps else "concurrency"
+    saturation = find_saturation(steps, mode, args.max_error_rate, args.p95_slo, args.min_gain)
+    print(f"\nSaturation: {saturation['saturated_at'] or 'not reached'}"
+          + (f" ({'; '.join(saturation['reasons'])})" if saturation["reasons"] else "")
+          + f"; max sustainable {mode}: {saturation['max_sustainable']}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "mode": mode,
+            "duration_per_step": args.duration,
+            "mix": endpoint_weights,
+            "sizes": size_weights,
+            "base_url": args.base_url or f"local ({args.workers} worker(s), mock LLM {latency})",
+        },
+        "steps": steps,
+        "saturation": saturation,
+    }
+    output = args.output or PROJECT_ROOT / "benchmark_results" / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
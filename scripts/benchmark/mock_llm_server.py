@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Mock Azure OpenAI Server
+A local stand-in for the Azure OpenAI chat completions API that replays recorded responses
+with a configurable latency distribution, so pipeline benchmarks are cheap, repeatable and
+can run in CI. Both plain and streamed (SSE) completions are served, with token usage.
+
+Recorded responses are a JSON list, tried in order; the first entry whose ``match`` string
+occurs in the request's messages is returned (an empty ``match`` matches everything):
+
+    [{"kind": "sql", "match": "orders_target", "content": "transform_sql_query_dict = ..."}, ...]
+
+Entries captured from real traffic (see replay_requests.py) also carry ``prompt_sha256``, the
+SHA-256 of the message texts joined by newlines, which is preferred over ``match``; ``once``
+entries are served a single time and ``latency`` replays the recorded call duration. The list
+can be replaced at runtime with ``PUT /responses``.
+
+Latency specs (seconds): ``fixed:0.8``, ``uniform:0.5,2``, ``normal:1.5,0.4`` or
+``lognormal:MU,SIGMA`` (of the underlying normal). A spec prefixed with ``KIND=`` only applies
+to entries of that kind. For streamed responses a third of the latency is spent before the first
+chunk and the rest is spread over the chunks.
+
+Usage (from the project root):
+    python scripts/benchmark/mock_llm_server.py --responses scripts/benchmark/fixtures/responses.json \\
+        --latency normal:1.5,0.4 --latency llm_validation=fixed:0.5 --port 8900
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+import time
+from itertools import count
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from sttm_to_notebook_generator_integrated.token_counter import count_message_tokens, count_tokens
+
+STREAM_CHUNK_CHARS = 200
+TIME_TO_FIRST_CHUNK_SHARE = 1 / 3
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Turn a latency spec into a sampler returning non-negative seconds"""
+    distribution, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+        samplers = {
+            "fixed": lambda: values[0],
+            "uniform": lambda: rng.uniform(values[0], values[1]),
+            "normal": lambda: rng.gauss(values[0], values[1]),
+            "lognormal": lambda: rng.lognormvariate(values[0], values[1]),
+        }
+        sampler = samplers[distribution]
+        sampler()
+    except (KeyError, IndexError, ValueError):
+        raise argparse.ArgumentTypeError(f"Invalid latency spec '{spec}'")
+    return lambda: max(sampler(), 0.0)
+
+
+def message_texts(messages: List[Dict]) -> List[str]:
+    texts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        texts.append(content)
+    return texts
+
+
+def create_app(responses: List[Dict], latencies: Dict[str, Callable[[], float]]) -> FastAPI:
+    app = FastAPI(title="Mock Azure OpenAI")
+    ids = count(1)
+    state = {"responses": responses, "used": set()}
+    stats = {"requests": 0, "by_kind": {}, "unmatched": 0, "prompt_matches": 0}
+
+    def pick(prompt: str) -> Dict:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        candidates = [(idx, entry) for idx, entry in enumerate(state["responses"]) if idx not in state["used"]]
+        exact = [(idx, entry) for idx, entry in candidates if entry.get("prompt_sha256") == digest]
+        for idx, entry in exact or [(idx, entry) for idx, entry in candidates if entry.get("match", "") in prompt]:
+            if entry.get("once"):
+                state["used"].add(idx)
+            stats["prompt_matches"] += bool(exact)
+            return entry
+        return None
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", **stats}
+
+    @app.put("/responses")
+    async def replace_responses(request: Request):
+        state["responses"] = await request.json()
+        state["used"] = set()
+        stats.update({"requests": 0, "by_kind": {}, "unmatched": 0, "prompt_matches": 0})
+        return {"responses": len(state["responses"])}
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        texts = message_texts(body.get("messages", []))
+        prompt = "\n".join(texts)
+        entry = pick(prompt)
+        stats["requests"] += 1
+        if entry is None:
+            stats["unmatched"] += 1
+            raise HTTPException(status_code=400, detail={"error": {"code": "no_recorded_response",
+                                                                   "message": "No recorded response matches this prompt"}})
+        kind = entry.get("kind", "default")
+        stats["by_kind"][kind] = stats["by_kind"].get(kind, 0) + 1
+
+        latency = entry["latency"] if entry.get("latency") is not None else latencies.get(kind, latencies["default"])()
+        completion_id = f"chatcmpl-mock-{next(ids)}"
+        created = int(time.time())
+        content = entry["content"]
+        # Counted like the service counts prompts, so benchmark and in-flight token figures agree
+        usage = {"prompt_tokens": count_message_tokens(texts), "completion_tokens": count_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
+
+        def chunk(delta: Dict, finish_reason=None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }) + "\n\n"
+
+        async def events():
+            await asyncio.sleep(latency * TIME_TO_FIRST_CHUNK_SHARE)
+            per_chunk = latency * (1 - TIME_TO_FIRST_CHUNK_SHARE) / len(pieces)
+            for idx, piece in enumerate(pieces):
+                delta = {"role": "assistant", "content": piece} if idx == 0 else {"content": piece}
+                yield chunk(delta)
+                await asyncio.sleep(per_chunk)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield "data: " + json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                             "model": deployment, "choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def build_latencies(specs: List[str], seed: int) -> Dict[str, Callable[[], float]]:
+    rng = random.Random(seed)
+    latencies = {"default": parse_latency("fixed:0", rng)}
+    for spec in specs:
+        kind, sep, distribution = spec.partition("=")
+        if not sep:
+            kind, distribution = "default", spec
+        latencies[kind] = parse_latency(distribution, rng)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded chat completions with simulated latency")
+    parser.add_argument("--responses", required=True, help="Recorded responses JSON (see generate_fixtures.py)")
+    parser.add_argument("--latency", action="append", default=[], help="Latency spec, optionally KIND=SPEC; repeatable")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    with open(args.responses) as f:
+        responses = json.load(f)
+    app = create_app(responses, build_latencies(args.latency, args.seed))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
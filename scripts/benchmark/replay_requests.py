@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Captured Request Replay
+Re-executes requests recorded by the capture middleware (CAPTURE_MODE=hash|blob) against the
+current build, in-process, with the mock LLM server serving each request's recorded LLM
+responses. For every request it checks that the output is equivalent to the recorded one
+(same status and same digest, ignoring ids, timings and date stamps) and compares latency and
+pipeline overhead, so performance changes can be validated on real traffic shapes offline.
+
+Lines without a ``capture_version`` are skipped, so unrelated JSONL files are harmless.
+Workbooks captured in `hash` mode are looked up by SHA-256 (then by file name) in --workbooks-dir.
+
+Usage (from the project root):
+    python scripts/benchmark/replay_requests.py captures/requests-*.jsonl \\
+        --workbooks-dir data/sample_sttm --output benchmark_results/replay.json
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from run_benchmark import PROJECT_ROOT, MockLLMServer, configure_environment, git_commit, summarize
+
+
+def load_records(paths: List[Path], limit: Optional[int]) -> Tuple[List[Dict], Counter]:
+    records, skipped = [], Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    skipped["invalid_json"] += 1
+                    continue
+                if not isinstance(record, dict) or "capture_version" not in record:
+                    skipped["not_a_capture"] += 1
+                    continue
+                records.append(record)
+                if limit and len(records) >= limit:
+                    return records, skipped
+    return records, skipped
+
+
+class WorkbookStore:
+    """Captured workbooks: inline blobs, else files in a directory matched by SHA-256 or name"""
+    def __init__(self, directory: Optional[Path]):
+        self.by_hash, self.by_name = {}, {}
+        if directory:
+            for path in directory.rglob("*"):
+                if path.is_file():
+                    self.by_hash[hashlib.sha256(path.read_bytes()).hexdigest()] = path
+                    self.by_name.setdefault(path.name, path)
+
+    def content(self, entry: Dict) -> Optional[bytes]:
+        if entry.get("blob"):
+            return base64.b64decode(entry["blob"])
+        path = self.by_hash.get(entry["sha256"]) or self.by_name.get(entry["filename"])
+        return path.read_bytes() if path else None
+
+
+class Replayer:
+    def __init__(self, app, root_context: str, mock: MockLLMServer, workbooks: WorkbookStore, recorded_latency: bool):
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=None)
+        self.root_context = root_context
+        self.mock = mock
+        self.workbooks = workbooks
+        self.recorded_latency = recorded_latency
+
+    def local_path(self, path: str) -> str:
+        # The capturing server's rootContext is swapped for the local one
+        rest = path.lstrip("/").split("/", 1)[1] if "/" in path.lstrip("/") else ""
+        return f"/{self.root_context}/{rest}"
+
+    async def replay(self, record: Dict) -> Dict:
+        from sttm_to_notebook_generator_integrated.request_capture import response_digest
+
+        result = {"request_id": record["request_id"], "path": record["path"], "recorded_status": record["status"]}
+        files = []
+        for entry in record["files"]:
+            content = self.workbooks.content(entry)
+            if content is None:
+                return {**result, "skipped": f"workbook {entry['filename']} ({entry['sha256'][:12]}) not available"}
+            files.append((entry["field"], (entry["filename"], content, entry["content_type"] or "application/octet-stream")))
+
+        recorded_calls = [call for call in record["llm_calls"] if call.get("content") is not None]
+        await self.mock_responses([{
+            "kind": call["stage"],
+            "prompt_sha256": call["prompt_sha256"],
+            "content": call["content"],
+            "latency": call["seconds"] if self.recorded_latency else 0,
+            "once": True
+        } for call in recorded_calls])
+
+        headers = {**record["headers"], "X-Include-Usage": "true", "X-Request-ID": f"replay-{record['request_id']}"}
+        started_at = time.perf_counter()
+        if record["json"] is not None:
+            response = await self.client.post(self.local_path(record["path"]), json=record["json"], headers=headers)
+        else:
+            response = await self.client.post(self.local_path(record["path"]), data=record["form"], files=files, headers=headers)
+        latency = time.perf_counter() - started_at
+
+        recorded_llm_seconds = sum(call["seconds"] for call in record["llm_calls"])
+        result.update({
+            "status": response.status_code,
+            "recorded_latency": record["latency_seconds"],
+            "latency": round(latency, 3),
+            "recorded_overhead": round(record["latency_seconds"] - recorded_llm_seconds, 3),
+            "overhead": None,
+            "llm_calls": {"recorded": len(record["llm_calls"]), **self.mock_stats()},
+        })
+        digest = None
+        if response.status_code == 200:
+            body = response.json()
+            timings = body.get("timings") or {}
+            if timings.get("total_seconds") is not None:
+                result["overhead"] = round(timings["total_seconds"] - sum(c["seconds"] for c in timings.get("llm_calls", [])), 3)
+            digest = response_digest(body)
+        recorded_digest = (record.get("response") or {}).get("sha256")
+        result["equivalent"] = response.status_code == record["status"] and (recorded_digest is None or digest == recorded_digest)
+        return result
+
+    async def mock_responses(self, entries: List[Dict]) -> None:
+        async with httpx.AsyncClient() as client:
+            (await client.put(f"{self.mock.url}/responses", json=entries, timeout=10)).raise_for_status()
+
+    def mock_stats(self) -> Dict:
+        stats = self.mock.stats()
+        return {"replayed": stats["requests"], "prompt_matches": stats["prompt_matches"], "unmatched": stats["unmatched"]}
+
+    async def run(self, records: List[Dict]) -> List[Dict]:
+        results = []
+        try:
+            for record in records:
+                result = await self.replay(record)
+                results.append(result)
+                if "skipped" in result:
+                    print(f"skip  {result['request_id']}: {result['skipped']}")
+                else:
+                    print(f"{'same' if result['equivalent'] else 'DIFF'}  {result['request_id']}  {result['path']}  "
+                          f"status {result['recorded_status']}->{result['status']}  latency {result['recorded_latency']}s->"
+                          f"{result['latency']}s  overhead {result['recorded_overhead']}s->{result['overhead']}s  "
+                          f"prompts matched {result['llm_calls']['prompt_matches']}/{result['llm_calls']['replayed']}")
+        finally:
+            await self.client.aclose()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured requests against the current build with recorded LLM responses")
+    parser.add_argument("captures", type=Path, nargs="+", help="Capture JSONL files")
+    parser.add_argument("--workbooks-dir", type=Path, help="Where to find workbooks captured in hash mode")
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests")
+    parser.add_argument("--llm-latency", choices=["recorded", "zero"], default="recorded",
+                        help="Replay each LLM call with its recorded duration, or instantly")
+    parser.add_argument("--port", type=int, default=8900, help="Port for the mock LLM server")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmark_results/replay-<timestamp>.json)")
+    args = parser.parse_args()
+
+    records, skipped_lines = load_records(args.captures, args.limit)
+    print(f"{len(records)} captured request(s); skipped lines: {dict(skipped_lines) or 'none'}")
+    if not records:
+        return
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump([], f)
+    try:
+        with MockLLMServer(Path(f.name), [], seed=7, port=args.port) as mock:
+            configure_environment(mock.url)
+            from sttm_to_notebook_generator_integrated.api3_sttm_to_notebook_generator import app
+
+            replayer = Replayer(app, os.environ["rootContext"], mock, WorkbookStore(args.workbooks_dir),
+                                recorded_latency=args.llm_latency == "recorded")
+            results = asyncio.run(replayer.run(records))
+    finally:
+        os.unlink(f.name)
+
+    replayed = [r for r in results if "skipped" not in r]
+    mismatches = [r["request_id"] for r in replayed if not r["equivalent"]]
+    summary = {
+        "captured": len(records),
+        "replayed": len(replayed),
+        "skipped": len(results) - len(replayed),
+        "equivalent": len(replayed) - len(mismatches),
+        "mismatches": mismatches,
+        "recorded_latency_seconds": summarize([r["recorded_latency"] for r in replayed]),
+        "latency_seconds": summarize([r["latency"] for r in replayed]),
+        "recorded_overhead_seconds": summarize([r["recorded_overhead"] for r in replayed]),
+        "overhead_seconds": summarize([r["overhead"] for r in replayed if r["overhead"] is not None]),
+    }
+    print(f"\n{summary['equivalent']}/{summary['replayed']} equivalent, {summary['skipped']} skipped; "
+          f"overhead p50 {summary['recorded_overhead_seconds']['p50']}s -> {summary['overhead_seconds']['p50']}s")
+
+    report = {
+        "meta": {"git_commit": git_commit(), "captures": [str(p) for p in args.captures], "llm_latency": args.llm_latency,
+                 "skipped_lines": dict(skipped_lines)},
+        "summary": summary,
+        "requests": results,
+    }
+    output = args.output or PROJECT_ROOT / "benchmark_results" / f"replay-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
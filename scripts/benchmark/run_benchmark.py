@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Offline Pipeline Benchmark
+Runs api1 (STTM -> JSON), api2 (JSON -> notebook) and api3 (full pipeline) in-process against
+the mock LLM server and measures, per endpoint and fixture size:
+    - latency (client side) and pipeline overhead, i.e. the request's server-side time minus the
+      time spent waiting on LLM calls (taken from the X-Include-Usage timings block)
+    - throughput at each concurrency level
+    - peak Python heap allocated while serving one request (tracemalloc)
+Results are written as JSON for regression comparison between runs.
+
+Usage (from the project root):
+    python scripts/benchmark/run_benchmark.py --requests 10 --concurrency 1 4 \\
+        --latency normal:0.8,0.2 --output benchmark_results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+from generate_fixtures import DEFAULT_OUTPUT_DIR, DEFAULT_SIZES, FixtureGenerator, parse_sizes
+
+ENDPOINTS = {
+    "api1": "api/v1/edf/genai/codegenservices/orchestrate-json-sttm",
+    "api2": "api/v1/edf/genai/codegenservices/generate-notebook",
+    "api3": "api/v1/edf/genai/codegenservices/from-sttm-generate-notebook",
+}
+
+
+def service_environment(mock_url: str) -> Dict[str, str]:
+    """Environment pointing the service at the mock server (these names take precedence over AZURE_OPENAI_*)"""
+    return {
+        "endpoint": mock_url,
+        "deployment": "mock-gpt-4o",
+        "api_version": "2024-12-01-preview",
+        "subscription_key": "benchmark",
+        "rootContext": os.environ.get("rootContext", "bench"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "INFO"),
+    }
+
+
+def configure_environment(mock_url: str) -> None:
+    """Point the in-process service at the mock server; must run before the application is imported"""
+    os.environ.update(service_environment(mock_url))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, None for an empty sample"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return round(ordered[min(rank, len(ordered) - 1)], 4)
+
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+class MockLLMServer:
+    def __init__(self, responses: Path, latency: List[str], seed: int, port: int):
+        self.url = f"http://127.0.0.1:{port}"
+        self.command = [sys.executable, str(BENCHMARK_DIR / "mock_llm_server.py"), "--responses", str(responses),
+                        "--seed", str(seed), "--port", str(port)]
+        for spec in latency:
+            self.command += ["--latency", spec]
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Mock LLM server exited with code {self.process.returncode}")
+            try:
+                httpx.get(f"{self.url}/health", timeout=1).raise_for_status()
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise RuntimeError("Mock LLM server did not become ready within 30s")
+
+    def stats(self) -> Dict:
+        return httpx.get(f"{self.url}/health", timeout=5).json()
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+class PipelineBenchmark:
+    def __init__(self, app, root_context: str, fixtures_dir: Path, manifest: Dict):
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+        self.root_context = root_context
+        self.fixtures_dir = fixtures_dir
+        self.manifest = manifest
+        self.api2_payloads = {}
+
+    def form(self, fixture: Dict):
+        sttm_metadata = [{"file_name": fixture["file"], "sheet_name": fixture["sheet"], "target_table_name": fixture["target_table"]}]
+        notebook_metadata = {"user_id": "bench.user", "table_load_type": "silver", "domain": "benchmark",
+                             "product": "benchmark", "notebook_name": f"{fixture['name']}_notebook"}
+        data = {"sttm_metadata_json": json.dumps(sttm_metadata), "notebook_metadata_json": json.dumps(notebook_metadata)}
+        files = [("sttm_files", (fixture["file"], (self.fixtures_dir / fixture["file"]).read_bytes(), "application/octet-stream"))]
+        return data, files
+
+    async def call(self, endpoint: str, fixture: Dict) -> Dict:
+        """One request; returns latency, server-side time, LLM wait time and status"""
+        url = f"/{self.root_context}/{ENDPOINTS[endpoint]}"
+        headers = {"X-Include-Usage": "true"}
+        started_at = time.perf_counter()
+        if endpoint == "api2":
+            response = await self.client.post(url, json=self.api2_payloads[fixture["name"]], headers=headers)
+        else:
+            data, files = self.form(fixture)
+            response = await self.client.post(url, data=data, files=files, headers=headers)
+        latency = time.perf_counter() - started_at
+
+        result = {"status": response.status_code, "latency": latency, "body": None}
+        if response.status_code == 200:
+            body = response.json()
+            timings = body.get("timings") or {}
+            result["body"] = body
+            result["server_seconds"] = timings.get("total_seconds")
+            result["llm_seconds"] = sum(call["seconds"] for call in timings.get("llm_calls", []))
+            result["usage"] = body.get("usage") or {}
+        return result
+
+    async def warm_up(self, endpoint: str, fixture: Dict) -> None:
+        """First request per endpoint and fixture (imports, template loading) is not measured"""
+        if endpoint == "api2" and fixture["name"] not in self.api2_payloads:
+            result = await self.call("api1", fixture)
+            if result["status"] != 200:
+                raise RuntimeError(f"api1 failed with {result['status']} for fixture {fixture['name']}")
+            self.api2_payloads[fixture["name"]] = result["body"]
+        await self.call(endpoint, fixture)
+
+    async def measure(self, endpoint: str, fixture: Dict, requests: int, concurrency: int) -> Dict:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with semaphore:
+                return await self.call(endpoint, fixture)
+
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*(limited() for _ in range(requests)))
+        elapsed = time.perf_counter() - started_at
+
+        succeeded = [r for r in results if r["status"] == 200]
+        overheads = [r["server_seconds"] - r["llm_seconds"] for r in succeeded if r["server_seconds"] is not None]
+        usages = [r["usage"] for r in succeeded]
+
+        def mean_of(key: str) -> Optional[float]:
+            return round(sum(usage.get(key, 0) for usage in usages) / len(usages), 2) if usages else None
+
+        return {
+            "endpoint": endpoint,
+            "fixture": fixture["name"],
+            "columns": fixture["columns"],
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": len(results) - len(succeeded),
+            "latency_seconds": summarize([r["latency"] for r in succeeded]),
+            "llm_wait_seconds": summarize([r["llm_seconds"] for r in succeeded]),
+            "overhead_seconds": summarize(overheads),
+            "throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed else None,
+            # One notebook (api2/api3) or JSON conversion (api1) per request
+            "llm_calls_per_request": mean_of("llm_calls"),
+            "tokens_per_request": {"prompt": mean_of("prompt_tokens"), "completion": mean_of("completion_tokens"),
+                                   "total": round(mean_of("prompt_tokens") + mean_of("completion_tokens"), 2) if usages else None},
+        }
+
+    async def peak_memory(self, endpoint: str, fixture: Dict) -> float:
+        """Peak traced Python heap (MiB) above the baseline while serving one request"""
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await self.call(endpoint, fixture)
+        _, peak = tracemalloc.get_traced_memory()
+        return round((peak - baseline) / 2 ** 20, 3)
+
+    async def run(self, endpoints: List[str], requests: int, concurrency_levels: List[int], memory: bool) -> List[Dict]:
+        results = []
+        for fixture in self.manifest["fixtures"]:
+            for endpoint in endpoints:
+                await self.warm_up(endpoint, fixture)
+                for concurrency in concurrency_levels:
+                    row = await self.measure(endpoint, fixture, requests, concurrency)
+                    results.append(row)
+                    print(f"{endpoint:>5} {fixture['name']:>8} c={concurrency:<3} p50={row['latency_seconds']['p50']}s "
+                          f"overhead p50={row['overhead_seconds']['p50']}s {row['throughput_rps']} req/s "
+                          f"errors={row['errors']}")
+
+        if memory:
+            # Separate pass: tracemalloc slows allocation-heavy code down, so it never overlaps the timings
+            tracemalloc.start()
+            try:
+                for row in results:
+                    fixture = next(f for f in self.manifest["fixtures"] if f["name"] == row["fixture"])
+                    row["peak_traced_mib"] = await self.peak_memory(row["endpoint"], fixture)
+            finally:
+                tracemalloc.stop()
+        await self.client.aclose()
+        return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_manifest(fixtures_dir: Path, sizes: List[str]) -> Dict:
+    manifest_path = fixtures_dir / "manifest.json"
+    if not manifest_path.exists():
+        print(f"Generating fixtures in {fixtures_dir}")
+        return FixtureGenerator().generate(fixtures_dir, parse_sizes(sizes))
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark api1/api2/api3 in-process against a mock LLM")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--fixtures-dir", type=Path, default=DEFAULT_OUTPUT_DIR, help="Generated on first use")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="Fixture sizes when generating, NAME=COLUMNS")
+    parser.add_argument("--requests", type=int, default=10, help="Measured requests per endpoint, fixture and concurrency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency", action="append", default=None,
+                        help="Mock LLM latency spec, optionally KIND=SPEC (see mock_llm_server.py); repeatable")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8900, help="Port for the mock LLM server")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmark_results/benchmark-<timestamp>.json)")
+    args = parser.parse_args()
+    latency = args.latency or ["normal:0.5,0.1"]
+
+    manifest = load_manifest(args.fixtures_dir, args.sizes)
+    with MockLLMServer(args.fixtures_dir / "responses.json", latency, args.seed, args.port) as mock:
+        configure_environment(mock.url)
+        from sttm_to_notebook_generator_integrated.api3_sttm_to_notebook_generator import app
+
+        benchmark = PipelineBenchmark(app, os.environ["rootContext"], args.fixtures_dir, manifest)
+        results = asyncio.run(benchmark.run(args.endpoints, args.requests, args.concurrency, not args.no_memory))
+        mock_stats = mock.stats()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "latency": latency,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "log_level": os.environ.get("LOG_LEVEL"),
+            "fixtures": manifest["fixtures"],
+        },
+        "results": results,
+        "process": {"max_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)},
+        "mock_llm": mock_stats,
+    }
+
+    output = args.output or PROJECT_ROOT / "benchmark_results" / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
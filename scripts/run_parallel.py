@@ -86,7 +86,7 @@ async def full_process_generate_notebook_v1(
             notebook_metadata_json=notebook_metadata_json
         )
         
-        logger.debug(f"V1.0.0 JSON conversion output: {json_conversion_output}")
+        logger.debug("V1.0.0 JSON conversion output: %s", json_conversion_output)
         
         # Process the output for notebook generation (same logic as V1.1.0)
         processed_notebook_meta = json_conversion_output["notebook_metadata_json"]
@@ -0,0 +1,246 @@
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+from opentelemetry import trace
+
+from .log_handler import get_logger
+from .metrics import record_admission, set_admission_load
+from .read_env_var import (
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_BATCH_MAX_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_MAX_WAIT_SECONDS
+)
+
+logger = get_logger("<Admission Control>")
+
+PRIORITY_HEADER = "X-Request-Priority"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Served in this order when a slot frees up
+PRIORITIES = (INTERACTIVE, BATCH)
+MAX_RETRY_AFTER_SECONDS = 300
+# Weight of the latest request in the moving average of how long a slot is held
+HOLD_SECONDS_SMOOTHING = 0.2
+
+CODEGEN_PATH = "/api/v1/edf/genai/codegenservices/"
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; ``reason`` is `queue_full`, `displaced` or `timeout`."""
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many requests of one endpoint run at once in this worker. Requests beyond
+    ``max_concurrency`` wait in a queue of at most ``queue_size``, interactive ones ahead of
+    batch ones, for up to ``max_wait_seconds``. A freed slot is handed straight to the next
+    waiter. When the queue is full an interactive request takes the place of the newest
+    batch waiter; otherwise the newcomer is rejected.
+
+    Attributes:
+        endpoint (str): Endpoint name, used as the metric label
+        default_priority (str): Priority of requests that do not send X-Request-Priority
+        in_flight (int): Requests holding a slot
+    """
+    def __init__(self, endpoint: str, max_concurrency: int, queue_size: int, max_wait_seconds: float,
+                 default_priority: str = INTERACTIVE):
+        self.endpoint = endpoint
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.max_wait_seconds = max_wait_seconds
+        self.default_priority = default_priority
+        self.in_flight = 0
+        self._queues: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._hold_seconds: Optional[float] = None
+        self._admitted = 0
+        self._rejected = Counter()
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: the queue ahead drained at the average hold time"""
+        hold_seconds = self._hold_seconds if self._hold_seconds is not None else self.max_wait_seconds
+        estimate = math.ceil(hold_seconds * (self.queued() + 1) / self.max_concurrency)
+        return max(1, min(estimate, MAX_RETRY_AFTER_SECONDS))
+
+    async def acquire(self, priority: str) -> float:
+        """
+        Wait for a slot.
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            AdmissionRejected: When the queue is full, the request was displaced by an
+                interactive one, or no slot freed up within max_wait_seconds
+        """
+        arrived_at = time.monotonic()
+        if self.in_flight < self.max_concurrency and not self.queued():
+            self.in_flight += 1
+            self._admit(priority, 0.0)
+            return 0.0
+        if self.queued() >= self.queue_size:
+            if priority == INTERACTIVE and self._queues[BATCH]:
+                self._queues[BATCH].pop().set_exception(AdmissionRejected("displaced", self.retry_after()))
+            else:
+                self._reject(priority, "queue_full", 0.0)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(waiter)
+        self._publish()
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait_seconds)
+        except asyncio.CancelledError:
+            if waiter.done() and waiter.exception() is None:
+                # The slot was handed over just as the request went away
+                self.release()
+            else:
+                self._discard(priority, waiter)
+            raise
+        waited = time.monotonic() - arrived_at
+        if not waiter.done():
+            self._discard(priority, waiter)
+            self._reject(priority, "timeout", waited)
+        if waiter.exception() is not None:
+            self._reject(priority, "displaced", waited)
+        self._admit(priority, waited)
+        return waited
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        """Free a slot, or hand it to the next waiter"""
+        if held_seconds is not None:
+            self._hold_seconds = held_seconds if self._hold_seconds is None else \
+                (1 - HOLD_SECONDS_SMOOTHING) * self._hold_seconds + HOLD_SECONDS_SMOOTHING * held_seconds
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._publish()
+                    return
+        self.in_flight -= 1
+        self._publish()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+            "average_hold_seconds": round(self._hold_seconds, 2) if self._hold_seconds is not None else None
+        }
+
+    def _discard(self, priority: str, waiter: asyncio.Future) -> None:
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            pass
+        self._publish()
+
+    def _admit(self, priority: str, waited: float) -> None:
+        self._admitted += 1
+        record_admission(self.endpoint, priority, "admitted", waited)
+        self._publish()
+
+    def _reject(self, priority: str, reason: str, waited: float) -> None:
+        self._rejected[reason] += 1
+        record_admission(self.endpoint, priority, reason, waited)
+        retry_after = self.retry_after()
+        logger.warning(f"Rejected {priority} request to {self.endpoint} ({reason}; {self.in_flight} running, "
+                       f"{self.queued()} queued); retry after {retry_after}s")
+        raise AdmissionRejected(reason, retry_after)
+
+    def _publish(self) -> None:
+        set_admission_load(self.endpoint, self.in_flight,
+                           {priority: len(queue) for priority, queue in self._queues.items()})
+
+
+def _controller(endpoint: str, max_concurrency: int, default_priority: str = INTERACTIVE) -> AdmissionController:
+    return AdmissionController(endpoint, max_concurrency, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_SECONDS,
+                               default_priority)
+
+
+# One controller per LLM-backed endpoint, keyed by the path after CODEGEN_PATH
+admission_controllers: Dict[str, AdmissionController] = {
+    endpoint: _controller(endpoint, ADMISSION_MAX_CONCURRENCY) for endpoint in (
+        "from-sttm-generate-notebook",
+        "from-sttm-generate-notebook/stream",
+        "orchestrate-json-sttm",
+        "build-json-mapping-from-excel-no-baseline",
+        "generate-notebook"
+    )
+}
+admission_controllers["from-sttm-generate-notebook/batch"] = _controller(
+    "from-sttm-generate-notebook/batch", ADMISSION_BATCH_MAX_CONCURRENCY, default_priority=BATCH
+)
+
+
+def admission_stats() -> dict:
+    """Per-endpoint admission state of this worker, served by the /stats endpoint"""
+    return {endpoint: controller.stats() for endpoint, controller in admission_controllers.items()}
+
+
+def request_priority(header_value: Optional[str], default: str) -> str:
+    """X-Request-Priority when it names a known priority class, otherwise the endpoint's default"""
+    value = (header_value or "").strip().lower()
+    return value if value in PRIORITIES else default
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the endpoint's AdmissionController before the request body is
+    read, so a rejected upload costs no memory. The slot is held until the response body is
+    complete, which includes the whole stream for SSE and NDJSON endpoints. Rejections are
+    429 responses with a Retry-After header.
+    """
+    def __init__(self, app, controllers: Optional[Dict[str, AdmissionController]] = None):
+        self.app = app
+        self.controllers = admission_controllers if controllers is None else controllers
+
+    async def __call__(self, scope, receive, send):
+        controller = None
+        if ADMISSION_CONTROL_ENABLED and scope["type"] == "http" and scope["method"] == "POST" \
+                and CODEGEN_PATH in scope["path"]:
+            controller = self.controllers.get(scope["path"].split(CODEGEN_PATH, 1)[1].rstrip("/"))
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        header_name = PRIORITY_HEADER.lower().encode("latin-1")
+        incoming = next((value.decode("latin-1") for key, value in scope["headers"] if key == header_name), None)
+        priority = request_priority(incoming, controller.default_priority)
+        span = trace.get_current_span()
+        span.set_attribute("sttm.admission.priority", priority)
+        try:
+            waited = await controller.acquire(priority)
+        except AdmissionRejected as e:
+            span.set_attribute("sttm.admission.rejected", e.reason)
+            scope["admission_path"] = scope["path"]
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": f"Too many concurrent requests to {controller.endpoint} ({e.reason}); "
+                                   f"retry after {e.retry_after}s"},
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        span.set_attribute("sttm.admission.wait_seconds", round(waited, 3))
+
+        admitted_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.monotonic() - admitted_at)
@@ -1,17 +1,33 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import List
-import pandas as pd
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from typing import List, TYPE_CHECKING
 import requests
 import json
 import time
 from io import BytesIO
-from .log_session_id import SESSION_LOG_ID
-from .log_handler import get_logger
+from functools import lru_cache
+from .request_id import get_request_id
+from .log_handler import get_logger, log_queue_stats
+from .retry_policy import RetryPolicy, ErrorClass, classify_error
+from .request_deadline import DeadlineExceeded, get_request_deadline, llm_call_timeout
+from .client_disconnect import track_llm_call, disconnect_stats
+from .progress_events import emit_progress
+from .workbook_cache import WorkbookCache
+from .validation_engine import validate_json_sttm, STTM_JSON_SCHEMA, STTM_PATCH_JSON_SCHEMA
+from .json_repair import repair_json, repair_stats, success_rate as repair_success_rate
+from .metrics import observe_stage, record_error, record_exception, observe_llm_call, record_json_attempts
+from .usage_recorder import USAGE_HEADER, usage_requested, start_usage_recording, attach_usage
+from .tracing import tracer, Status, StatusCode
+from .token_counter import count_tokens, tokenizer_name
+from .warm_up import warm_up_status
+from .admission import admission_stats
 logger = get_logger("<API1 :: JSON Converter>")
 
 # --- Added as per user request ---
 import re
-from collections import defaultdict
+import csv
+import copy
+from io import StringIO
+from collections import defaultdict, deque
 from typing import Optional, List, Set, Tuple
 # --- End of user-added imports ---
 
@@ -24,6 +40,10 @@ from typing import Optional, List, Set, Tuple
 
 from .read_env_var import *
 
+# pandas is imported on first use (or by the start-up warm-up) to keep module load fast
+if TYPE_CHECKING:
+    import pandas as pd
+
 app1 = APIRouter()
 
 def generate_sparksql(json_mapping,query_already_exist='n'):
@@ -204,6 +224,109 @@ def get_llm_response(user_prompt):
     except Exception as e:
         logger.error(f"Azure OpenAI LLM invocation failed with error: {str(e)}")
         raise HTTPException(status_code=502, detail="LLM call failed!")
+
+@lru_cache(maxsize=1)
+def get_async_llm_client():
+    """Shared async Azure OpenAI client; retries are owned by RetryPolicy, not the SDK."""
+    import openai
+    from .read_env_var import (
+        AZURE_OPENAI_ENDPOINT,
+        AZURE_OPENAI_API_VERSION,
+        AZURE_OPENAI_API_KEY
+    )
+
+    return openai.AsyncAzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        max_retries=0,
+    )
+
+# Structured output modes from strongest to weakest. The active mode steps down for the
+# rest of the process when the deployment rejects a response_format.
+STRUCTURED_OUTPUT_MODES = ["json_schema", "json_object", "off"]
+_structured_output = {"mode": STRUCTURED_OUTPUT_MODE if STRUCTURED_OUTPUT_MODE in STRUCTURED_OUTPUT_MODES else "off"}
+
+
+# Attempts needed per file, split by the structured output mode in effect
+attempt_stats_by_output_mode = defaultdict(lambda: {"files": 0, "attempts": 0, "first_attempt_successes": 0, "failures": 0})
+
+
+def structured_output_mode() -> str:
+    """Structured output mode currently in effect (after any fallback)"""
+    return _structured_output["mode"]
+
+
+def build_response_format(json_schema: Optional[dict], schema_name: str = "json_sttm") -> Optional[dict]:
+    """response_format for the active mode; json_object is used when no schema is given"""
+    mode = structured_output_mode()
+    if mode == "json_schema" and json_schema is not None:
+        return {"type": "json_schema", "json_schema": {"name": schema_name, "schema": json_schema, "strict": False}}
+    if mode in ("json_schema", "json_object"):
+        return {"type": "json_object"}
+    return None
+
+
+def is_response_format_rejection(exc: Exception) -> bool:
+    import openai
+    message = str(exc).lower()
+    return isinstance(exc, openai.BadRequestError) and any(
+        marker in message for marker in ("response_format", "json_schema", "json_object")
+    )
+
+
+async def get_llm_response_async(user_prompt, timeout=None, json_output: bool = False,
+                                 json_schema: Optional[dict] = None, schema_name: str = "json_sttm",
+                                 stage: str = "json_generation"):
+    """
+    Non-blocking variant of get_llm_response used inside the async retry loops.
+    With ``json_output`` the provider's structured output is requested (``json_schema`` when
+    given and supported, else JSON mode); a deployment that rejects it is retried without
+    it straight away, and later calls use the weaker mode. Each call's latency and tokens
+    are recorded against ``stage``.
+    """
+    try:
+        from .read_env_var import AZURE_OPENAI_DEPLOYMENT
+
+        while True:
+            response_format = build_response_format(json_schema, schema_name) if json_output else None
+            extra_args = {"response_format": response_format} if response_format else {}
+            messages = [
+                {"role": "system", "content": "You are an expert data engineer specializing in ETL processes and JSON generation from Excel-based source-to-target mappings."},
+                {"role": "user", "content": user_prompt}
+            ]
+            try:
+                with observe_llm_call(stage, AZURE_OPENAI_DEPLOYMENT) as call:
+                    call["messages"] = [message["content"] for message in messages]
+                    async with track_llm_call("JSON STTM conversion"):
+                        response = await get_async_llm_client().chat.completions.create(
+                            model=AZURE_OPENAI_DEPLOYMENT,  # Your deployment name (not model name!)
+                            messages=messages,
+                            max_tokens=4096,
+                            temperature=0.1,
+                            timeout=timeout,
+                            **extra_args
+                        )
+                    call["model"] = getattr(response, "model", None) or AZURE_OPENAI_DEPLOYMENT
+                    call["content"] = response.choices[0].message.content
+                    if getattr(response, "usage", None) is not None:
+                        call["prompt_tokens"] = response.usage.prompt_tokens
+                        call["completion_tokens"] = response.usage.completion_tokens
+                break
+            except Exception as e:
+                if not response_format or not is_response_format_rejection(e):
+                    raise
+                fallback = "json_object" if response_format["type"] == "json_schema" else "off"
+                logger.warning(f"Deployment rejected {response_format['type']} output ({str(e)[:200]}); falling back to '{fallback}'")
+                # Concurrent calls may already have stepped further down
+                if STRUCTURED_OUTPUT_MODES.index(fallback) > STRUCTURED_OUTPUT_MODES.index(structured_output_mode()):
+                    _structured_output["mode"] = fallback
+
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Azure OpenAI LLM invocation failed with error: {str(e)}")
+        # Chain the original error so RetryPolicy can classify it
+        raise HTTPException(status_code=502, detail="LLM call failed!") from e
       
 def get_metadata(metadata_list, file_name):
     for idx, meta_dict in enumerate(metadata_list):
@@ -213,7 +336,7 @@ def get_metadata(metadata_list, file_name):
     return meta_dict
 
 # --- Added: Excel Data Optimizer ---
-def optimize_excel_data(df: pd.DataFrame) -> Tuple[str, dict]:
+def optimize_excel_data(df: "pd.DataFrame") -> Tuple[str, dict]:
     """
     Optimize Excel data and extract metadata for smarter processing.
     Returns optimized CSV and metadata dict.
@@ -418,6 +541,9 @@ def comprehensive_python_validation(json_string: str, excel_metadata: dict) -> T
     """
     Run all Python validations and determine if LLM validation is needed.
     Returns (is_valid, all_issues, needs_llm_validation)
+
+    Superseded by validation_engine.validate_json_sttm (single pass, same messages); kept
+    as the reference implementation for scripts/analysis/validation_benchmark.py.
     """
     validator = SmartValidator()
     all_issues = []
@@ -511,6 +637,57 @@ def analyze_error_patterns(errors: List[str]) -> str:
     return "\n".join(f"- {part}" for part in feedback_parts)
 # --- End Error Pattern Analyzer ---
 
+# --- Added: Incremental Patch Mode ---
+def filter_sheet_rows(sheet_data: str, column_name: Optional[str], values: List[str]) -> str:
+    """Keep the CSV header and the rows whose ``column_name`` value is one of ``values``"""
+    rows = list(csv.reader(StringIO(sheet_data)))
+    if not rows or column_name not in rows[0]:
+        return sheet_data
+    col_idx = rows[0].index(column_name)
+    wanted = {str(value).strip() for value in values}
+
+    output = StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(rows[0])
+    writer.writerows(row for row in rows[1:] if col_idx < len(row) and row[col_idx].strip() in wanted)
+    return output.getvalue()
+
+
+def merge_column_patch(base_json: dict, patch_content: str, missing_columns: List[str]) -> str:
+    """
+    Merge the LLM's patch (column_mapping entries for the missing columns, plus any new
+    source tables) into the JSON from the previous attempt. Existing entries are never
+    overwritten. Raises ValueError when the patch is unusable.
+    """
+    try:
+        patch = json.loads(patch_content)
+    except json.JSONDecodeError:
+        repaired, _ = repair_json(patch_content)
+        if repaired is None:
+            raise ValueError("Column patch is not valid JSON")
+        patch = json.loads(repaired)
+    if not isinstance(patch, dict):
+        raise ValueError("Column patch must be a JSON object")
+
+    patch_mapping = patch.get("column_mapping", patch)
+    if not isinstance(patch_mapping, dict):
+        raise ValueError("Column patch column_mapping must be a dictionary")
+
+    merged = copy.deepcopy(base_json)
+    column_mapping = merged.setdefault("column_mapping", {})
+    for col_name in missing_columns:
+        if col_name in patch_mapping and col_name not in column_mapping:
+            column_mapping[col_name] = patch_mapping[col_name]
+
+    known_sources = {t.get("name") for t in merged.get("source_tables", []) if isinstance(t, dict)}
+    for table in patch.get("source_tables", []) if isinstance(patch.get("source_tables"), list) else []:
+        if isinstance(table, dict) and table.get("name") and table["name"] not in known_sources:
+            merged.setdefault("source_tables", []).append(table)
+            known_sources.add(table["name"])
+
+    return json.dumps(merged)
+# --- End Incremental Patch Mode ---
+
 appName = os.environ.get('rootContext')
 @app1.post(f"/{appName}/api/v1/edf/genai/codegenservices/build-json-mapping-from-excel-no-baseline")
 async def build_json_mapping_from_excel_no_baseline(
@@ -554,6 +731,8 @@ async def build_json_mapping_from_excel_no_baseline(
 
 
         try:
+            import pandas as pd
+
             contents = await file.read()
             excel_data = pd.read_excel(BytesIO(contents), sheet_name=sheet_name)
         except Exception as e:
@@ -762,7 +941,7 @@ async def build_json_mapping_from_excel_no_baseline(
             logger.error(message)
             raise HTTPException(status_code=400, detail=message)
 
-        notebook_id = SESSION_LOG_ID
+        notebook_id = get_request_id()
         notebook_metadata["notebook_id"] = notebook_id
              
         ## This line is to generate spark SQL for testing. Disable this unless you want to see sample spark SQL generated
@@ -792,9 +971,10 @@ async def build_json_mapping_from_excel_no_baseline(
 #     return result_json
 
 # --- Simplified llm_semantic_validator ---
-def llm_semantic_validator(generated_json: str, excel_sttm: str) -> dict:
+async def llm_semantic_validator(generated_json: str, excel_sttm: str, deadline: Optional[float] = None) -> dict:
     """
     Simplified LLM validation for complex cases only.
+    Transient LLM failures are retried under the caller's deadline.
     """
     # Create a minimal validation prompt
     validation_prompt = f"""
@@ -812,12 +992,22 @@ Return only:
 {{"is_valid": true/false, "strict_issues": ["issue1", "issue2"], "non_strict_issues": []}}
 """
 
-    try:
-        result = get_llm_response(user_prompt=validation_prompt)
+    async def validate_once():
+        timeout = llm_call_timeout(deadline, stage="LLM semantic validation")
+        result = await get_llm_response_async(user_prompt=validation_prompt, timeout=timeout, json_output=True,
+                                              stage="llm_validation")
         clean_json = result.replace("```json", "").replace("```", "").strip()
         return json.loads(clean_json)
+
+    policy = RetryPolicy(max_attempts=LLM_CALL_MAX_ATTEMPTS, deadline=deadline, name="llm_semantic_validator")
+    try:
+        return await policy.call(validate_once)
+    except DeadlineExceeded:
+        # Out of time: fail the request rather than pass unvalidated JSON
+        raise
     except Exception as e:
         logger.error(f"LLM validation error: {str(e)}")
+        record_exception("llm_validation", e)
         # Default to passing if LLM validation fails
         return {"is_valid": True, "strict_issues": [], "non_strict_issues": []}
 
@@ -826,8 +1016,12 @@ Return only:
 
 
 class STTMAgentOrchestrator:
-    def __init__(self, max_attempts: int = 3):
+    def __init__(self, max_attempts: int = 3, deadline: Optional[float] = None):
         self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.last_attempts = 0
+        self.python_validations = 0
+        self.llm_validations = 0
 
     # --- Old method commented out for traceability ---
     # async def generate_reliable_json_sttm(self, sheet_data: str, meta: dict) -> dict:
@@ -880,63 +1074,136 @@ class STTMAgentOrchestrator:
     # --- New method: Smart validation and retry logic ---
     async def generate_reliable_json_sttm(self, sheet_data: str, excel_metadata: dict) -> dict:
         """Generate JSON with smart validation and minimal LLM calls"""
+        policy = RetryPolicy(max_attempts=self.max_attempts, deadline=self.deadline, name="json_sttm")
         attempt = 0
         cumulative_feedback = ""
+        # Set when the previous attempt only lacked some columns: the next attempt asks for those alone
+        patch_base, patch_columns = None, []
 
-        while attempt < self.max_attempts:
+        while True:
             attempt += 1
-            logger.info(f"Attempt {attempt}: Generating JSON STTM")
+            patch_mode, base_json = patch_base is not None, patch_base
+            patch_base = None
+            logger.info(f"Attempt {attempt}: Generating JSON STTM" + (f" (patching {len(patch_columns)} missing columns)" if patch_mode else ""))
+            emit_progress("json_attempt", attempt=attempt, max_attempts=self.max_attempts, patch_mode=patch_mode)
 
             # Build prompt with progressive detail
-            json_prompt = self.build_smart_prompt(sheet_data, excel_metadata, cumulative_feedback, attempt)
-
+            if patch_mode:
+                json_prompt = self.build_patch_prompt(sheet_data, excel_metadata, base_json, patch_columns)
+                logger.info(f"Patch prompt is {count_tokens(json_prompt)} tokens (full sheet data is {count_tokens(sheet_data)} tokens)")
+            else:
+                json_prompt = self.build_smart_prompt(sheet_data, excel_metadata, cumulative_feedback, attempt)
+                logger.info(f"Prompt is {count_tokens(json_prompt)} tokens")
+
+            attempt_started_at = time.monotonic()
             try:
                 # Generate JSON
-                content = get_llm_response(user_prompt=json_prompt)
-                clean_json = content.replace("```json", "").replace("```", "").strip()
-
-                # Run comprehensive Python validation
-                is_valid, issues, needs_llm_validation = comprehensive_python_validation(
-                    clean_json, excel_metadata
-                )
-
-                if not is_valid:
+                timeout = llm_call_timeout(self.deadline, stage="JSON STTM generation")
+                with observe_stage("json_generation"):
+                    content = await get_llm_response_async(
+                        user_prompt=json_prompt, timeout=timeout, json_output=True,
+                        json_schema=STTM_PATCH_JSON_SCHEMA if patch_mode else STTM_JSON_SCHEMA,
+                        schema_name="json_sttm_patch" if patch_mode else "json_sttm"
+                    )
+                    clean_json = content.replace("```json", "").replace("```", "").strip()
+                    if patch_mode:
+                        clean_json = merge_column_patch(base_json, clean_json, patch_columns)
+
+                with observe_stage("validation"):
+                    # Run comprehensive Python validation (parses the JSON once)
+                    report = validate_json_sttm(clean_json, excel_metadata)
+
+                    # Syntax defects are repaired locally; only unrecoverable output costs an LLM retry
+                    if report.json_data is None:
+                        repaired_json, fixes = repair_json(clean_json)
+                        if repaired_json is not None:
+                            emit_progress("json_repaired", attempt=attempt, fixes=fixes)
+                            clean_json = repaired_json
+                            report = validate_json_sttm(clean_json, excel_metadata)
+                self.python_validations += 1
+                processing_metrics["python_validations"] += 1
+                for rule in {issue["rule"] for issue in report.errors}:
+                    record_error("validation", ErrorClass.VALIDATION, rule,
+                                 detail="; ".join(issue["message"] for issue in report.errors if issue["rule"] == rule))
+                issues = report.messages
+                emit_progress("python_validation", attempt=attempt, is_valid=report.is_valid, issues=report.errors)
+                if report.warnings:
+                    logger.info(f"Business rule warnings: {[w['message'] for w in report.warnings]}")
+
+                if not report.is_valid:
                     logger.warning(f"Python validation failed: {issues}")
                     cumulative_feedback = analyze_error_patterns(issues)
-                    time.sleep(0.5)  # Brief pause
-                    continue
-
-                # Parse JSON for potential LLM validation
-                json_data = json.loads(clean_json)
-
-                # Only use LLM validation if needed
-                if needs_llm_validation:
-                    logger.info("Complex transformations detected, running LLM validation")
-                    validation_result = llm_semantic_validator(clean_json, sheet_data)
-
-                    if not validation_result["is_valid"]:
-                        logger.warning(f"LLM validation failed: {validation_result['strict_issues']}")
-                        cumulative_feedback = "\n".join(validation_result['strict_issues'])
-                        time.sleep(1)
-                        continue
+                    error_class = ErrorClass.VALIDATION
+                    # Only columns missing: keep the rest and patch them in next time
+                    if JSON_PATCH_MODE and report.missing_columns and \
+                            all(issue["rule"] == "column_coverage" for issue in report.errors):
+                        patch_base, patch_columns = report.json_data, report.missing_columns
                 else:
-                    logger.info("Skipping LLM validation - all transformations are standard")
+                    json_data = report.json_data
 
-                # All validations passed
-                logger.info(f"JSON generation successful on attempt {attempt}")
-                return json_data
+                    # Only use LLM validation if needed
+                    if not report.needs_llm_validation:
+                        logger.info("Skipping LLM validation - all transformations are standard")
+                        logger.info(f"JSON generation successful on attempt {attempt}")
+                        self.record_attempts(attempt, succeeded=True)
+                        return json_data
 
+                    logger.info("Complex transformations detected, running LLM validation")
+                    with observe_stage("llm_validation"):
+                        validation_result = await llm_semantic_validator(clean_json, sheet_data, deadline=self.deadline)
+                    self.llm_validations += 1
+                    processing_metrics["llm_validations"] += 1
+                    emit_progress("llm_validation", attempt=attempt, is_valid=validation_result["is_valid"],
+                                  issues=validation_result.get("strict_issues", []))
+
+                    if validation_result["is_valid"]:
+                        # All validations passed
+                        logger.info(f"JSON generation successful on attempt {attempt}")
+                        self.record_attempts(attempt, succeeded=True)
+                        return json_data
+
+                    logger.warning(f"LLM validation failed: {validation_result['strict_issues']}")
+                    cumulative_feedback = "\n".join(validation_result['strict_issues'])
+                    error_class = ErrorClass.VALIDATION
+                    record_error("llm_validation", error_class, "semantic_issues", detail=cumulative_feedback)
+
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                logger.error(f"Attempt {attempt} failed: {str(e)}")
+                error_class = classify_error(e)
+                logger.error(f"Attempt {attempt} failed ({error_class.value}): {str(e)}")
+                emit_progress("json_attempt_failed", attempt=attempt, error_class=error_class.value, error=str(e)[:200])
                 cumulative_feedback = f"Error occurred: {str(e)[:200]}"
-                time.sleep(1)
 
-        # Max attempts reached
+            policy.record_attempt(time.monotonic() - attempt_started_at)
+            if not policy.can_retry(attempt, error_class):
+                break
+            await policy.wait(attempt, error_class)
+
+        self.record_attempts(attempt, succeeded=False)
+        if error_class != ErrorClass.FATAL and attempt < self.max_attempts and policy.budget_exhausted():
+            message = f"Stopped after {attempt} attempts; remaining budget cannot fit another attempt. Last issues: {cumulative_feedback}"
+            logger.error(message)
+            raise DeadlineExceeded("JSON STTM generation", message)
+
+        # Max attempts or a fatal error reached
         raise HTTPException(
             status_code=500,
-            detail=f"Failed after {attempt} attempts. Last issues: {cumulative_feedback}"
+            detail=f"Failed after {attempt} attempts ({error_class.value} error). Last issues: {cumulative_feedback}"
         )
 
+    def record_attempts(self, attempts: int, succeeded: bool) -> None:
+        """Record attempts used for one file, per structured output mode, for /stats and /metrics"""
+        self.last_attempts = attempts
+        processing_metrics["successful_generations" if succeeded else "failed_generations"] += 1
+        processing_metrics["avg_attempts"].append(attempts)
+        record_json_attempts(attempts, structured_output_mode(), succeeded)
+        stats = attempt_stats_by_output_mode[structured_output_mode()]
+        stats["files"] += 1
+        stats["attempts"] += attempts
+        stats["first_attempt_successes"] += int(succeeded and attempts == 1)
+        stats["failures"] += int(not succeeded)
+
     def build_smart_prompt(self, sheet_data: str, excel_metadata: dict,
                           feedback: str = "", attempt: int = 1) -> str:
         """Build a targeted prompt based on Excel structure"""
@@ -974,6 +1241,37 @@ Output only valid JSON, no explanations.
 
         return prompt
 
+    def build_patch_prompt(self, sheet_data: str, excel_metadata: dict,
+                           base_json: dict, missing_columns: List[str]) -> str:
+        """Build a prompt asking only for the missing columns' column_mapping entries"""
+        source_rows = filter_sheet_rows(sheet_data, excel_metadata.get('target_column_col'), missing_columns)
+        example_column, example_entry = next(iter(base_json.get("column_mapping", {}).items()), (None, None))
+        source_table_names = [t.get("name") for t in base_json.get("source_tables", []) if isinstance(t, dict)]
+
+        prompt = f"""
+You are a data engineering expert. A JSON STTM was generated from a spreadsheet but these target columns are missing from its column_mapping:
+{json.dumps(missing_columns)}
+
+These are the spreadsheet rows for the missing columns:
+
+{source_rows}
+
+Existing source_tables: {json.dumps(source_table_names)}
+"""
+        if example_column is not None:
+            prompt += f"""
+Use exactly the same structure as this existing column_mapping entry:
+{json.dumps({example_column: example_entry})}
+"""
+        prompt += """
+Return a JSON object with:
+- column_mapping: entries for ONLY the missing target columns, keyed by their exact names
+- source_tables: only source tables that the new entries need and that are not already listed (may be empty)
+
+Output only valid JSON, no explanations.
+"""
+        return prompt
+
     @staticmethod
     def syntax_validator(json_string: str) -> bool:
         """Quick syntax validation"""
@@ -1046,9 +1344,15 @@ Output only valid JSON, no explanations.
 async def orchestrate_json_sttm(
     sttm_metadata_json: str = Form(...),
     sttm_files: List[UploadFile] = File(...),
-    notebook_metadata_json: str = Form(...)
+    notebook_metadata_json: str = Form(...),
+    request: Request = None
 ):
-    """Simplified endpoint with smart validation"""
+    """
+    Simplified endpoint with smart validation. Over HTTP, `timings` and `usage` blocks are
+    added to the response when the X-Include-Usage header asks for them; api3 calls this
+    directly and attaches them to its own response instead.
+    """
+    recorder = start_usage_recording(usage_requested(request.headers.get(USAGE_HEADER))) if request is not None else None
 
     # Input validation
     try:
@@ -1061,11 +1365,11 @@ async def orchestrate_json_sttm(
     if not isinstance(metadata_list, list):
         raise HTTPException(status_code=400, detail="sttm_metadata_json must be a list")
 
-    if len(metadata_list) != len(sttm_files):
-        raise HTTPException(status_code=400, detail="Mismatch between files and metadata count")
+    if not metadata_list:
+        raise HTTPException(status_code=400, detail="sttm_metadata_json must not be empty")
 
-    results = {}
-    orchestrator = STTMAgentOrchestrator()
+    # Retries for every file share the request's overall time budget
+    deadline = get_request_deadline()
     processing_stats = {
         "files_processed": 0,
         "python_validations": 0,
@@ -1073,64 +1377,130 @@ async def orchestrate_json_sttm(
         "errors": []
     }
 
-    # Process each file
-    for idx, file in enumerate(sttm_files):
-        logger.info(f"Processing file {idx+1}/{len(sttm_files)}: {file.filename}")
-
-        try:
-            # Get metadata
-            meta = get_metadata(metadata_list, file.filename.strip())
-            if not meta:
-                error_msg = f"No metadata found for {file.filename}"
-                logger.error(error_msg)
-                processing_stats["errors"].append(error_msg)
-                continue
-
-            target_table_name = meta.get("target_table_name", "").strip()
-            sheet_name = meta.get("sheet_name", "").strip()
-
-            if not target_table_name or not sheet_name:
-                error_msg = f"Missing target_table_name or sheet_name for {file.filename}"
-                logger.error(error_msg)
-                processing_stats["errors"].append(error_msg)
-                continue
+    # Read each upload once. Metadata entries refer to files by name, so several entries
+    # (e.g. different sheets of one workbook) share a single parse of that workbook.
+    workbook_cache = WorkbookCache()
+    for file in sttm_files:
+        workbook_cache.add(file.filename.strip(), await file.read())
 
-            # Read and optimize Excel
-            contents = file.file.read()
-            excel_data = pd.read_excel(BytesIO(contents), sheet_name=sheet_name)
+    for file_name in workbook_cache.workbooks:
+        if not get_metadata(metadata_list, file_name):
+            error_msg = f"No metadata found for {file_name}"
+            logger.error(error_msg)
+            processing_stats["errors"].append(error_msg)
 
-            # Smart optimization and metadata extraction
-            optimized_csv, excel_metadata = optimize_excel_data(excel_data)
+    entries = []
+    for meta in metadata_list:
+        file_name = meta.get("file_name", "").strip()
+        target_table_name = meta.get("target_table_name", "").strip()
+        sheet_name = meta.get("sheet_name", "").strip()
 
-            # Check if file has minimum required data
-            if not excel_metadata.get('has_data'):
-                error_msg = f"File {file.filename} has no data"
-                logger.error(error_msg)
-                processing_stats["errors"].append(error_msg)
-                continue
+        if file_name not in workbook_cache:
+            error_msg = f"No uploaded file named {file_name}"
+            logger.error(error_msg)
+            processing_stats["errors"].append(error_msg)
+            continue
 
-            # Generate JSON with smart validation
-            final_json = await orchestrator.generate_reliable_json_sttm(
-                optimized_csv, excel_metadata
-            )
+        if not target_table_name or not sheet_name:
+            error_msg = f"Missing target_table_name or sheet_name for {file_name}"
+            logger.error(error_msg)
+            processing_stats["errors"].append(error_msg)
+            continue
 
-            results[target_table_name] = {
-                "metadata": meta,
-                "json_sttm": final_json
-            }
-            processing_stats["files_processed"] += 1
+        workbook_cache.require(file_name, sheet_name)
+        entries.append((file_name, sheet_name, meta))
 
+    # Parse the referenced sheets (off the event loop so disconnects are still noticed)
+    sheets = []
+    for idx, (file_name, sheet_name, meta) in enumerate(entries):
+        logger.info(f"Parsing entry {idx+1}/{len(entries)}: {file_name} [{sheet_name}]")
+        try:
+            sheets.append((file_name, meta, await workbook_cache.get(file_name, sheet_name)))
         except Exception as e:
-            error_msg = f"Failed to process {file.filename}: {str(e)}"
+            error_msg = f"Failed to process {file_name}: {str(e)}"
             logger.error(error_msg)
             processing_stats["errors"].append(error_msg)
+            emit_progress("file_failed", file=file_name, error=str(e))
+    processing_stats["workbook_cache"] = workbook_cache.stats()
+
+    response = await build_json_sttm_content(sheets, notebook_metadata, processing_stats, deadline=deadline)
+    logger.info(f"Processing complete. Processed {processing_stats['files_processed']}/{len(metadata_list)} entries "
+                f"(workbook cache: {processing_stats['workbook_cache']})")
+    return attach_usage(response, recorder)
+
+
+async def build_json_sttm_content(sheets: List[Tuple[str, dict, "pd.DataFrame"]], notebook_metadata: dict,
+                                  processing_stats: dict, deadline: Optional[float] = None) -> dict:
+    """
+    Generate the JSON STTM for each already parsed sheet and assemble the api1 response.
+    Shared by orchestrate_json_sttm and the batch endpoint, which parses shared workbooks once.
+
+    Args:
+        sheets (List[Tuple[str, dict, pd.DataFrame]]): (file name, metadata entry, parsed sheet) per STTM
+        notebook_metadata (dict): Notebook metadata, returned with notebook_id and processing_stats added
+        processing_stats (dict): Stats to update; may already hold errors from parsing
+        deadline (Optional[float]): Monotonic deadline shared by every file's retries
+
+    Returns:
+        dict: `status_code`, `notebook_metadata_json` and `content` as expected by api2
+    """
+    results = {}
+    orchestrator = STTMAgentOrchestrator(deadline=deadline)
+    processing_metrics["total_requests"] += 1
+
+    # Process each sheet
+    for file_name, meta, excel_data in sheets:
+        target_table_name = meta.get("target_table_name", "").strip()
+        sheet_name = meta.get("sheet_name", "").strip()
+        logger.info(f"Processing {file_name} [{sheet_name}] -> {target_table_name}")
+
+        with tracer.start_as_current_span("json_sttm.file", attributes={
+            "sttm.file": file_name, "sttm.sheet": sheet_name, "sttm.target_table": target_table_name
+        }) as file_span:
+            try:
+                # Smart optimization and metadata extraction
+                optimized_csv, excel_metadata = optimize_excel_data(excel_data)
+                emit_progress("file_parsed", file=file_name, sheet=sheet_name,
+                              rows=excel_metadata["total_rows"], columns=excel_metadata["total_columns"])
+
+                # Check if file has minimum required data
+                if not excel_metadata.get('has_data'):
+                    error_msg = f"File {file_name} has no data"
+                    logger.error(error_msg)
+                    processing_stats["errors"].append(error_msg)
+                    continue
+
+                # Generate JSON with smart validation
+                final_json = await orchestrator.generate_reliable_json_sttm(
+                    optimized_csv, excel_metadata
+                )
+                file_span.set_attribute("sttm.json.attempts", orchestrator.last_attempts)
+
+                results[target_table_name] = {
+                    "metadata": meta,
+                    "json_sttm": final_json
+                }
+                processing_stats["files_processed"] += 1
+                processing_stats.setdefault("attempts_per_file", {})[target_table_name] = orchestrator.last_attempts
+                processing_stats["structured_output_mode"] = structured_output_mode()
+                emit_progress("json_completed", file=file_name, target_table=target_table_name)
+
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                file_span.record_exception(e)
+                file_span.set_status(Status(StatusCode.ERROR, str(e)[:200]))
+                error_msg = f"Failed to process {file_name}: {str(e)}"
+                logger.error(error_msg)
+                processing_stats["errors"].append(error_msg)
+                emit_progress("file_failed", file=file_name, error=str(e))
 
     # Add processing stats to response
-    notebook_metadata["notebook_id"] = SESSION_LOG_ID
+    processing_stats["python_validations"] += orchestrator.python_validations
+    processing_stats["llm_validations"] += orchestrator.llm_validations
+    notebook_metadata["notebook_id"] = get_request_id()
     notebook_metadata["processing_stats"] = processing_stats
 
-    logger.info(f"Processing complete. Processed {processing_stats['files_processed']}/{len(sttm_files)} files")
-
     return {
         "status_code": "200",
         "notebook_metadata_json": notebook_metadata,
@@ -1140,14 +1510,15 @@ async def orchestrate_json_sttm(
 # --- Simple Monitoring Endpoints ---
 from datetime import datetime
 
-# Simple stats tracking
+# Simple stats tracking, per worker process (/metrics aggregates across workers).
+# total_requests counts JSON conversions; generations are counted per STTM sheet.
 processing_metrics = {
     "total_requests": 0,
     "successful_generations": 0,
     "failed_generations": 0,
     "python_validations": 0,
     "llm_validations": 0,
-    "avg_attempts": []
+    "avg_attempts": deque(maxlen=1000)
 }
 
 @app1.get(f"/{appName}/stats")
@@ -1162,9 +1533,27 @@ def get_stats():
         "python_validations": processing_metrics["python_validations"],
         "llm_validations": processing_metrics["llm_validations"],
         "average_attempts": round(avg_attempts, 2),
+        "cancelled_requests": disconnect_stats["cancelled_requests"],
+        "aborted_llm_calls": disconnect_stats["aborted_llm_calls"],
+        "attempts_per_file_by_output_mode": {
+            mode: {**stats, "average_attempts": round(stats["attempts"] / max(stats["files"], 1), 2),
+                   "first_attempt_success_rate": round(stats["first_attempt_successes"] / max(stats["files"], 1) * 100, 2)}
+            for mode, stats in attempt_stats_by_output_mode.items()
+        },
+        "json_repairs": {
+            "attempted": repair_stats["attempted"],
+            "repaired": repair_stats["repaired"],
+            "unrecoverable": repair_stats["unrecoverable"],
+            "success_rate": round(repair_success_rate() * 100, 2),
+            "fixes": dict(repair_stats["fixes"])
+        },
+        "logging": log_queue_stats(),
+        "tokenizer": tokenizer_name(),
+        "warm_up": warm_up_status(),
+        "admission": admission_stats(),
         "success_rate": round(
             processing_metrics["successful_generations"] /
-            max(processing_metrics["total_requests"], 1) * 100, 2
+            max(processing_metrics["successful_generations"] + processing_metrics["failed_generations"], 1) * 100, 2
         )
     }
 
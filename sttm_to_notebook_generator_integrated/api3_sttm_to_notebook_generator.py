@@ -10,10 +10,15 @@ import signal
 import sys
 import os
 import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from typing import List
+from io import BytesIO
+import asyncio
 import json
 from .read_env_var import *
 
@@ -34,30 +39,151 @@ from .api1_json_converter_optimized import app1 as json_converter_router  # NEW
 from notebook_generator_app.main import app2 as notebook_generator_router
 from notebook_generator_app.schemas.models import PromptRequestModel, PromptResponseModel, MetaInfo # Import necessary models from api2
 from .log_handler import get_logger
+from .request_deadline import (
+    REQUEST_TIMEOUT_HEADER,
+    DeadlineExceeded,
+    budget_from_header,
+    start_request_deadline,
+    check_deadline
+)
+from .client_disconnect import ClientDisconnected, run_until_disconnected, disconnect_stats
+from .progress_events import emit_progress, stream_progress
+from .workbook_cache import WorkbookCache
+from .metrics import MetricsMiddleware, render_metrics
+from .tracing import TracingMiddleware, setup_tracing, tracer
+from .request_id import RequestIdMiddleware, get_request_id, set_request_id
+from .request_capture import CaptureMiddleware
+from .usage_recorder import USAGE_HEADER, usage_requested, start_usage_recording, attach_usage
+from .warm_up import warm_up, is_ready, warm_up_status
+from .admission import AdmissionMiddleware
 logger = get_logger("<API3 :: Encapsulator>")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients, templates and the SQL graph are built before this worker accepts its first request
+    await warm_up()
+    yield
+
+
 # Initialize the main FastAPI application
 app = FastAPI(
     title="STTM to Notebook Generation API - V1.1.0",
     description="Optimized version of the STTM to Notebook Generation API with smart validation.",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # Include the routers from your individual API files
 # This makes their endpoints available under the main FastAPI application
 app.include_router(json_converter_router)
 app.include_router(notebook_generator_router)
+# Innermost, so captured records carry the request id
+app.add_middleware(CaptureMiddleware)
+# Rejected requests are still counted, traced and tagged with a request id, but not captured
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Added last so the request's root span also covers the other middleware
+app.add_middleware(TracingMiddleware)
+setup_tracing()
 appName = os.environ.get('rootContext')
 
+
+async def run_full_pipeline(sttm_metadata_json: str, sttm_files: List[UploadFile], notebook_metadata_json: str, deadline: float):
+    """
+    Runs api1 (STTM -> JSON) followed by api2 (JSON -> notebook) and returns the api2 response.
+    Kept separate from the endpoint so it can be cancelled as a unit when the client disconnects.
+    """
+    # Step 1: Call the logic of api1_json_converter_optimized
+    # We need to directly call the async function from api1_json_converter_optimized.py
+    # and pass the arguments it expects.
+    # We import the `orchestrate_json_sttm` function directly.
+    # from .api1_json_converter import orchestrate_json_sttm as process_sttm_to_json  # OLD VERSION - COMMENTED OUT
+    from .api1_json_converter_optimized import orchestrate_json_sttm as process_sttm_to_json  # NEW OPTIMIZED VERSION
+
+    # Await the execution of the first API's logic (optimized version)
+    with tracer.start_as_current_span("json_conversion", attributes={"sttm.files": len(sttm_files)}):
+        json_conversion_output = await process_sttm_to_json(
+            sttm_metadata_json=sttm_metadata_json,
+            sttm_files=sttm_files,
+            notebook_metadata_json=notebook_metadata_json # Pass this through, as api1 now modifies it
+        )
+    #print(type(json_conversion_output))
+    # %-style so the payload is only stringified when DEBUG is enabled
+    logger.debug("JSON conversion output: %s", json_conversion_output)
+    #print(json_conversion_output.keys())
+
+    return await generate_notebook_from_json_output(json_conversion_output, deadline)
+
+
+async def generate_notebook_from_json_output(json_conversion_output: dict, deadline: float):
+    """
+    Runs api2 (JSON -> notebook) on the output of api1 and returns the api2 response.
+    """
+    # Step 2: Prepare the output of api1_optimized as input for api2
+    # json_conversion_output is already structured as required by PromptRequestModel
+    # after api1_optimized's modification to notebook_metadata_json
+    
+    # Ensure notebook_metadata_json from the first step is properly typed
+    # It's already a dictionary in json_conversion_output, but Pydantic expects MetaInfo model
+    # Re-parse it to ensure it matches the Pydantic model's strict typing if needed
+    # Or, ideally, api1's `notebook_metadata_json` should directly return the MetaInfo model
+    # For simplicity, we'll assume it's directly compatible or cast it.
+    
+    # Since `json_conversion_output` contains `notebook_metadata_json` as a dict
+    # and `content` as a dict of DataInfo, we can directly construct PromptRequestModel
+    
+    # Parse the notebook_metadata_json from the first step's output to MetaInfo
+    # This handles the unique_ID added by the first API (optimized version)
+    processed_notebook_meta = json_conversion_output["notebook_metadata_json"]
+    
+    # Instantiate the PromptRequestModel using the processed data
+    # Note: The `content` from `json_conversion_output` is a dict of `DataInfo`
+    # and `notebook_metadata_json` is a dict that needs to be converted to `MetaInfo`.
+    
+    # Correctly instantiate MetaInfo from the dictionary
+    # Directly instantiate MetaInfo using the dictionary from the first API's output (optimized version)
+    meta_info_instance = MetaInfo(**processed_notebook_meta)
+    #
+    #
+    ## Create the PromptRequestModel instance
+    prompt_request = PromptRequestModel(
+        status_code=json_conversion_output["status_code"],
+        notebook_metadata_json=meta_info_instance, # Use the parsed MetaInfo
+        content=json_conversion_output["content"]
+    )
+
+    # Step 3: Call the logic of api2_notebook_generator
+    # We need to directly call the async function from notebook_generator_app/main.py
+    # and pass the arguments it expects.
+    # We import the `generate_response` function directly.
+    from notebook_generator_app.main import generate_response
+
+    check_deadline(deadline, "notebook generation")
+    emit_progress("stage", stage="notebook_generation", tables=len(prompt_request.content))
+    # Await the execution of the second API's logic
+    with tracer.start_as_current_span("notebook_generation", attributes={"sttm.tables": len(prompt_request.content)}):
+        notebook_response = await generate_response(prompt_request)
+    #print(type(notebook_response))
+    logger.debug("Notebook response: %s", notebook_response)
+    #print(notebook_response.keys())
+    
+    return notebook_response
+
+
 # Define a new endpoint in the main app that orchestrates the flow
 @app.post(f"/{appName}/api/v1/edf/genai/codegenservices/from-sttm-generate-notebook",
           summary="Full Process: Convert STTM to JSON and Generate Silver Notebook",
           response_model=PromptResponseModel,
+          response_model_exclude_none=True,
           response_description="The path to the generated ETL Notebook and status.",
           responses={
               400: {"description": "Bad Request - Invalid input"},
               422: {"description": "Validation Error - Schema mismatch"},
-              500: {"description": "Internal Server Error"}
+              429: {"description": "Too Many Requests - retry after the Retry-After header's seconds"},
+              500: {"description": "Internal Server Error"},
+              504: {"description": "Request time budget exhausted"}
           })
 async def full_process_generate_notebook(
     request: Request,
@@ -71,79 +197,240 @@ async def full_process_generate_notebook(
     2. Takes the output of the first step and formats it as input for the `generate-silver-notebook` endpoint (from `api2_notebook_generator(app/main)`).
     3. Calls the `generate-silver-notebook` endpoint.
     4. Returns the final response from the notebook generation step.
+
+    The request's time budget comes from the `X-Request-Timeout` header (seconds) or
+    REQUEST_TIMEOUT_SECONDS, and is shared by every retry and LLM call downstream.
+    With `X-Include-Usage: true` the response also carries per-stage `timings` and LLM `usage`.
     """
     client_ip = await get_client_ip(request)
-    logger.info(f"Request received from IP: {client_ip}")
+    budget_seconds = budget_from_header(request.headers.get(REQUEST_TIMEOUT_HEADER))
+    deadline = start_request_deadline(budget_seconds)
+    recorder = start_usage_recording(usage_requested(request.headers.get(USAGE_HEADER)))
+    logger.info(f"Request received from IP: {client_ip} (time budget: {budget_seconds:.0f}s)")
     try:
-        # Step 1: Call the logic of api1_json_converter_optimized
-        # We need to directly call the async function from api1_json_converter_optimized.py
-        # and pass the arguments it expects.
-        # We import the `orchestrate_json_sttm` function directly.
-        # from .api1_json_converter import orchestrate_json_sttm as process_sttm_to_json  # OLD VERSION - COMMENTED OUT
-        from .api1_json_converter_optimized import orchestrate_json_sttm as process_sttm_to_json  # NEW OPTIMIZED VERSION
-
-        # Await the execution of the first API's logic (optimized version)
-        json_conversion_output = await process_sttm_to_json(
-            sttm_metadata_json=sttm_metadata_json,
-            sttm_files=sttm_files,
-            notebook_metadata_json=notebook_metadata_json # Pass this through, as api1 now modifies it
+        notebook_response = await run_until_disconnected(
+            request,
+            run_full_pipeline(sttm_metadata_json, sttm_files, notebook_metadata_json, deadline),
+            stage="STTM to notebook pipeline"
         )
-        #print(type(json_conversion_output))
-        logger.debug(json_conversion_output)
-        #print(json_conversion_output.keys())
-        
-        # Step 2: Prepare the output of api1_optimized as input for api2
-        # json_conversion_output is already structured as required by PromptRequestModel
-        # after api1_optimized's modification to notebook_metadata_json
-        
-        # Ensure notebook_metadata_json from the first step is properly typed
-        # It's already a dictionary in json_conversion_output, but Pydantic expects MetaInfo model
-        # Re-parse it to ensure it matches the Pydantic model's strict typing if needed
-        # Or, ideally, api1's `notebook_metadata_json` should directly return the MetaInfo model
-        # For simplicity, we'll assume it's directly compatible or cast it.
-        
-        # Since `json_conversion_output` contains `notebook_metadata_json` as a dict
-        # and `content` as a dict of DataInfo, we can directly construct PromptRequestModel
-        
-        # Parse the notebook_metadata_json from the first step's output to MetaInfo
-        # This handles the unique_ID added by the first API (optimized version)
-        processed_notebook_meta = json_conversion_output["notebook_metadata_json"]
-        
-        # Instantiate the PromptRequestModel using the processed data
-        # Note: The `content` from `json_conversion_output` is a dict of `DataInfo`
-        # and `notebook_metadata_json` is a dict that needs to be converted to `MetaInfo`.
-        
-        # Correctly instantiate MetaInfo from the dictionary
-        # Directly instantiate MetaInfo using the dictionary from the first API's output (optimized version)
-        meta_info_instance = MetaInfo(**processed_notebook_meta)
-        #
-        #
-        ## Create the PromptRequestModel instance
-        prompt_request = PromptRequestModel(
-            status_code=json_conversion_output["status_code"],
-            notebook_metadata_json=meta_info_instance, # Use the parsed MetaInfo
-            content=json_conversion_output["content"]
-        )
-
-        # Step 3: Call the logic of api2_notebook_generator
-        # We need to directly call the async function from notebook_generator_app/main.py
-        # and pass the arguments it expects.
-        # We import the `generate_response` function directly.
-        from notebook_generator_app.main import generate_response
-
-        # Await the execution of the second API's logic
-        notebook_response = await generate_response(prompt_request)
-        #print(type(notebook_response))
-        logger.debug(notebook_response)
-        #print(notebook_response.keys())
-        
         logger.info("Notebook generation completed successfully!")
-        return notebook_response
+        return attach_usage(notebook_response, recorder)
         
+    except (DeadlineExceeded, ClientDisconnected) as e:
+        logger.error(f"Error: {e.detail}")
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(f"/{appName}/api/v1/edf/genai/codegenservices/from-sttm-generate-notebook/stream",
+          summary="Full Process with progress: Server-Sent Events stream of the STTM to Notebook pipeline",
+          response_class=StreamingResponse,
+          responses={
+              200: {"content": {"text/event-stream": {}},
+                    "description": "Progress events, SQL tokens and a final `result` (or `error`) event."}
+          })
+async def full_process_generate_notebook_stream(
+    request: Request,
+    sttm_metadata_json: str = Form(..., description="JSON string of a list of dictionaries containing STTM metadata."),
+    sttm_files: List[UploadFile] = File(..., description="List of STTM Excel files to be processed."),
+    notebook_metadata_json: str = Form(..., description="JSON string containing metadata for the notebook generation (user_id, table_load_type, domain, product, notebook_name).")
+):
+    """
+    Same pipeline as `from-sttm-generate-notebook`, but the response starts immediately and
+    emits an event as each stage runs (file parsed, JSON attempt, Python/LLM validation,
+    SQL generation attempt and tokens, review result, rendering done). The last event is
+    `result` carrying the PromptResponseModel, or `error` with the status code and detail.
+    Closing the connection cancels the pipeline.
+    """
+    client_ip = await get_client_ip(request)
+    budget_seconds = budget_from_header(request.headers.get(REQUEST_TIMEOUT_HEADER))
+    deadline = start_request_deadline(budget_seconds)
+    recorder = start_usage_recording(usage_requested(request.headers.get(USAGE_HEADER)))
+    logger.info(f"Streaming request received from IP: {client_ip} (time budget: {budget_seconds:.0f}s)")
+
+    # FastAPI closes the uploaded files once this handler returns, before the stream is
+    # consumed, so the pipeline works on in-memory copies.
+    buffered_files = []
+    for file in sttm_files:
+        buffered_files.append(UploadFile(file=BytesIO(await file.read()), filename=file.filename))
+
+    async def pipeline():
+        notebook_response = await run_full_pipeline(sttm_metadata_json, buffered_files, notebook_metadata_json, deadline)
+        return attach_usage(notebook_response, recorder)
+
+    return StreamingResponse(
+        stream_progress(pipeline()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_batch_item(index: int, item: dict, workbook_cache: WorkbookCache,
+                         budget_seconds: float, semaphore: asyncio.Semaphore, include_usage: bool = False) -> dict:
+    """
+    Generates one notebook of a batch once a worker slot is free. The item's time budget
+    starts when it is scheduled, not when the batch was received.
+
+    Args:
+        index (int): Position of the item in the batch
+        item (dict): `sttm_metadata_json` (list of file_name/sheet_name/target_table_name) and `notebook_metadata_json`
+        workbook_cache (WorkbookCache): Uploaded workbooks, parsed once and shared by all items
+        budget_seconds (float): Time budget for this item
+        semaphore (asyncio.Semaphore): Bounds how many items run at once
+        include_usage (bool): Add the item's `timings` and `usage` blocks to its result line
+
+    Returns:
+        dict: One NDJSON result line for the item
+    """
+    from .api1_json_converter_optimized import build_json_sttm_content
+
+    notebook_metadata = dict(item.get("notebook_metadata_json") or {})
+    result = {"index": index, "notebook_name": notebook_metadata.get("notebook_name")}
+    # Each item logs and reports (as notebook_id) its own id, derived from the batch request's
+    set_request_id(f"{get_request_id()}.{index}")
+    async with semaphore:
+        with tracer.start_as_current_span("batch.item", attributes={
+            "sttm.batch.index": index, "sttm.notebook_name": str(result["notebook_name"])
+        }) as item_span:
+            deadline = start_request_deadline(budget_seconds)
+            recorder = start_usage_recording(include_usage)
+            try:
+                processing_stats = {
+                    "files_processed": 0,
+                    "python_validations": 0,
+                    "llm_validations": 0,
+                    "errors": []
+                }
+                sheets = []
+                for meta in item.get("sttm_metadata_json") or []:
+                    file_name = meta.get("file_name", "").strip()
+                    sheet_name = meta.get("sheet_name", "").strip()
+                    if file_name not in workbook_cache:
+                        processing_stats["errors"].append(f"No uploaded file named {file_name}")
+                        continue
+                    try:
+                        excel_data = await workbook_cache.get(file_name, sheet_name)
+                    except Exception as e:
+                        processing_stats["errors"].append(f"Failed to process {file_name}: {str(e)}")
+                        continue
+                    sheets.append((file_name, meta, excel_data))
+
+                json_conversion_output = await build_json_sttm_content(
+                    sheets, notebook_metadata, processing_stats, deadline=deadline
+                )
+                if not json_conversion_output["content"]:
+                    raise HTTPException(status_code=422, detail={"errors": processing_stats["errors"]})
+                notebook_response = await generate_notebook_from_json_output(json_conversion_output, deadline)
+                result.update(status_code=200, response=notebook_response)
+            except HTTPException as e:
+                logger.error(f"Batch item {index} failed: {e.detail}")
+                result.update(status_code=e.status_code, detail=e.detail)
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {str(e)}")
+                result.update(status_code=500, detail=str(e))
+            item_span.set_attribute("http.response.status_code", result["status_code"])
+    return attach_usage(result, recorder)
+
+
+async def stream_batch_results(items: List[dict], workbook_cache: WorkbookCache, budget_seconds: float,
+                               include_usage: bool = False):
+    """
+    Runs every batch item on a bounded worker pool and yields one NDJSON line per item in
+    completion order, followed by a summary line. Closing the connection cancels the
+    items still running or queued.
+    """
+    started_at = time.monotonic()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(run_batch_item(index, item, workbook_cache, budget_seconds, semaphore, include_usage))
+        for index, item in enumerate(items)
+    ]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result["status_code"] == 200:
+                succeeded += 1
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        if pending:
+            disconnect_stats["cancelled_requests"] += 1
+            logger.warning(f"Batch stream closed by client; cancelling {len(pending)} item(s)")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    summary = {
+        "items": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "workbook_cache": workbook_cache.stats(),
+        "elapsed_seconds": round(time.monotonic() - started_at, 2)
+    }
+    logger.info(f"Batch complete: {summary}")
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+@app.post(f"/{appName}/api/v1/edf/genai/codegenservices/from-sttm-generate-notebook/batch",
+          summary="Batch: Generate many notebooks in one request",
+          response_class=StreamingResponse,
+          responses={
+              200: {"content": {"application/x-ndjson": {}},
+                    "description": "One JSON line per notebook as it completes, then a summary line."},
+              400: {"description": "Bad Request - Invalid input"},
+              429: {"description": "Too Many Requests - retry after the Retry-After header's seconds"}
+          })
+async def batch_generate_notebooks(
+    request: Request,
+    batch_items_json: str = Form(..., description="JSON list of items, each with `sttm_metadata_json` (list of file_name/sheet_name/target_table_name) and `notebook_metadata_json`."),
+    sttm_files: List[UploadFile] = File(..., description="STTM Excel workbooks referenced by the items; each is uploaded once even if several items use it.")
+):
+    """
+    Generates one notebook per batch item. Items run concurrently (at most
+    BATCH_MAX_CONCURRENCY at a time), every (workbook, sheet) pair is parsed once however
+    many items reference it, and each item's result is streamed back as soon as it is done.
+
+    The `X-Request-Timeout` header (or REQUEST_TIMEOUT_SECONDS) applies to each item, and
+    `X-Include-Usage: true` adds `timings` and `usage` to each item's line.
+    """
+    client_ip = await get_client_ip(request)
+    try:
+        items = json.loads(batch_items_json)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON input: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid JSON in batch_items_json")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="batch_items_json must be a non-empty list")
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("sttm_metadata_json"), list) \
+                or not isinstance(item.get("notebook_metadata_json"), dict):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch item {index} must have a sttm_metadata_json list and a notebook_metadata_json object"
+            )
+
+    budget_seconds = budget_from_header(request.headers.get(REQUEST_TIMEOUT_HEADER))
+    logger.info(f"Batch request received from IP: {client_ip} ({len(items)} items, {len(sttm_files)} files)")
+
+    # Read before returning: FastAPI closes the uploads once this handler returns
+    workbook_cache = WorkbookCache()
+    for file in sttm_files:
+        workbook_cache.add(file.filename.strip(), await file.read())
+    # Register every referenced sheet so each workbook is parsed in a single pass
+    for item in items:
+        for meta in item["sttm_metadata_json"]:
+            file_name = meta.get("file_name", "").strip()
+            if file_name in workbook_cache:
+                workbook_cache.require(file_name, meta.get("sheet_name", "").strip())
+
+    return StreamingResponse(
+        stream_batch_results(items, workbook_cache, budget_seconds,
+                             usage_requested(request.headers.get(USAGE_HEADER))),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get(f"/{appName}")
 async def read_root():
     return {"message": "STTM to Notebook Generation API - V1.1.0", "version": "1.1.0"}
@@ -154,4 +441,20 @@ async def read_root():
 
 @app.get(f"/{appName}/v1.1/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.1.0"}
\ No newline at end of file
+    return {"status": "healthy", "version": "1.1.0"}
+
+@app.get(f"/{appName}/ready")
+async def readiness_check():
+    """
+    Readiness probe. Workers only accept connections once their warm-up is over, so any worker
+    answering is warm; 503 only when the app runs without its lifespan (e.g. in-process tests).
+    """
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warm_up_status()})
+    return {"status": "ready", **warm_up_status()}
+
+@app.get(f"/{appName}/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (aggregated over all workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from .log_handler import get_logger
+from .read_env_var import DISCONNECT_POLL_INTERVAL_SECONDS
+
+logger = get_logger("<Client Disconnect>")
+
+# Process-wide counters, served by the /stats endpoint
+disconnect_stats = {
+    "cancelled_requests": 0,
+    "aborted_llm_calls": 0,
+}
+
+# Per-request tally of LLM calls cut short by a cancellation. The dict is shared by
+# reference with the pipeline task, which runs in a copy of the caller's context.
+_aborted_calls: ContextVar[Optional[dict]] = ContextVar("aborted_llm_calls", default=None)
+
+
+class ClientDisconnected(HTTPException):
+    """Raised after the pipeline was cancelled because the client went away."""
+    def __init__(self, aborted_llm_calls: int):
+        super().__init__(
+            status_code=499,
+            detail=f"Client closed request; pipeline cancelled ({aborted_llm_calls} in-flight LLM call(s) aborted)."
+        )
+
+
+@asynccontextmanager
+async def track_llm_call(stage: str):
+    """Wrap an in-flight LLM HTTP call so that cancelling it is counted."""
+    try:
+        yield
+    except asyncio.CancelledError:
+        disconnect_stats["aborted_llm_calls"] += 1
+        request_tally = _aborted_calls.get()
+        if request_tally is not None:
+            request_tally["count"] += 1
+        logger.warning(f"Aborted in-flight LLM call during {stage}")
+        raise
+
+
+async def run_until_disconnected(request: Request, coro, stage: str = "pipeline"):
+    """
+    Run ``coro`` as a task and cancel it (including any in-flight LLM HTTP calls) as soon
+    as the client disconnects.
+
+    Args:
+        request (Request): Incoming request, polled for disconnects
+        coro (Coroutine): Pipeline coroutine to run
+        stage (str): Label used in log messages
+
+    Returns:
+        Any: The coroutine's result when the client stays connected
+
+    Raises:
+        ClientDisconnected: When the client went away before the pipeline finished
+    """
+    request_tally = {"count": 0}
+    _aborted_calls.set(request_tally)
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL_SECONDS)
+            if task in done:
+                return task.result()
+            if await request.is_disconnected():
+                break
+    finally:
+        # Also covers the server cancelling this handler (e.g. on shutdown)
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    disconnect_stats["cancelled_requests"] += 1
+    logger.warning(f"Client disconnected; cancelled {stage} ({request_tally['count']} in-flight LLM call(s) aborted)")
+    raise ClientDisconnected(request_tally["count"])
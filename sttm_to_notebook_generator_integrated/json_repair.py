@@ -0,0 +1,209 @@
+import json
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .log_handler import get_logger
+
+logger = get_logger("<JSON Repair>")
+
+# Process-wide counters, served by the /stats endpoint
+repair_stats = {
+    "attempted": 0,
+    "repaired": 0,
+    "unrecoverable": 0,
+    "fixes": Counter()
+}
+
+CLOSERS = {"{": "}", "[": "]"}
+VALUE_END = ",:}]"
+# Last character of a completed value (string, object, array, number or literal)
+COMPLETED_VALUE = '"}]'
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def extract_outermost_object(text: str) -> Optional[str]:
+    """
+    Return the text from the first `{` to its matching `}` (string-aware), dropping any
+    prose or code fences around it. A truncated object is returned up to the end of text.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = escaped = False
+    for idx in range(start, len(text)):
+        char = text[idx]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:idx + 1]
+    return text[start:]
+
+
+def _fix_syntax(text: str, fixes: List[str]) -> str:
+    """
+    Single string-aware pass that escapes stray quotes and raw control characters inside
+    strings, drops trailing commas, inserts the comma missing between a completed value and
+    a key or value on a later line, converts Python literals and re-closes whatever is still
+    open at the end.
+    """
+    out = []
+    stack = []
+    in_string = escaped = False
+    string_is_key = False
+    idx = 0
+    length = len(text)
+
+    def previous_significant():
+        for pos in range(len(out) - 1, -1, -1):
+            if not out[pos].isspace():
+                return out[pos]
+        return ""
+
+    def insert_missing_comma():
+        """Add a comma after the last value when it ended on an earlier line"""
+        newline = False
+        for pos in range(len(out) - 1, -1, -1):
+            if out[pos].isspace():
+                newline = newline or "\n" in out[pos]
+                continue
+            last = out[pos][-1]
+            if newline and (last in COMPLETED_VALUE or last.isalnum()):
+                fixes.append("missing_comma")
+                out.insert(pos + 1, ",")
+            return
+
+    while idx < length:
+        char = text[idx]
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                out.append(char)
+            elif char == '"':
+                # A quote only closes the string when what follows can follow a JSON string
+                rest = text[idx + 1:].lstrip(" \t\r\n")
+                if not rest or rest[0] in VALUE_END:
+                    in_string = False
+                    out.append(char)
+                elif rest[0] == '"' and "\n" in text[idx + 1:length - len(rest)]:
+                    # Next line starts a new string: the comma between them is missing
+                    fixes.append("missing_comma")
+                    in_string = False
+                    out.append('",')
+                else:
+                    fixes.append("unescaped_quote")
+                    out.append('\\"')
+            elif char in "\n\r\t":
+                fixes.append("control_character")
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[char])
+            else:
+                out.append(char)
+            idx += 1
+            continue
+
+        if stack and (char in '"{[-' or char.isalnum()):
+            insert_missing_comma()
+
+        if char == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == "{" and previous_significant() in ("{", ",")
+            out.append(char)
+        elif char in "{[":
+            stack.append(char)
+            out.append(char)
+        elif char in "}]":
+            if previous_significant() == ",":
+                fixes.append("trailing_comma")
+                while out and out[-1].isspace():
+                    out.pop()
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(char)
+        elif char.isalpha():
+            word_end = idx
+            while word_end < length and text[word_end].isalpha():
+                word_end += 1
+            word = text[idx:word_end]
+            if word in PYTHON_LITERALS:
+                fixes.append("python_literal")
+                word = PYTHON_LITERALS[word]
+            out.append(word)
+            idx = word_end
+            continue
+        else:
+            out.append(char)
+        idx += 1
+
+    if not in_string and not stack:
+        return "".join(out)
+
+    # Truncated output: close the open string, drop a dangling separator and close the rest
+    fixes.append("truncated")
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    if repaired.endswith(","):
+        repaired = repaired[:-1]
+    elif repaired.endswith(":"):
+        repaired += " null"
+    elif in_string and string_is_key:
+        repaired += ": null"
+    return repaired + "".join(CLOSERS[opener] for opener in reversed(stack))
+
+
+def repair_json(text: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Deterministically repair LLM JSON output that fails to parse.
+
+    Args:
+        text (str): Raw (fence-stripped) LLM output
+
+    Returns:
+        Tuple[Optional[str], List[str]]: The repaired JSON string (None when the output
+        cannot be recovered) and the kinds of fixes applied
+    """
+    repair_stats["attempted"] += 1
+    fixes = []
+    candidate = extract_outermost_object(text)
+    if candidate is not None:
+        if candidate != text.strip():
+            fixes.append("extracted_object")
+        candidate = _fix_syntax(candidate, fixes)
+        try:
+            json.loads(candidate)
+        except json.JSONDecodeError:
+            candidate = None
+
+    if candidate is None:
+        repair_stats["unrecoverable"] += 1
+        logger.info(f"JSON repair failed; success rate {success_rate():.0%} over {repair_stats['attempted']} attempts")
+        return None, fixes
+
+    repair_stats["repaired"] += 1
+    repair_stats["fixes"].update(set(fixes))
+    logger.info(f"JSON repaired locally ({', '.join(sorted(set(fixes)))}); "
+                f"success rate {success_rate():.0%} over {repair_stats['attempted']} attempts")
+    return candidate, sorted(set(fixes))
+
+
+def success_rate() -> float:
+    if not repair_stats["attempted"]:
+        return 0.0
+    return repair_stats["repaired"] / repair_stats["attempted"]
@@ -1,25 +1,157 @@
+import json
 import logging
 import logging.handlers
+import threading
+from collections import Counter
+from datetime import datetime, timezone
 
 import colorlog
-from queue import Queue
+from queue import Empty, Full, Queue
 from logging.handlers import QueueHandler, QueueListener
 import getpass
-from .log_session_id import SESSION_LOG_ID
+from .request_id import RequestIdFilter
+from .read_env_var import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE_RATE
 
 username = getpass.getuser()
 
-_listeners = {}  # Keep track of listeners per logger
+# Once the queue is this full, DEBUG/INFO records are sampled (1 in LOG_SAMPLE_RATE kept)
+QUEUE_PRESSURE_RATIO = 0.8
 
-    
-def get_logger(name, log_file=None, level=logging.DEBUG, max_bytes=5_000_000, backup_count=5):
+# Process-wide counters, served by the /stats endpoint
+logging_stats = {"dropped": Counter(), "sampled_out": 0}
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line (timestamp, level, logger, user, request_id, message) for log shippers"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "user": username,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
     """
-    Creates a robust logger with console output (color), file logging with rotation, and async logging.
+    QueueHandler that never blocks the caller. Under pressure DEBUG/INFO records are
+    sampled; when the queue is full they are dropped, while WARNING and above evict the
+    oldest queued record instead. Losses are counted in logging_stats and reported with a
+    single warning once the queue has room again.
+    """
+    def __init__(self, queue: Queue, sample_rate: int):
+        super().__init__(queue)
+        self.sample_rate = max(sample_rate, 1)
+        self._pressure_threshold = int(queue.maxsize * QUEUE_PRESSURE_RATIO)
+        self._lock = threading.Lock()
+        self._seen_under_pressure = 0
+        self._unreported = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self._pressure_threshold:
+            with self._lock:
+                self._seen_under_pressure += 1
+                keep = self._seen_under_pressure % self.sample_rate == 0
+                if not keep:
+                    logging_stats["sampled_out"] += 1
+                    self._unreported += 1
+            if not keep:
+                return
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            if record.levelno < logging.WARNING or not self._evict_oldest(record):
+                self._count_drop(record.levelname)
+            return
+
+        if self._unreported and self.queue.qsize() < self._pressure_threshold // 2:
+            self._report_losses(record.name)
+
+    def _evict_oldest(self, record: logging.LogRecord) -> bool:
+        try:
+            evicted = self.queue.get_nowait()
+            self._count_drop(evicted.levelname)
+            self.queue.put_nowait(record)
+            return True
+        except (Empty, Full):
+            return False
+
+    def _count_drop(self, level_name: str) -> None:
+        with self._lock:
+            logging_stats["dropped"][level_name] += 1
+            self._unreported += 1
+
+    def _report_losses(self, name: str) -> None:
+        with self._lock:
+            lost, self._unreported = self._unreported, 0
+        if lost:
+            summary = logging.LogRecord(name, logging.WARNING, __file__, 0,
+                                        "%d log records were dropped or sampled out while the log queue was under pressure",
+                                        (lost,), None)
+            summary.request_id = "-"
+            try:
+                self.queue.put_nowait(self.prepare(summary))
+            except Full:
+                pass
+
+
+def _build_formatter() -> logging.Formatter:
+    if LOG_FORMAT == "json":
+        return JsonLineFormatter()
+    # request_id is stamped on each record by RequestIdFilter
+    return logging.Formatter(f'%(asctime)s - <user : {username}> - <request ID : %(request_id)s> - %(levelname)s - %(name)s - %(message)s')
+
+
+# Colored formatter for console; can be set on the console handler for colorful output
+color_formatter = colorlog.ColoredFormatter(
+    f'%(log_color)s%(asctime)s - <user : {username}> - <request ID : %(request_id)s> - %(levelname)s - %(name)s - %(message)s',
+    log_colors={
+        'DEBUG': 'cyan',
+        'INFO': 'green',
+        'WARNING': 'yellow',
+        'ERROR': 'red',
+        'CRITICAL': 'bold_red',
+    }
+)
+
+# One bounded queue and one listener thread shared by every logger in the process
+_log_queue = Queue(maxsize=LOG_QUEUE_SIZE)
+_formatter = _build_formatter()
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(_formatter)
+_queue_handler = BoundedQueueHandler(_log_queue, LOG_SAMPLE_RATE)
+_queue_handler.addFilter(RequestIdFilter())
+_listener = QueueListener(_log_queue, _console_handler, respect_handler_level=True)
+_listener.start()
+_file_handlers = {}  # One rotating file handler per log file path
+
+
+class _LoggerNameFilter(logging.Filter):
+    """Route records of the shared queue to the file handler of the loggers that asked for it"""
+    def __init__(self):
+        super().__init__()
+        self.names = set()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name in self.names
+
+
+def get_logger(name, log_file=None, level=None, max_bytes=5_000_000, backup_count=5):
+    """
+    Creates a robust logger with console output, file logging with rotation, and async logging
+    through the process-wide bounded queue.
 
     Args:
         name (str): Logger name.
         log_file (str): File path for logging to file (optional).
-        level (int): Logging level (default: DEBUG).
+        level (int): Logging level (default: LOG_LEVEL). Pass %-style arguments
+            (`logger.debug("payload: %s", payload)`) so disabled levels never stringify them.
         max_bytes (int): Max size for log file before rotation.
         backup_count (int): Number of backup files to keep.
 
@@ -28,54 +160,46 @@ def get_logger(name, log_file=None, level=logging.DEBUG, max_bytes=5_000_000, ba
     """
 
     logger = logging.getLogger(name)
-    logger.setLevel(level)
+    logger.setLevel(level if level is not None else LOG_LEVEL)
     logger.propagate = False  # Prevent duplicate logs if root logger is configured elsewhere
 
     if logger.handlers:
         return logger
 
-    # Formatter for file output
-    file_formatter = logging.Formatter(f'%(asctime)s - <user : {username}> - <session ID : {SESSION_LOG_ID}> - %(levelname)s - %(name)s - %(message)s')
-
-    # Colored formatter for console
-    color_formatter = colorlog.ColoredFormatter(
-        f'%(log_color)s%(asctime)s - <user : {username}> - <session ID : {SESSION_LOG_ID}> - %(levelname)s - %(name)s - %(message)s',
-        log_colors={
-            'DEBUG': 'cyan',
-            'INFO': 'green',
-            'WARNING': 'yellow',
-            'ERROR': 'red',
-            'CRITICAL': 'bold_red',
-        }
-    )
-
-    # Queue for async logging
-    log_queue = Queue()
-
-    # Console Handler with color
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
-    # console_handler.setFormatter(color_formatter) # can be enabled for colorful output in console.
-    console_handler.setFormatter(file_formatter)
-
-    handlers = [console_handler]
-
     if log_file:
-        file_handler = logging.handlers.RotatingFileHandler(
-            log_file, maxBytes=max_bytes, backupCount=backup_count
-        )
-        file_handler.setLevel(level)
-        file_handler.setFormatter(file_formatter)
-        handlers.append(file_handler)
-
-    # Setup queue handler and listener for async logging
-    queue_handler = QueueHandler(log_queue)
-    logger.addHandler(queue_handler)
-
-    # Only start one listener per logger name
-    if name not in _listeners:
-        listener = QueueListener(log_queue, *handlers)
-        listener.start()
-        _listeners[name] = listener
-
+        if log_file not in _file_handlers:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count
+            )
+            file_handler.setFormatter(_formatter)
+            file_handler.addFilter(_LoggerNameFilter())
+            _file_handlers[log_file] = file_handler
+            _listener.handlers = (*_listener.handlers, file_handler)
+        _file_handlers[log_file].filters[0].names.add(name)
+
+    logger.addHandler(_queue_handler)
     return logger
+
+
+def restart_log_listener() -> None:
+    """
+    Give a forked worker its own queue and listener thread; call from the process manager's
+    post-fork hook. Threads do not survive fork() and the inherited queue may hold the
+    parent's undrained records or a lock taken mid-operation.
+    """
+    global _log_queue, _listener
+    _log_queue = Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler.queue = _log_queue
+    _queue_handler._lock = threading.Lock()
+    _listener = QueueListener(_log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def log_queue_stats() -> dict:
+    """Queue depth and records lost under pressure, for the /stats endpoint"""
+    return {
+        "queue_size": _log_queue.qsize(),
+        "queue_capacity": _log_queue.maxsize,
+        "dropped": dict(logging_stats["dropped"]),
+        "sampled_out": logging_stats["sampled_out"]
+    }
@@ -0,0 +1,246 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+from .retry_policy import ErrorClass, classify_error
+from .usage_recorder import current_recorder
+from .request_capture import current_capture
+from .token_counter import count_message_tokens, count_tokens
+from .tracing import tracer, SpanKind
+
+# With several workers (gunicorn) every process writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them; the directory must be empty
+# at startup. Without it, the default in-process registry is served.
+MULTIPROCESS_MODE = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUESTS = Counter(
+    "sttm_requests_total", "HTTP requests handled",
+    ["endpoint", "method", "status"]
+)
+REQUEST_SECONDS = Histogram(
+    "sttm_request_duration_seconds", "HTTP request latency, until the response body is complete",
+    ["endpoint"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900)
+)
+STAGE_SECONDS = Histogram(
+    "sttm_stage_duration_seconds", "Latency of one pipeline stage",
+    ["stage"],
+    buckets=(0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+JSON_ATTEMPTS = Histogram(
+    "sttm_json_attempts_per_file", "LLM attempts needed to convert one STTM sheet",
+    ["output_mode", "outcome"],
+    buckets=(1, 2, 3, 4, 5, 8)
+)
+LLM_CALL_SECONDS = Histogram(
+    "sttm_llm_call_duration_seconds", "Latency of one LLM HTTP call",
+    ["model", "stage", "outcome"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+LLM_TOKENS = Counter(
+    "sttm_llm_tokens_total", "LLM tokens consumed",
+    ["model", "direction"]
+)
+CACHE_LOOKUPS = Counter(
+    "sttm_cache_lookups_total", "Cache lookups; hit ratio is hits over all lookups",
+    ["cache", "result"]
+)
+ERRORS = Counter(
+    "sttm_errors_total", "Failed stage attempts by error class",
+    ["stage", "error_class", "reason"]
+)
+# Gauges are summed over the live workers in multiprocess mode
+ADMISSION_IN_FLIGHT = Gauge(
+    "sttm_admission_in_flight", "Requests holding an admission slot",
+    ["endpoint"], multiprocess_mode="livesum"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "sttm_admission_queue_depth", "Requests waiting for an admission slot",
+    ["endpoint", "priority"], multiprocess_mode="livesum"
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "sttm_admission_wait_seconds", "Time from arrival to the admission decision",
+    ["endpoint", "priority", "outcome"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+
+
+# Every helper below also writes to the request's UsageRecorder, when one is attached,
+# and the context managers open a tracing span
+
+@contextmanager
+def observe_stage(stage: str, attributes: Optional[dict] = None):
+    """
+    Time a pipeline stage inside a span named after it (carrying ``attributes``; the
+    span is yielded). Exceptions raised inside are counted against the stage
+    (classified like the retry policy does) and re-raised.
+    """
+    started_at = time.monotonic()
+    try:
+        with tracer.start_as_current_span(stage, attributes=attributes) as span:
+            yield span
+    except Exception as e:
+        record_exception(stage, e)
+        raise
+    finally:
+        seconds = time.monotonic() - started_at
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+        recorder = current_recorder()
+        if recorder is not None:
+            recorder.add_stage(stage, seconds)
+
+
+def record_exception(stage: str, exc: BaseException) -> None:
+    record_error(stage, classify_error(exc), type(exc).__name__, detail=str(exc))
+
+
+def record_error(stage: str, error_class: ErrorClass, reason: str, detail: str = "") -> None:
+    """
+    Count a failed attempt. ``reason`` must come from a small fixed set (rule or exception
+    name); the free-text ``detail`` only goes to the request's usage block.
+    """
+    ERRORS.labels(stage=stage, error_class=error_class.value, reason=reason).inc()
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.add_retry(stage, error_class.value, reason, detail)
+
+
+def record_llm_call(stage: str, model: str, seconds: float, prompt_tokens: Optional[int] = None,
+                    completion_tokens: Optional[int] = None, outcome: str = "ok") -> None:
+    """Record one LLM HTTP call; outcome is `ok`, `error` or `aborted`"""
+    LLM_CALL_SECONDS.labels(model=model, stage=stage, outcome=outcome).observe(seconds)
+    if prompt_tokens:
+        LLM_TOKENS.labels(model=model, direction="in").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model=model, direction="out").inc(completion_tokens)
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.add_llm_call(stage, model, seconds, prompt_tokens, completion_tokens, outcome)
+
+
+@contextmanager
+def observe_llm_call(stage: str, model: str):
+    """
+    Time one LLM HTTP call. The caller fills in the yielded dict (`model`, `prompt_tokens`,
+    `completion_tokens`, `outcome`) from the response; exceptions mark it as `error` and
+    cancellations as `aborted`. The caller also sets `messages` (the prompt's message texts)
+    and `content` (the completion text); when the provider reports no usage (an aborted
+    stream, say) the tokens are counted from those.
+    """
+    call = {"model": model, "prompt_tokens": None, "completion_tokens": None, "outcome": "ok",
+            "messages": None, "content": None}
+    started_at = time.monotonic()
+    with tracer.start_as_current_span("llm.chat", kind=SpanKind.CLIENT,
+                                      attributes={"gen_ai.request.model": model, "sttm.stage": stage}) as span:
+        try:
+            yield call
+        except Exception:
+            call["outcome"] = "error"
+            raise
+        except BaseException:
+            call["outcome"] = "aborted"
+            raise
+        finally:
+            if call["outcome"] != "error":
+                if call["prompt_tokens"] is None and call["messages"] is not None:
+                    call["prompt_tokens"] = count_message_tokens(call["messages"])
+                if call["completion_tokens"] is None and call["content"] is not None:
+                    call["completion_tokens"] = count_tokens(call["content"])
+            span.set_attribute("gen_ai.response.model", call["model"])
+            span.set_attribute("sttm.llm.outcome", call["outcome"])
+            if call["prompt_tokens"] is not None:
+                span.set_attribute("gen_ai.usage.input_tokens", call["prompt_tokens"])
+            if call["completion_tokens"] is not None:
+                span.set_attribute("gen_ai.usage.output_tokens", call["completion_tokens"])
+            seconds = time.monotonic() - started_at
+            record_llm_call(stage, call["model"], seconds,
+                            call["prompt_tokens"], call["completion_tokens"], call["outcome"])
+            capture = current_capture()
+            if capture is not None and call["messages"] is not None:
+                capture.add_llm_call(stage, call["model"], call["messages"], call["content"], seconds, call["outcome"])
+
+
+def record_json_attempts(attempts: int, output_mode: str, succeeded: bool) -> None:
+    JSON_ATTEMPTS.labels(output_mode=output_mode, outcome="success" if succeeded else "failure").observe(attempts)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.add_cache_lookup(cache, hit)
+
+
+def record_admission(endpoint: str, priority: str, outcome: str, seconds: float) -> None:
+    """Record one admission decision; outcome is `admitted`, `queue_full`, `displaced` or `timeout`"""
+    ADMISSION_WAIT_SECONDS.labels(endpoint=endpoint, priority=priority, outcome=outcome).observe(seconds)
+
+
+def set_admission_load(endpoint: str, in_flight: int, queued: dict) -> None:
+    """Publish an endpoint's in-flight count and its queue depth per priority"""
+    ADMISSION_IN_FLIGHT.labels(endpoint=endpoint).set(in_flight)
+    for priority, depth in queued.items():
+        ADMISSION_QUEUE_DEPTH.labels(endpoint=endpoint, priority=priority).set(depth)
+
+
+def record_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    REQUESTS.labels(endpoint=endpoint, method=method, status=str(status)).inc()
+    REQUEST_SECONDS.labels(endpoint=endpoint).observe(seconds)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus exposition of all metrics (aggregated over workers in multiprocess mode)"""
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a dead worker's live samples; call from the process manager's child-exit hook"""
+    if MULTIPROCESS_MODE:
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their latency by route template (so path
+    parameters never become label values). Latency runs until the last body chunk is sent,
+    which includes the whole stream for SSE and NDJSON endpoints.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.monotonic()
+        response = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Requests turned away by admission control never reach the router
+            endpoint = getattr(route, "path", None) or scope.get("admission_path", "unmatched")
+            record_request(endpoint, scope["method"], response["status"], time.monotonic() - started_at)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from .log_handler import get_logger
+from .read_env_var import SSE_KEEPALIVE_SECONDS
+from .client_disconnect import disconnect_stats
+
+logger = get_logger("<Progress Events>")
+
+# Queue of the streaming request currently being served. Pipeline stages publish to it
+# through emit_progress(); when no stream is attached, emitting is a no-op.
+_progress_queue: ContextVar[Optional[asyncio.Queue]] = ContextVar("progress_queue", default=None)
+
+
+def emit_progress(event: str, **data) -> None:
+    """Publish a pipeline progress event to the attached stream, if any."""
+    queue = _progress_queue.get()
+    if queue is not None:
+        queue.put_nowait((event, data))
+
+
+def progress_stream_active() -> bool:
+    """Whether a client is streaming progress (used to switch LLM calls to token streaming)."""
+    return _progress_queue.get() is not None
+
+
+def format_sse(event: str, data) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+async def stream_progress(coro) -> AsyncIterator[str]:
+    """
+    Run ``coro`` as a task and yield its progress events as SSE frames while it runs,
+    followed by a final ``result`` (or ``error``) event.
+
+    If the client disconnects, the response is cancelled and the pipeline task with it.
+
+    Args:
+        coro (Coroutine): Pipeline coroutine producing the final response
+
+    Yields:
+        str: SSE frames, plus keep-alive comments while the pipeline is quiet
+    """
+    queue = asyncio.Queue()
+    _progress_queue.set(queue)
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=SSE_KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                event, data = getter.result()
+                yield format_sse(event, data)
+                continue
+            getter.cancel()
+            if task in done:
+                break
+            yield ": keep-alive\n\n"
+
+        while not queue.empty():
+            event, data = queue.get_nowait()
+            yield format_sse(event, data)
+
+        try:
+            yield format_sse("result", task.result())
+        except HTTPException as e:
+            yield format_sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            yield format_sse("error", {"status_code": 500, "detail": str(e)})
+    finally:
+        if not task.done():
+            disconnect_stats["cancelled_requests"] += 1
+            logger.warning("Progress stream closed by client; cancelling pipeline")
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
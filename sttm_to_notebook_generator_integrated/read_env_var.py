@@ -29,3 +29,72 @@ MODEL_URL = os.getenv("MODEL_URL")
 
 # Application Configuration
 rootContext = os.getenv("ROOTCONTEXT", "silver-codegen-genai")
+
+# Retry / Time Budget Configuration
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "300"))
+MAX_REQUEST_TIMEOUT_SECONDS = float(os.getenv("MAX_REQUEST_TIMEOUT_SECONDS", "900"))
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "120"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+LLM_CALL_MAX_ATTEMPTS = int(os.getenv("LLM_CALL_MAX_ATTEMPTS", "3"))
+SQL_MAX_RETRIES = int(os.getenv("SQL_MAX_RETRIES", "5"))
+DISCONNECT_POLL_INTERVAL_SECONDS = float(os.getenv("DISCONNECT_POLL_INTERVAL_SECONDS", "0.5"))
+
+# Progress Streaming Configuration
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Streaming SQL Validation
+SQL_STREAM_VALIDATION = os.getenv("SQL_STREAM_VALIDATION", "true").lower() == "true"
+
+# Batch Generation Configuration
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Incremental JSON Patch Mode
+JSON_PATCH_MODE = os.getenv("JSON_PATCH_MODE", "true").lower() == "true"
+
+# Structured Output: json_schema (falls back to json_object, then text), json_object, or off
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "json_schema").lower()
+
+# Response Usage Block (timings and token usage per request)
+RESPONSE_USAGE_DEFAULT = os.getenv("RESPONSE_USAGE_DEFAULT", "false").lower() == "true"
+
+# Tracing: none, otlp (uses the standard OTEL_EXPORTER_OTLP_* variables) or file (JSON lines)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces/spans-{pid}.jsonl")
+
+# Logging: LOG_FORMAT is text or json (one JSON object per line for log shippers)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "10"))
+
+# Request Capture for offline replay: off, hash (workbooks stored as SHA-256 only) or blob (workbooks inlined)
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "off").lower()
+CAPTURE_FILE_PATH = os.getenv("CAPTURE_FILE_PATH", "captures/requests-{pid}.jsonl")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+
+# Token Counting: tiktoken encoding of TOKENIZER_MODEL (the deployed model unless set), or TOKENIZER_ENCODING when set (estimated if unavailable)
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", AZURE_MODEL_NAME)
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "")
+
+# Production Server (gunicorn.conf.py): WEB_CONCURRENCY overrides the worker count derived from the CPU quota
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS_PER_CPU = float(os.getenv("WORKERS_PER_CPU", "1"))
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "1000"))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "100"))
+WORKER_TIMEOUT_SECONDS = int(os.getenv("WORKER_TIMEOUT_SECONDS", "120"))
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", str(int(REQUEST_TIMEOUT_SECONDS) + 30)))
+PRELOAD_APP = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Warm-up: a worker accepts requests once its startup warm-up finished, or after WARM_UP_TIMEOUT_SECONDS regardless
+WARM_UP_TIMEOUT_SECONDS = float(os.getenv("WARM_UP_TIMEOUT_SECONDS", "60"))
+# Also open the TLS connections to the LLM endpoints during warm-up
+WARM_UP_PREOPEN_CONNECTIONS = os.getenv("WARM_UP_PREOPEN_CONNECTIONS", "false").lower() == "true"
+
+# Admission Control: per-endpoint concurrent pipelines per worker, then a bounded wait queue (429 with Retry-After beyond it)
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+# The batch endpoint runs up to BATCH_MAX_CONCURRENCY items per admitted request
+ADMISSION_BATCH_MAX_CONCURRENCY = int(os.getenv("ADMISSION_BATCH_MAX_CONCURRENCY", "1"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
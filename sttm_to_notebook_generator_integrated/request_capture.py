@@ -0,0 +1,218 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from starlette.requests import Request
+
+from .log_handler import get_logger
+from .read_env_var import CAPTURE_MODE, CAPTURE_FILE_PATH, CAPTURE_SAMPLE_RATE
+from .request_id import get_request_id
+
+logger = get_logger("<Request Capture>")
+
+# Bumped whenever the record layout changes; the replay tool skips lines without it
+CAPTURE_VERSION = 1
+CODEGEN_PATH = "/api/v1/edf/genai/codegenservices/"
+# Synchronous pipeline endpoints (api1, api2, api3), by the path after CODEGEN_PATH; the
+# stream and batch variants of api3 are not captured
+CAPTURED_ENDPOINTS = frozenset({"orchestrate-json-sttm", "generate-notebook", "from-sttm-generate-notebook"})
+REPLAYED_HEADERS = ("x-request-timeout",)
+MAX_CAPTURED_RESPONSE_BYTES = 20_000_000
+# Fields that differ between two runs of the same request, left out of the output digest
+VOLATILE_KEYS = frozenset({"notebook_id", "timings", "usage", "processing_stats"})
+DATE_STAMP = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+# Capture of the request currently being served, set by CaptureMiddleware
+_capture: ContextVar[Optional["RequestCapture"]] = ContextVar("request_capture", default=None)
+_write_lock = threading.Lock()
+
+
+def sha256_hex(data) -> str:
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()
+
+
+def prompt_digest(messages: List[str]) -> str:
+    """Digest of a chat prompt's message texts; the mock LLM server hashes requests the same way"""
+    return sha256_hex("\n".join(messages))
+
+
+def pseudonymize(value: str) -> str:
+    return f"user-{sha256_hex(value)[:12]}"
+
+
+def normalized_response(value):
+    """Response body without VOLATILE_KEYS and with date stamps masked, for equivalence checks"""
+    if isinstance(value, dict):
+        return {key: normalized_response(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [normalized_response(item) for item in value]
+    if isinstance(value, str):
+        return DATE_STAMP.sub("<date>", value)
+    return value
+
+
+def response_digest(body) -> str:
+    return sha256_hex(json.dumps(normalized_response(body), sort_keys=True, ensure_ascii=False))
+
+
+class RequestCapture:
+    """LLM exchanges made while serving one captured request"""
+    def __init__(self):
+        self.llm_calls = []
+
+    def add_llm_call(self, stage: str, model: str, messages: List[str], content: Optional[str],
+                     seconds: float, outcome: str) -> None:
+        self.llm_calls.append({
+            "stage": stage,
+            "model": model,
+            "prompt_sha256": prompt_digest(messages),
+            "seconds": round(seconds, 3),
+            "outcome": outcome,
+            "content": content
+        })
+
+
+def capture_active() -> bool:
+    return _capture.get() is not None
+
+
+def current_capture() -> Optional[RequestCapture]:
+    return _capture.get()
+
+
+def _sanitize_notebook_metadata(metadata, pseudonyms: dict):
+    if isinstance(metadata, dict) and isinstance(metadata.get("user_id"), str):
+        pseudonyms[metadata["user_id"]] = pseudonymize(metadata["user_id"])
+        metadata = {**metadata, "user_id": pseudonyms[metadata["user_id"]]}
+    return metadata
+
+
+async def build_record(scope, body: bytes, status: int, response_body: bytes, capture: RequestCapture,
+                       latency: float) -> dict:
+    """Sanitized capture record: user ids pseudonymized, workbooks hashed (or inlined in blob mode)"""
+    headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+    pseudonyms = {}
+    record = {
+        "capture_version": CAPTURE_VERSION,
+        "request_id": get_request_id(),
+        "captured_at": datetime.now(timezone.utc).isoformat(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "status": status,
+        "latency_seconds": round(latency, 3),
+        "headers": {name: headers[name] for name in REPLAYED_HEADERS if name in headers},
+        "form": None,
+        "json": None,
+        "files": [],
+        "llm_calls": capture.llm_calls,
+        "response": None
+    }
+
+    if headers.get("content-type", "").startswith("application/json"):
+        payload = json.loads(body or b"null")
+        if isinstance(payload, dict):
+            payload["notebook_metadata_json"] = _sanitize_notebook_metadata(payload.get("notebook_metadata_json"), pseudonyms)
+        record["json"] = payload
+    else:
+        async def replay_body():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        form = await Request(scope, receive=replay_body).form()
+        try:
+            record["form"] = {}
+            for field, value in form.multi_items():
+                if isinstance(value, str):
+                    if field == "notebook_metadata_json":
+                        try:
+                            value = json.dumps(_sanitize_notebook_metadata(json.loads(value), pseudonyms))
+                        except json.JSONDecodeError:
+                            pass
+                    record["form"][field] = value
+                    continue
+                content = await value.read()
+                entry = {"field": field, "filename": value.filename, "content_type": value.content_type,
+                         "size": len(content), "sha256": sha256_hex(content)}
+                if CAPTURE_MODE == "blob":
+                    entry["blob"] = base64.b64encode(content).decode("ascii")
+                record["files"].append(entry)
+        finally:
+            await form.close()
+
+    if status == 200 and response_body:
+        text = response_body.decode("utf-8", errors="replace")
+        for raw, pseudonym in pseudonyms.items():
+            text = text.replace(raw, pseudonym)
+        try:
+            record["response"] = {"size": len(response_body), "sha256": response_digest(json.loads(text))}
+        except json.JSONDecodeError:
+            record["response"] = {"size": len(response_body), "sha256": None}
+    return record
+
+
+def write_record(record: dict) -> None:
+    path = CAPTURE_FILE_PATH.replace("{pid}", str(os.getpid()))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _write_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def is_captured_path(path: str) -> bool:
+    return CODEGEN_PATH in path and path.split(CODEGEN_PATH, 1)[1].rstrip("/") in CAPTURED_ENDPOINTS
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware recording sampled pipeline requests (CAPTURE_MODE `hash` or `blob`) with
+    their LLM responses to CAPTURE_FILE_PATH, one JSON object per line, for offline replay
+    with scripts/benchmark/replay_requests.py. Off by default.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or CAPTURE_MODE == "off" or scope["method"] != "POST"
+                or not is_captured_path(scope["path"]) or random.random() >= CAPTURE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        response = {"status": 500, "body": bytearray()}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and len(response["body"]) < MAX_CAPTURED_RESPONSE_BYTES:
+                response["body"].extend(message.get("body", b""))
+            await send(message)
+
+        capture = RequestCapture()
+        token = _capture.set(capture)
+        started_at = time.monotonic()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _capture.reset(token)
+            latency = time.monotonic() - started_at
+            try:
+                record = await build_record(scope, bytes(body), response["status"], bytes(response["body"]), capture, latency)
+                await asyncio.to_thread(write_record, record)
+            except Exception as e:
+                logger.warning(f"Could not capture request {scope['path']}: {type(e).__name__}: {str(e)}")
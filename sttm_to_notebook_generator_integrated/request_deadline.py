@@ -0,0 +1,85 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+
+from .read_env_var import (
+    REQUEST_TIMEOUT_SECONDS,
+    MAX_REQUEST_TIMEOUT_SECONDS,
+    LLM_CALL_TIMEOUT_SECONDS
+)
+
+# Clients may shorten (or, up to MAX_REQUEST_TIMEOUT_SECONDS, extend) the budget per request
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Monotonic deadline of the request currently being served. Set once at ingress
+# (full_process_generate_notebook) and read by api1, api2 and the LLM helpers.
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when the request's time budget cannot fit the next stage or attempt."""
+    def __init__(self, stage: str, detail: str = ""):
+        message = f"Request time budget exhausted during {stage}."
+        if detail:
+            message += f" {detail}"
+        super().__init__(status_code=504, detail=message)
+
+
+def budget_from_header(header_value: Optional[str]) -> float:
+    """
+    Resolve the request budget in seconds from the X-Request-Timeout header, falling back
+    to REQUEST_TIMEOUT_SECONDS when the header is missing or malformed.
+    """
+    if not header_value:
+        return REQUEST_TIMEOUT_SECONDS
+    try:
+        budget = float(header_value)
+    except ValueError:
+        return REQUEST_TIMEOUT_SECONDS
+    if budget <= 0:
+        return REQUEST_TIMEOUT_SECONDS
+    return min(budget, MAX_REQUEST_TIMEOUT_SECONDS)
+
+
+def start_request_deadline(budget_seconds: float = REQUEST_TIMEOUT_SECONDS) -> float:
+    """Start the clock for the current request and return its monotonic deadline."""
+    deadline = time.monotonic() + budget_seconds
+    _request_deadline.set(deadline)
+    return deadline
+
+
+def get_request_deadline() -> float:
+    """
+    Deadline of the current request. Endpoints called directly (not through api3) get a
+    fresh deadline from REQUEST_TIMEOUT_SECONDS.
+    """
+    deadline = _request_deadline.get()
+    if deadline is None:
+        deadline = start_request_deadline()
+    return deadline
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before ``deadline``, or None when no deadline applies."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def check_deadline(deadline: Optional[float], stage: str) -> None:
+    """Fail fast before starting ``stage`` if the budget is already spent."""
+    remaining = remaining_seconds(deadline)
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(stage)
+
+
+def llm_call_timeout(deadline: Optional[float], stage: str = "LLM call") -> float:
+    """Timeout for a single LLM HTTP call: the per-call cap, bounded by the remaining budget."""
+    remaining = remaining_seconds(deadline)
+    if remaining is None:
+        return LLM_CALL_TIMEOUT_SECONDS
+    if remaining <= 0:
+        raise DeadlineExceeded(stage)
+    return min(LLM_CALL_TIMEOUT_SECONDS, remaining)
@@ -0,0 +1,70 @@
+import logging
+import re
+from contextvars import ContextVar
+from typing import Optional
+
+from opentelemetry import trace
+
+from .log_session_id import SESSION_LOG_ID, generate_unique_ID
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Client-supplied ids are echoed into logs and headers, so only accept plain tokens
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Id of the request currently being served, set once at ingress by RequestIdMiddleware
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> str:
+    """Current request's id; outside a request (start-up, background work) the process SESSION_LOG_ID"""
+    return _request_id.get() or SESSION_LOG_ID
+
+
+def set_request_id(request_id: str) -> None:
+    """Bind ``request_id`` to the current context and the tasks it starts"""
+    _request_id.set(request_id)
+
+
+def resolve_request_id(header_value: Optional[str]) -> str:
+    """Use the caller's X-Request-ID when it is a sane token, otherwise generate one"""
+    if header_value and VALID_REQUEST_ID.match(header_value.strip()):
+        return header_value.strip()
+    return generate_unique_ID()
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps each record with the request id of the context that logged it. Attached to the
+    QueueHandler, so it runs in the caller's context rather than in the listener thread.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = get_request_id()
+        return True
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that binds the request id (X-Request-ID or a generated one) for the
+    whole request, returns it in the X-Request-ID response header and tags the request's
+    root span with it.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_name = REQUEST_ID_HEADER.lower().encode("latin-1")
+        incoming = next((value.decode("latin-1") for key, value in scope["headers"] if key == header_name), None)
+        request_id = resolve_request_id(incoming)
+        set_request_id(request_id)
+        trace.get_current_span().set_attribute("sttm.request_id", request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(header_name, request_id.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import random
+import time
+from enum import Enum
+from typing import Optional
+
+from fastapi import HTTPException
+from opentelemetry import trace
+
+from .log_handler import get_logger
+from .read_env_var import RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS
+from .request_deadline import DeadlineExceeded
+
+logger = get_logger("<Retry Policy>")
+
+
+class ErrorClass(str, Enum):
+    """Buckets used to decide whether (and how quickly) a failed attempt is retried."""
+    TRANSIENT = "transient"    # timeouts, rate limits, 5xx from the LLM provider
+    VALIDATION = "validation"  # the LLM answered but the output failed our checks
+    FATAL = "fatal"            # bad credentials / bad request - retrying cannot help
+
+
+def classify_error(exc: BaseException) -> ErrorClass:
+    """
+    Classify an exception raised while generating or validating LLM output.
+
+    HTTPExceptions raised by our own LLM helpers are classified by their cause when
+    one is chained (``raise ... from e``), otherwise by their status code.
+    """
+    if isinstance(exc, DeadlineExceeded):
+        return ErrorClass.FATAL
+
+    if isinstance(exc, HTTPException):
+        if exc.__cause__ is not None:
+            return classify_error(exc.__cause__)
+        if exc.status_code == 429 or exc.status_code >= 500:
+            return ErrorClass.TRANSIENT
+        return ErrorClass.FATAL
+
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return ErrorClass.TRANSIENT
+
+    try:
+        import openai
+        if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError,
+                            openai.RateLimitError, openai.InternalServerError)):
+            return ErrorClass.TRANSIENT
+        if isinstance(exc, (openai.AuthenticationError, openai.PermissionDeniedError,
+                            openai.BadRequestError, openai.NotFoundError)):
+            return ErrorClass.FATAL
+    except ImportError:
+        pass
+
+    try:
+        import requests
+        if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+            return ErrorClass.TRANSIENT
+    except ImportError:
+        pass
+
+    if isinstance(exc, (json.JSONDecodeError, KeyError, TypeError, ValueError)):
+        return ErrorClass.VALIDATION
+
+    # Unknown failures keep the historical behaviour of being retried.
+    return ErrorClass.TRANSIENT
+
+
+class RetryPolicy:
+    """
+    Async retry policy shared by the JSON converter, the LLM semantic validator and the
+    LangGraph SQL loop.
+
+    Waits are non-blocking (``asyncio.sleep``) with full jitter, and never extend past
+    the overall deadline, which is a ``time.monotonic()`` timestamp derived from the
+    incoming request's time budget. Once the remaining budget cannot fit another attempt
+    (estimated from the attempts recorded so far) the policy stops retrying early.
+
+    Attributes:
+        max_attempts (int): Total attempts allowed, including the first one
+        base_delay (float): Backoff base in seconds
+        max_delay (float): Upper bound for a single backoff in seconds
+        deadline (Optional[float]): Monotonic timestamp after which no retry is started
+        name (str): Label used in log messages
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                 max_delay: float = RETRY_MAX_DELAY_SECONDS, deadline: Optional[float] = None,
+                 name: str = "retry"):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.name = name
+        self._attempt_seconds = []
+
+    def record_attempt(self, seconds: Optional[float]) -> None:
+        """Record how long an attempt took, used to decide whether another one still fits."""
+        if seconds is not None:
+            self._attempt_seconds.append(seconds)
+
+    def expected_attempt_seconds(self) -> float:
+        if not self._attempt_seconds:
+            return 0.0
+        return sum(self._attempt_seconds) / len(self._attempt_seconds)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None when the policy is unbounded."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def budget_exhausted(self) -> bool:
+        """True when the deadline has passed or cannot fit another attempt."""
+        remaining = self.remaining()
+        if remaining is None:
+            return False
+        return remaining <= 0 or remaining < self.expected_attempt_seconds()
+
+    def can_retry(self, attempt: int, error_class: ErrorClass) -> bool:
+        """Whether another attempt may be started after ``attempt`` failed with ``error_class``."""
+        if error_class == ErrorClass.FATAL:
+            return False
+        if attempt >= self.max_attempts:
+            return False
+        return not self.budget_exhausted()
+
+    def backoff_delay(self, attempt: int, error_class: ErrorClass) -> float:
+        """
+        Full-jitter backoff. Validation failures are re-asked promptly since the provider
+        is healthy; transient failures back off exponentially.
+        """
+        if error_class == ErrorClass.VALIDATION:
+            ceiling = self.base_delay
+        else:
+            ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+
+        remaining = self.remaining()
+        if remaining is not None:
+            delay = min(delay, remaining)
+        return delay
+
+    async def wait(self, attempt: int, error_class: ErrorClass) -> None:
+        delay = self.backoff_delay(attempt, error_class)
+        logger.info(f"[{self.name}] Attempt {attempt} failed ({error_class.value}); retrying in {delay:.2f}s")
+        trace.get_current_span().add_event("retry", {
+            "retry.policy": self.name, "retry.attempt": attempt,
+            "retry.error_class": error_class.value, "retry.delay_seconds": round(delay, 3)
+        })
+        await asyncio.sleep(delay)
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Await ``fn(*args, **kwargs)`` until it succeeds or the policy gives up, re-raising
+        the last error in the latter case.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            started_at = time.monotonic()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                self.record_attempt(time.monotonic() - started_at)
+                error_class = classify_error(e)
+                if not self.can_retry(attempt, error_class):
+                    raise
+                logger.warning(f"[{self.name}] {type(e).__name__}: {str(e)[:200]}")
+                await self.wait(attempt, error_class)
+
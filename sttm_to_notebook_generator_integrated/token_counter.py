@@ -0,0 +1,76 @@
+import math
+import re
+import threading
+from typing import List
+
+from .log_handler import get_logger
+from .read_env_var import TOKENIZER_MODEL, TOKENIZER_ENCODING
+
+logger = get_logger("<Token Counter>")
+
+# Used when TOKENIZER_MODEL is not known to tiktoken (GPT-4 / GPT-3.5 family)
+DEFAULT_ENCODING = "cl100k_base"
+# Chat format overhead: every message is wrapped in role markers and the reply is primed
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Fallback estimate: one token per symbol and per CHARS_PER_TOKEN characters of each word
+CHARS_PER_TOKEN = 4
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# Loaded on first use; None when tiktoken or its encoding file is unavailable
+_encoding = {"loaded": False, "value": None}
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; token counts are estimated")
+        return None
+    try:
+        if TOKENIZER_ENCODING:
+            return tiktoken.get_encoding(TOKENIZER_ENCODING)
+        try:
+            return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # tiktoken downloads encoding files on first use; set TIKTOKEN_CACHE_DIR where there is no egress
+        logger.warning(f"Could not load the tokenizer for '{TOKENIZER_MODEL}' ({type(e).__name__}: {str(e)[:200]}); "
+                       f"token counts are estimated")
+        return None
+
+
+def get_encoding():
+    if not _encoding["loaded"]:
+        with _encoding_lock:
+            if not _encoding["loaded"]:
+                _encoding["value"] = _load_encoding()
+                _encoding["loaded"] = True
+    return _encoding["value"]
+
+
+def tokenizer_name() -> str:
+    """`tiktoken:<encoding>`, or `estimate` when counts come from the fallback estimator"""
+    encoding = get_encoding()
+    return f"tiktoken:{encoding.name}" if encoding is not None else "estimate"
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(math.ceil(len(piece) / CHARS_PER_TOKEN) for piece in _PIECE.findall(text))
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` for the configured model family (estimated without a tokenizer)"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode_ordinary(text))
+
+
+def count_message_tokens(messages: List[str]) -> int:
+    """Prompt tokens of a chat request made of these message texts, including the chat format overhead"""
+    return sum(count_tokens(message) + TOKENS_PER_MESSAGE for message in messages) + TOKENS_PER_REPLY
@@ -0,0 +1,121 @@
+import os
+import threading
+from typing import Sequence
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from .log_handler import get_logger
+from .read_env_var import TRACING_EXPORTER, TRACING_FILE_PATH
+
+logger = get_logger("<Tracing>")
+
+TRACE_ID_HEADER = "X-Trace-Id"
+DEFAULT_SERVICE_NAME = "sttm-notebook-generator"
+
+# Spans are created through the OpenTelemetry API; until setup_tracing() installs an SDK
+# provider they are non-recording and cost next to nothing.
+tracer = trace.get_tracer("sttm_to_notebook_generator_integrated")
+
+_configured = {"exporter": None}
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    Appends finished spans, one JSON object per line, to a local file for offline
+    analysis. ``{pid}`` in the path is replaced by the worker's process id so workers
+    never share a file.
+    """
+    def __init__(self, path: str):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.error(f"Could not write spans to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def setup_tracing() -> None:
+    """
+    Install the tracer provider selected by TRACING_EXPORTER: `otlp` (configured through
+    the standard OTEL_EXPORTER_OTLP_* variables), `file` (JSON lines at TRACING_FILE_PATH)
+    or `none`. Safe to call more than once.
+    """
+    if _configured["exporter"] is not None or TRACING_EXPORTER == "none":
+        return
+
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        exporter = JsonLinesSpanExporter(TRACING_FILE_PATH)
+    else:
+        logger.warning(f"Unknown TRACING_EXPORTER '{TRACING_EXPORTER}'; tracing stays disabled")
+        return
+
+    # OTEL_SERVICE_NAME / OTEL_RESOURCE_ATTRIBUTES take precedence when set
+    attributes = {} if os.getenv("OTEL_SERVICE_NAME") else {"service.name": DEFAULT_SERVICE_NAME}
+    provider = TracerProvider(resource=Resource.create(attributes))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _configured["exporter"] = TRACING_EXPORTER
+    logger.info(f"Tracing enabled ({TRACING_EXPORTER} exporter)")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the root span of every HTTP request. An incoming W3C
+    `traceparent` header is honoured, and the trace id is echoed in X-Trace-Id so a slow
+    response can be looked up directly in the tracing backend.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        method = scope["method"]
+        with tracer.start_as_current_span(f"{method} {scope['path']}", context=propagate.extract(headers),
+                                          kind=SpanKind.SERVER) as span:
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.path", scope["path"])
+            span_context = span.get_span_context()
+            response = {"status": 500}
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    if span_context.is_valid:
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (TRACE_ID_HEADER.lower().encode("latin-1"), trace.format_trace_id(span_context.trace_id).encode("latin-1"))
+                        ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.update_name(f"{method} {route.path}")
+                    span.set_attribute("http.route", route.path)
+                span.set_attribute("http.response.status_code", response["status"])
+                if response["status"] >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
@@ -0,0 +1,105 @@
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from .read_env_var import RESPONSE_USAGE_DEFAULT
+
+# Clients opt in per request; RESPONSE_USAGE_DEFAULT turns the block on for every request
+USAGE_HEADER = "X-Include-Usage"
+
+# Recorder of the request currently being served. The stage helpers in metrics.py write
+# to it; when it is not set (the default) recording is a single ContextVar lookup.
+_usage_recorder: ContextVar[Optional["UsageRecorder"]] = ContextVar("usage_recorder", default=None)
+
+
+class UsageRecorder:
+    """
+    Where one request's time and tokens went: wall time per stage, every LLM call,
+    the reasons attempts were retried and the cache lookups made on its behalf.
+    """
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.stages = defaultdict(lambda: {"seconds": 0.0, "count": 0})
+        self.llm_calls = []
+        self.retries = []
+        self.cache = defaultdict(Counter)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage]["seconds"] += seconds
+        self.stages[stage]["count"] += 1
+
+    def add_llm_call(self, stage: str, model: str, seconds: float, prompt_tokens: Optional[int],
+                     completion_tokens: Optional[int], outcome: str) -> None:
+        self.llm_calls.append({
+            "stage": stage,
+            "model": model,
+            "seconds": round(seconds, 3),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "outcome": outcome
+        })
+
+    def add_retry(self, stage: str, error_class: str, reason: str, detail: str = "") -> None:
+        self.retries.append({"stage": stage, "error_class": error_class, "reason": reason, "detail": detail[:300]})
+
+    def add_cache_lookup(self, cache: str, hit: bool) -> None:
+        self.cache[cache]["hit" if hit else "miss"] += 1
+
+    def timings(self) -> dict:
+        return {
+            "total_seconds": round(time.monotonic() - self.started_at, 3),
+            "stages": {stage: {"seconds": round(stats["seconds"], 3), "count": stats["count"]}
+                       for stage, stats in self.stages.items()},
+            "llm_calls": self.llm_calls
+        }
+
+    def usage(self) -> dict:
+        by_model = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        for call in self.llm_calls:
+            totals = by_model[call["model"]]
+            totals["calls"] += 1
+            totals["prompt_tokens"] += call["prompt_tokens"] or 0
+            totals["completion_tokens"] += call["completion_tokens"] or 0
+        return {
+            "llm_calls": len(self.llm_calls),
+            "prompt_tokens": sum(totals["prompt_tokens"] for totals in by_model.values()),
+            "completion_tokens": sum(totals["completion_tokens"] for totals in by_model.values()),
+            "by_model": dict(by_model),
+            "retries": self.retries,
+            "cache": {cache: dict(lookups) for cache, lookups in self.cache.items()}
+        }
+
+
+def usage_requested(header_value: Optional[str]) -> bool:
+    """Whether the X-Include-Usage header (or RESPONSE_USAGE_DEFAULT) asks for the usage block"""
+    if header_value is None:
+        return RESPONSE_USAGE_DEFAULT
+    return header_value.strip().lower() in ("1", "true", "yes")
+
+
+def start_usage_recording(enabled: bool) -> Optional[UsageRecorder]:
+    """
+    Attach a fresh recorder to the current context (and the tasks it starts), or detach
+    any inherited one when usage was not requested.
+    """
+    recorder = UsageRecorder() if enabled else None
+    _usage_recorder.set(recorder)
+    return recorder
+
+
+def current_recorder() -> Optional[UsageRecorder]:
+    return _usage_recorder.get()
+
+
+def attach_usage(response, recorder: Optional[UsageRecorder]):
+    """Add the `timings` and `usage` blocks to an api1 response dict or a PromptResponseModel"""
+    if recorder is None:
+        return response
+    if isinstance(response, dict):
+        response["timings"] = recorder.timings()
+        response["usage"] = recorder.usage()
+    else:
+        response.timings = recorder.timings()
+        response.usage = recorder.usage()
+    return response
@@ -0,0 +1,215 @@
+import json
+import re
+from collections import defaultdict
+from typing import List, Optional
+
+# Standard transformation patterns that don't need LLM validation, compiled into a single
+# alternation so each transformation is matched once instead of once per pattern
+SIMPLE_TRANSFORMATION_PATTERNS = [
+    r'^Direct\s*(\(|$)',
+    r'^Default\s+Value:\s*\d+',
+    r'^Uppercase\s*(\(|$)',
+    r'^Lowercase\s*(\(|$)',
+    r'^Trim\s*(\(|$)',
+    r'^Concatenate\s*\(',
+    r'^Substring\s*\(',
+    r'^DateFormatting\s*\(',
+]
+SIMPLE_TRANSFORMATION_RE = re.compile("|".join(f"(?:{p})" for p in SIMPLE_TRANSFORMATION_PATTERNS), re.IGNORECASE)
+
+REQUIRED_KEYS = ["target_table", "source_tables", "column_mapping"]
+# JSON schema for provider-side structured output, mirroring the checks in validate_json_sttm.
+# column_mapping is keyed by target column names, so its entries are left open.
+STTM_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "target_table": {"type": "string", "minLength": 1},
+        "source_tables": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "desc": {"type": "string"},
+                    "catalog": {"type": "string"},
+                    "schema": {"type": "string"}
+                },
+                "required": ["name"]
+            }
+        },
+        "column_mapping": {
+            "type": "object",
+            "minProperties": 1,
+            "additionalProperties": {
+                "type": "object",
+                "properties": {
+                    "sources": {
+                        "type": "object",
+                        "properties": {
+                            "source_table": {"type": "string"},
+                            "transformation": {"type": "string"}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    "required": REQUIRED_KEYS
+}
+
+# Patch mode responses carry only the new column_mapping entries and source tables
+STTM_PATCH_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "column_mapping": STTM_JSON_SCHEMA["properties"]["column_mapping"],
+        "source_tables": STTM_JSON_SCHEMA["properties"]["source_tables"]
+    },
+    "required": ["column_mapping"]
+}
+
+MAX_TRANSFORMATION_LENGTH = 1000
+MAX_COLUMNS = 500
+MAX_COLUMNS_PER_TRANSFORMATION = 10
+
+
+def _text(value) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+class ValidationReport:
+    """
+    Result of validating one generated JSON STTM.
+
+    Attributes:
+        json_data (Optional[dict]): Parsed JSON, None when it is not valid JSON
+        errors (List[dict]): Failing checks as {"rule", "message", "column"} dicts
+        warnings (List[dict]): Business rule warnings, same shape; they never fail validation
+        needs_llm_validation (bool): Whether enough transformations are non-standard to warrant the LLM validator
+        missing_columns (List[str]): Target columns from the sheet that are absent from column_mapping
+    """
+    def __init__(self, json_data: Optional[dict] = None):
+        self.json_data = json_data
+        self.errors = []
+        self.warnings = []
+        self.needs_llm_validation = False
+        self.missing_columns = []
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def messages(self) -> List[str]:
+        return [issue["message"] for issue in self.errors]
+
+    def add_error(self, rule: str, message: str, column: Optional[str] = None) -> None:
+        self.errors.append({"rule": rule, "message": message, "column": column})
+
+    def add_warning(self, rule: str, message: str, column: Optional[str] = None) -> None:
+        self.warnings.append({"rule": rule, "message": message, "column": column})
+
+
+def validate_json_sttm(json_string: str, excel_metadata: dict) -> ValidationReport:
+    """
+    Single-pass equivalent of SmartValidator's checks: the JSON is parsed once, the
+    column_mapping is walked once for source references, transformations and business
+    rules, and transformations are matched against one precompiled regex. Messages are the
+    same as SmartValidator's so analyze_error_patterns keeps working.
+
+    Args:
+        json_string (str): JSON STTM returned by the LLM
+        excel_metadata (dict): Metadata from optimize_excel_data
+
+    Returns:
+        ValidationReport: Parsed JSON plus structured errors and warnings
+    """
+    # 1. JSON Syntax
+    try:
+        json_data = json.loads(json_string)
+    except json.JSONDecodeError as e:
+        report = ValidationReport()
+        report.add_error("json_syntax", f"JSON syntax error at line {e.lineno}, column {e.colno}: {e.msg}")
+        return report
+
+    report = ValidationReport(json_data)
+    if not isinstance(json_data, dict):
+        report.add_error("schema", "JSON STTM must be an object")
+        return report
+
+    # 2. Schema validation
+    for key in REQUIRED_KEYS:
+        if key not in json_data:
+            report.add_error("schema", f"Missing required key: '{key}'")
+
+    if not _text(json_data.get("target_table", "")):
+        report.add_error("schema", "target_table is empty or missing")
+
+    source_tables = json_data.get("source_tables", [])
+    defined_sources = set()
+    if not isinstance(source_tables, list):
+        report.add_error("schema", "source_tables must be a list")
+    else:
+        for idx, table in enumerate(source_tables):
+            if not isinstance(table, dict):
+                report.add_error("schema", f"source_tables[{idx}] must be a dictionary")
+            elif not table.get("name"):
+                report.add_error("schema", f"source_tables[{idx}] missing 'name' field")
+            else:
+                defined_sources.add(table["name"])
+
+    column_mapping = json_data.get("column_mapping", {})
+    if not isinstance(column_mapping, dict):
+        report.add_error("schema", "column_mapping must be a dictionary")
+        column_mapping = {}
+    elif not column_mapping:
+        report.add_error("schema", "column_mapping is empty")
+
+    # 3. Column coverage
+    missing_columns = set(excel_metadata.get('target_columns', [])) - column_mapping.keys()
+    if missing_columns:
+        report.missing_columns = sorted(missing_columns)
+        report.add_error("column_coverage", f"Missing target columns: {report.missing_columns}")
+
+    # 4-6. One walk over the mapping; errors are grouped afterwards in SmartValidator's order
+    reference_errors = []
+    transformation_errors = []
+    columns_by_transformation = defaultdict(list)
+    total_transformations = 0
+    complex_transformations = 0
+    for col_name, col_def in column_mapping.items():
+        if not isinstance(col_def, dict):
+            continue
+        sources = col_def.get("sources", {})
+        if not isinstance(sources, dict):
+            continue
+
+        src_table = _text(sources.get("source_table", ""))
+        if src_table and src_table not in defined_sources:
+            reference_errors.append((col_name, f"Column '{col_name}' references undefined source table '{src_table}'"))
+
+        transformation = _text(sources.get("transformation", ""))
+        if not transformation:
+            continue
+        total_transformations += 1
+        if not SIMPLE_TRANSFORMATION_RE.match(transformation):
+            complex_transformations += 1
+        if len(transformation) > MAX_TRANSFORMATION_LENGTH:
+            transformation_errors.append((col_name, f"Column '{col_name}' has unusually long transformation"))
+        columns_by_transformation[transformation].append(col_name)
+
+    for col_name, message in reference_errors:
+        report.add_error("source_reference", message, col_name)
+    for col_name, message in transformation_errors:
+        report.add_error("transformation", message, col_name)
+
+    report.needs_llm_validation = (complex_transformations > 5
+                                   or complex_transformations > total_transformations * 0.3)
+
+    # Business rules (warnings only)
+    if len(column_mapping) > MAX_COLUMNS:
+        report.add_warning("business_rule", f"Unusually high number of columns: {len(column_mapping)}")
+    for transformation, cols in columns_by_transformation.items():
+        if len(cols) > MAX_COLUMNS_PER_TRANSFORMATION:
+            report.add_warning("business_rule", f"Transformation '{transformation[:50]}...' used in {len(cols)} columns")
+
+    return report
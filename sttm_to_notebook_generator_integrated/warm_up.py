@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from .log_handler import get_logger
+from .read_env_var import WARM_UP_TIMEOUT_SECONDS, WARM_UP_PREOPEN_CONNECTIONS
+
+logger = get_logger("<Warm-up>")
+
+# Imported on first use by the request path; loaded ahead of the first request by the warm-up
+HEAVY_MODULES = (
+    "pandas",
+    "openpyxl",
+    "openai",
+    "langchain_core.prompts",
+    "langgraph.graph",
+    "langchain_openai",
+)
+
+# Process-wide warm-up progress, served by the /stats and /ready endpoints
+warm_up_state = {"started": False, "done": False, "ready": False, "seconds": {}, "errors": {}}
+_state_lock = threading.Lock()
+
+
+def _record_error(name: str, e: BaseException) -> None:
+    warm_up_state["errors"][name] = f"{type(e).__name__}: {str(e)[:200]}"
+    logger.warning(f"Warm-up step '{name}' failed: {type(e).__name__}: {str(e)}")
+
+
+def _run_step(name: str, step: Callable[[], object]) -> None:
+    started_at = time.monotonic()
+    try:
+        step()
+    except Exception as e:
+        _record_error(name, e)
+    warm_up_state["seconds"][name] = round(time.monotonic() - started_at, 3)
+
+
+def warm_up_imports() -> None:
+    """Import HEAVY_MODULES; the gunicorn master runs this before forking so workers share them"""
+    for name in HEAVY_MODULES:
+        _run_step(f"import {name}", lambda: importlib.import_module(name))
+
+
+def _warm_up_steps() -> List[Tuple[str, Callable[[], object]]]:
+    from notebook_generator_app.llm.langchain_workflow import get_llm_wrapper, get_sql_graph
+    from notebook_generator_app.utilities.helpers import preload_templates
+    from .api1_json_converter_optimized import get_async_llm_client
+    from .token_counter import get_encoding
+
+    return [("tokenizer", get_encoding), ("templates", preload_templates), ("sql_graph", get_sql_graph),
+            ("sql_llm_client", get_llm_wrapper), ("json_llm_client", get_async_llm_client)]
+
+
+def _warm_up() -> None:
+    warm_up_imports()
+    for name, step in _warm_up_steps():
+        _run_step(name, step)
+    warm_up_state["done"] = True
+
+
+async def _preopen_connections() -> None:
+    """
+    Make one cheap request per LLM client on the server's event loop, so the DNS lookup and TLS
+    handshake are done and the connection is pooled before the first generation. Any response,
+    even an error status, means the connection is open.
+    """
+    import openai
+    from notebook_generator_app.llm.langchain_workflow import get_llm_wrapper
+    from .api1_json_converter_optimized import get_async_llm_client
+
+    clients = {"json_llm_client": lambda: get_async_llm_client(),
+               "sql_llm_client": lambda: get_llm_wrapper().root_async_client}
+    for name, client in clients.items():
+        step = f"connect {name}"
+        started_at = time.monotonic()
+        try:
+            # with_options shares the client's connection pool
+            await client().with_options(timeout=10, max_retries=0).models.list()
+        except openai.APIStatusError:
+            pass
+        except Exception as e:
+            _record_error(step, e)
+        warm_up_state["seconds"][step] = round(time.monotonic() - started_at, 3)
+
+
+async def warm_up() -> None:
+    """
+    Load heavy modules, the tokenizer, the prompt and notebook templates, the compiled SQL
+    graph and the LLM clients (and optionally their connections), for at most
+    WARM_UP_TIMEOUT_SECONDS. The app's lifespan awaits this before start-up completes, and a
+    worker (uvicorn, or each gunicorn worker, recycled ones included) only accepts
+    connections after that, so no request reaches a cold worker.
+    """
+    with _state_lock:
+        if warm_up_state["started"]:
+            return
+        warm_up_state["started"] = True
+    started_at = time.monotonic()
+    loop = asyncio.get_running_loop()
+    # On a thread, so the blocking imports and file reads can be given up on at the timeout
+    steps = loop.run_in_executor(None, _warm_up)
+    try:
+        await asyncio.wait_for(asyncio.shield(steps), timeout=WARM_UP_TIMEOUT_SECONDS)
+        if WARM_UP_PREOPEN_CONNECTIONS:
+            await asyncio.wait_for(_preopen_connections(),
+                                   timeout=max(1.0, WARM_UP_TIMEOUT_SECONDS - (time.monotonic() - started_at)))
+    except asyncio.TimeoutError:
+        # Serve cold rather than never starting; the remaining steps finish on the thread
+        warm_up_state["errors"]["timeout"] = f"not finished after {WARM_UP_TIMEOUT_SECONDS:g}s"
+        logger.warning(f"Warm-up did not finish within {WARM_UP_TIMEOUT_SECONDS:g}s; accepting requests anyway")
+    warm_up_state["ready"] = True
+    logger.info(f"Warm-up finished in {time.monotonic() - started_at:.2f}s"
+                + (f" with errors in {sorted(warm_up_state['errors'])}" if warm_up_state["errors"] else ""))
+
+
+def warm_up_status() -> dict:
+    """Snapshot of warm_up_state that is safe to serialize while the warm-up runs"""
+    return {**warm_up_state, "seconds": dict(warm_up_state["seconds"]), "errors": dict(warm_up_state["errors"])}
+
+
+def is_ready() -> bool:
+    return warm_up_state["ready"]
+
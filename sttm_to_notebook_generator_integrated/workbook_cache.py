@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import Counter, defaultdict
+from io import BytesIO
+from typing import Dict, Tuple, TYPE_CHECKING
+
+from .log_handler import get_logger
+from .metrics import observe_stage, record_cache_lookup
+
+logger = get_logger("<Workbook Cache>")
+
+# pandas (and openpyxl through it) is imported by the parsing threads on first use
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class WorkbookCache:
+    """
+    Per-request cache of uploaded STTM workbooks.
+
+    Every sheet a request refers to is registered up front; the first time a sheet of a
+    workbook is needed, the workbook is opened once and all of its registered sheets are
+    parsed in that single pass. Frames are then shared by every metadata entry (or batch
+    item) that refers to the same (workbook, sheet).
+
+    Attributes:
+        workbooks (Dict[str, bytes]): Uploaded workbook contents by file name
+    """
+    def __init__(self):
+        self.workbooks: Dict[str, bytes] = {}
+        self._requested = defaultdict(Counter)
+        self._loads: Dict[str, asyncio.Task] = {}
+        self._open_seconds: Dict[str, float] = {}
+        self._sheet_seconds: Dict[Tuple[str, str], float] = {}
+
+    def add(self, file_name: str, contents: bytes) -> None:
+        self.workbooks[file_name] = contents
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.workbooks
+
+    def require(self, file_name: str, sheet_name: str) -> None:
+        """Register that an entry will need ``sheet_name`` of ``file_name``."""
+        self._requested[file_name][sheet_name] += 1
+
+    async def get(self, file_name: str, sheet_name: str) -> "pd.DataFrame":
+        """
+        Parsed frame of ``sheet_name``. Raises the same errors pd.read_excel would for a
+        missing sheet or an unreadable workbook.
+        """
+        if sheet_name not in self._requested[file_name]:
+            if file_name in self._loads:
+                # Not registered before the workbook's pass ran; parse it on its own
+                record_cache_lookup("workbook", hit=False)
+                return await asyncio.to_thread(self._parse_single, file_name, sheet_name)
+            self.require(file_name, sheet_name)
+
+        record_cache_lookup("workbook", hit=file_name in self._loads)
+        if file_name not in self._loads:
+            sheets = list(self._requested[file_name])
+            self._loads[file_name] = asyncio.create_task(asyncio.to_thread(self._parse, file_name, sheets))
+        # Shielded: the pass is shared with other entries that may still need it
+        frames = await asyncio.shield(self._loads[file_name])
+        frame = frames[sheet_name]
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
+
+    def _parse_single(self, file_name: str, sheet_name: str) -> "pd.DataFrame":
+        import pandas as pd
+
+        with observe_stage("excel_parse"):
+            return pd.read_excel(BytesIO(self.workbooks[file_name]), sheet_name=sheet_name)
+
+    def _parse(self, file_name: str, sheets: list) -> dict:
+        import pandas as pd
+
+        started_at = time.monotonic()
+        frames = {}
+        with observe_stage("excel_parse"), pd.ExcelFile(BytesIO(self.workbooks[file_name])) as workbook:
+            self._open_seconds[file_name] = time.monotonic() - started_at
+            for sheet_name in sheets:
+                if sheet_name not in workbook.sheet_names:
+                    frames[sheet_name] = ValueError(f"Worksheet named '{sheet_name}' not found")
+                    continue
+                sheet_started_at = time.monotonic()
+                frames[sheet_name] = workbook.parse(sheet_name)
+                self._sheet_seconds[(file_name, sheet_name)] = time.monotonic() - sheet_started_at
+        logger.info(f"Parsed {len(sheets)} sheet(s) of {file_name} in one pass "
+                    f"({time.monotonic() - started_at:.2f}s, {len(self.workbooks[file_name])} bytes)")
+        return frames
+
+    def stats(self) -> dict:
+        """
+        Bytes parsed and the parse work avoided compared with opening the workbook (and
+        parsing the sheet) once per metadata entry.
+        """
+        bytes_parsed = bytes_saved = 0
+        seconds_saved = 0.0
+        for file_name in self._open_seconds:
+            entries = self._requested[file_name]
+            size = len(self.workbooks[file_name])
+            bytes_parsed += size
+            bytes_saved += size * (sum(entries.values()) - 1)
+            seconds_saved += self._open_seconds[file_name] * (sum(entries.values()) - 1)
+            for sheet_name, count in entries.items():
+                seconds_saved += self._sheet_seconds.get((file_name, sheet_name), 0.0) * (count - 1)
+        return {
+            "workbooks_parsed": len(self._open_seconds),
+            "sheets_parsed": len(self._sheet_seconds),
+            "entries_served": sum(sum(self._requested[name].values()) for name in self._open_seconds),
+            "bytes_parsed": bytes_parsed,
+            "bytes_parse_avoided": bytes_saved,
+            "parse_seconds": round(sum(self._open_seconds.values()) + sum(self._sheet_seconds.values()), 3),
+            "parse_seconds_saved": round(seconds_saved, 3)
+        }
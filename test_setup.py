@@ -36,7 +36,8 @@ def test_imports():
         print(f"  └─ App title: {app.title}")
         
         print("\n✓ Testing langchain_workflow...")
-        from notebook_generator_app.llm.langchain_workflow import llm_wrapper
+        from notebook_generator_app.llm.langchain_workflow import get_llm_wrapper
+        get_llm_wrapper()
         print(f"  └─ LLM Wrapper loaded successfully")
         
         print("\n✓ Testing api1_json_converter_optimized...")
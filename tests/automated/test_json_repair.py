@@ -0,0 +1,82 @@
+"""
+Local repair of malformed LLM JSON output (json_repair.repair_json), one case per fix kind
+
+Usage (from the project root):
+    python -m pytest tests/automated
+"""
+
+import json
+
+import pytest
+
+from sttm_to_notebook_generator_integrated.json_repair import repair_json
+
+
+def repaired(text):
+    candidate, fixes = repair_json(text)
+    assert candidate is not None, f"not repaired: {text!r}"
+    return json.loads(candidate), fixes
+
+
+def test_valid_json_is_unchanged():
+    assert repaired('{"a": 12, "b": [1, 2], "c": {"d": null}}') == ({"a": 12, "b": [1, 2], "c": {"d": None}}, [])
+
+
+def test_extracts_object_from_prose_and_fences():
+    value, fixes = repaired('Here is the mapping:\n```json\n{"a": 1}\n```\nLet me know.')
+    assert value == {"a": 1}
+    assert fixes == ["extracted_object"]
+
+
+def test_escapes_unescaped_quote():
+    value, fixes = repaired('{"logic": "cast as "string" type", "b": 1}')
+    assert value == {"logic": 'cast as "string" type', "b": 1}
+    assert fixes == ["unescaped_quote"]
+
+
+def test_escapes_control_characters():
+    value, fixes = repaired('{"sql": "select a\n\tfrom b"}')
+    assert value == {"sql": "select a\n\tfrom b"}
+    assert fixes == ["control_character"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('{"a": {"x": 1,\n}\n}', {"a": {"x": 1}}),
+])
+def test_drops_trailing_commas(text, expected):
+    assert repaired(text) == (expected, ["trailing_comma"])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": "x"\n "b": 2}', {"a": "x", "b": 2}),
+    ('{"a": 1\n "b": 2}', {"a": 1, "b": 2}),
+    ('{"a": -1.5e3\n "b": 2}', {"a": -1500.0, "b": 2}),
+    ('{"a": true\n "b": false\n "c": null\n "d": 2}', {"a": True, "b": False, "c": None, "d": 2}),
+    ('{"a": {"x": 1}\n "b": 2}', {"a": {"x": 1}, "b": 2}),
+    ('{"a": [1]\n "b": 2}', {"a": [1], "b": 2}),
+    ('{"a": [1\n2\n{"x": 1}\n[3]]}', {"a": [1, 2, {"x": 1}, [3]]}),
+])
+def test_inserts_missing_commas_between_lines(text, expected):
+    assert repaired(text) == (expected, ["missing_comma"])
+
+
+def test_converts_python_literals():
+    value, fixes = repaired('{"a": True, "b": False, "c": None}')
+    assert value == {"a": True, "b": False, "c": None}
+    assert fixes == ["python_literal"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": [1, 2', {"a": [1, 2]}),
+    ('{"a": {"b": "unfinished val', {"a": {"b": "unfinished val"}}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1, "unfinished_ke', {"a": 1, "unfinished_ke": None}),
+])
+def test_closes_truncated_output(text, expected):
+    assert repaired(text) == (expected, ["truncated"])
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"a": 1 2}'])
+def test_unrecoverable_output(text):
+    assert repair_json(text)[0] is None
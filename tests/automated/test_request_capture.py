@@ -0,0 +1,57 @@
+"""
+Request capture: which pipeline endpoints are recorded for offline replay
+
+Usage (from the project root):
+    python -m pytest tests/automated
+"""
+
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI, Form
+
+from sttm_to_notebook_generator_integrated import request_capture
+from sttm_to_notebook_generator_integrated.request_capture import CaptureMiddleware, is_captured_path
+
+CODEGEN = "/silver-codegen-genai/api/v1/edf/genai/codegenservices"
+
+
+def test_captured_paths():
+    assert is_captured_path(f"{CODEGEN}/orchestrate-json-sttm")
+    assert is_captured_path(f"{CODEGEN}/generate-notebook")
+    assert is_captured_path(f"{CODEGEN}/from-sttm-generate-notebook")
+    assert not is_captured_path(f"{CODEGEN}/from-sttm-generate-notebook/stream")
+    assert not is_captured_path(f"{CODEGEN}/from-sttm-generate-notebook/batch")
+    assert not is_captured_path("/silver-codegen-genai/v1.1/health")
+
+
+def test_api3_post_is_captured(tmp_path, monkeypatch):
+    capture_file = tmp_path / "requests.jsonl"
+    monkeypatch.setattr(request_capture, "CAPTURE_MODE", "hash")
+    monkeypatch.setattr(request_capture, "CAPTURE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(request_capture, "CAPTURE_FILE_PATH", str(capture_file))
+
+    app = FastAPI()
+    app.add_middleware(CaptureMiddleware)
+
+    @app.post(f"{CODEGEN}/from-sttm-generate-notebook")
+    async def pipeline(notebook_metadata_json: str = Form(...)):
+        return {"success": True}
+
+    @app.post(f"{CODEGEN}/from-sttm-generate-notebook/stream")
+    async def pipeline_stream(notebook_metadata_json: str = Form(...)):
+        return {"success": True}
+
+    async def post_both():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            data = {"notebook_metadata_json": json.dumps({"user_id": "someone"})}
+            for path in ("from-sttm-generate-notebook", "from-sttm-generate-notebook/stream"):
+                assert (await client.post(f"{CODEGEN}/{path}", data=data)).status_code == 200
+
+    asyncio.run(post_both())
+
+    records = [json.loads(line) for line in capture_file.read_text().splitlines()]
+    assert [record["path"] for record in records] == [f"{CODEGEN}/from-sttm-generate-notebook"]
+    assert records[0]["status"] == 200
+    assert "someone" not in records[0]["form"]["notebook_metadata_json"]